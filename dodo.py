@@ -25,3 +25,39 @@ def task_mypy():
         'actions': [Interactive("mypy src/ --check-untyped-defs")],
         'verbosity': 2
     }
+
+
+def task_rebuild_rollup():
+    """rebuild expense rollups"""
+
+    return {
+        'actions': ["cd src && python -m services.rollup_service"],
+        'verbosity': 2
+    }
+
+
+def task_bench_imports():
+    """check import-time budgets"""
+
+    return {
+        'actions': ["cd src && python -m benchmarks.import_time"],
+        'verbosity': 2
+    }
+
+
+def task_bench_services():
+    """benchmark services on synthetic data"""
+
+    return {
+        'actions': ["cd src && python -m benchmarks.run_services"],
+        'verbosity': 2
+    }
+
+
+def task_test():
+    """run tests"""
+
+    return {
+        'actions': ["python -m pytest -q"],
+        'verbosity': 2
+    }
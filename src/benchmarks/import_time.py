@@ -0,0 +1,135 @@
+"""Verifica il tempo di import di servizi e pagine con `python -X importtime`
+
+Uso (dalla cartella src): python -m benchmarks.import_time [--repeat 5] [--scale 1.5]
+Esce con codice 1 se un modulo supera il proprio budget o se un servizio carica
+una libreria pesante che dovrebbe essere importata solo quando serve.
+"""
+
+import argparse
+import ast
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+
+# budget in millisecondi del tempo cumulativo di import (avvio dell'interprete escluso)
+MODULE_BUDGETS_MS = {
+    "database.connection": 350,
+    "database.postgres_connection": 350,
+    "database.sqlite_connection": 350,
+    "services.expense_service": 400,
+    "services.rollup_service": 400,
+    "services.target_service": 400,
+    "services.income_service": 400,
+    "services.account_service": 400,
+    "services.import_service": 400,
+    "services.export_service": 400,
+    "services.forecast_service": 400,
+    "services.expense_store": 400,
+    "services.change_service": 400,
+    "services.category_service": 400,
+}
+
+# librerie che il livello dati e i servizi non devono caricare all'import
+HEAVY_PACKAGES = {"streamlit", "pandas", "numpy", "pyarrow", "plotly", "openpyxl"}
+
+# per le pagine si misurano solo gli import di primo livello, senza eseguire lo script
+PAGE_BUDGETS_MS = {
+    "create_expense.py": 1500,
+    "pages/monthly_dashboard.py": 1800,
+    "pages/time_trend.py": 1800,
+    "pages/comparative_analysis.py": 1800,
+    "pages/set_benchmark.py": 1800,
+    "pages/import_data.py": 1800,
+    "pages/diagnostics.py": 1800,
+}
+
+
+def page_imports(path: Path) -> str:
+    """Estrae gli import di primo livello di uno script"""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    return "\n".join(
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_time_ms(code: str) -> Tuple[float, Set[str]]:
+    """Somma dei tempi cumulativi degli import di primo livello eseguiti da `code`
+
+    Restituisce anche i pacchetti di primo livello caricati.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    total_us = 0
+    packages = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        packages.add(name.strip().split(".")[0])
+        # i moduli annidati sono indentati: conta solo quelli di primo livello
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def run(repeat: int, scale: float) -> Dict[str, float]:
+    targets = {
+        module: (f"import {module}", budget)
+        for module, budget in MODULE_BUDGETS_MS.items()
+    }
+    targets.update(
+        {
+            page: (page_imports(SRC_DIR / page), budget)
+            for page, budget in PAGE_BUDGETS_MS.items()
+        }
+    )
+
+    results = {}
+    failures = 0
+    for name, (code, base_budget) in targets.items():
+        budget = base_budget * scale
+        try:
+            runs = [import_time_ms(code) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"ERRORE  {name:<32} {e}")
+            failures += 1
+            continue
+
+        elapsed = statistics.median(ms for ms, _ in runs)
+        heavy = runs[0][1] & HEAVY_PACKAGES if name in MODULE_BUDGETS_MS else set()
+
+        status = "OK" if elapsed <= budget and not heavy else "OLTRE"
+        failures += status != "OK"
+        results[name] = elapsed
+        print(f"{status:<7} {name:<32} {elapsed:8.1f} ms (budget {budget:.0f} ms)")
+        if heavy:
+            print(f"        importa all'avvio: {', '.join(sorted(heavy))}")
+
+    if failures:
+        sys.exit(1)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="moltiplicatore dei budget"
+    )
+    args = parser.parse_args()
+    run(args.repeat, args.scale)
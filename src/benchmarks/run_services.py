@@ -0,0 +1,271 @@
+"""Misura le funzioni pubbliche dei servizi su storici sintetici di varie dimensioni
+
+Uso (dalla cartella src):
+    python -m benchmarks.run_services [--sizes 10000 100000] [--url URL] [--repeat 5]
+                                      [--compare results/<commit>.json]
+
+Senza --url usa un file SQLite temporaneo; con --url (es. un database PostgreSQL
+dedicato) lo schema viene cancellato e ricreato per ogni dimensione.
+I risultati vengono salvati in benchmarks/results/<commit>.json; con --compare viene
+stampato il rapporto rispetto a un'esecuzione precedente e l'uscita è 1 se una misura
+peggiora oltre la soglia.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.synthetic_data import add_arguments, populate
+from database.migrations import DEFAULT_CATEGORIES
+from services import (
+    account_service,
+    change_service,
+    expense_service,
+    forecast_service,
+    income_service,
+    page_data,
+    target_service,
+)
+from services.cache import clear_cache
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# peggioramento oltre il quale una misura è considerata una regressione
+REGRESSION_THRESHOLD = 1.25
+
+Case = Callable[[Engine, Session], Any]
+
+
+def build_cases(today: date) -> List[Tuple[str, Case]]:
+    """Casi misurati: nome e chiamata, con parametri relativi al mese corrente"""
+    month_start = today.replace(day=1)
+    last_year = month_start - relativedelta(years=1)
+    quarters = [
+        (
+            f"Q{i}",
+            month_start - relativedelta(months=3 * i),
+            month_start - relativedelta(months=3 * (i - 1)),
+        )
+        for i in range(4, 0, -1)
+    ]
+
+    return [
+        ("expense.get_all_expenses", lambda e, s: expense_service.get_all_expenses(e)),
+        (
+            "expense.get_expenses_by_month",
+            lambda e, s: expense_service.get_expenses_by_month(e, today.year, today.month),
+        ),
+        (
+            "expense.get_expenses_by_year",
+            lambda e, s: expense_service.get_expenses_by_year(e, today.year),
+        ),
+        (
+            "expense.get_expenses_by_date_range",
+            lambda e, s: expense_service.get_expenses_by_date_range(e, last_year, today),
+        ),
+        ("expense.list_expenses", lambda e, s: expense_service.list_expenses(e)),
+        (
+            "expense.list_expenses[filtered]",
+            lambda e, s: expense_service.list_expenses(
+                e, categories=DEFAULT_CATEGORIES[:3], min_amount=50
+            ),
+        ),
+        ("expense.get_expense_by_id", lambda e, s: expense_service.get_expense_by_id(s, 1)),
+        (
+            "expense.get_category_spending",
+            lambda e, s: expense_service.get_category_spending(e, today.year, today.month),
+        ),
+        ("expense.compare_periods", lambda e, s: expense_service.compare_periods(e, quarters)),
+        (
+            "expense.get_monthly_totals",
+            lambda e, s: expense_service.get_monthly_totals(s, last_year, today),
+        ),
+        (
+            "expense.get_overall_monthly_totals",
+            lambda e, s: expense_service.get_overall_monthly_totals(s, last_year, today),
+        ),
+        (
+            "expense.get_account_category_monthly",
+            lambda e, s: expense_service.get_account_category_monthly(s, last_year, today),
+        ),
+        (
+            "expense.get_monthly_totals[account]",
+            lambda e, s: expense_service.get_monthly_totals(s, last_year, today, [1]),
+        ),
+        (
+            "forecast.forecast_monthly_totals[category,account]",
+            lambda e, s: forecast_service.forecast_monthly_totals(
+                s, last_year, today, keys=("category", "account_id"), horizon=6
+            ),
+        ),
+        (
+            "expense.add_expense",
+            lambda e, s: expense_service.add_expense(
+                s, today, DEFAULT_CATEGORIES[5], 12.5, "benchmark"
+            ),
+        ),
+        (
+            "change.get_changes_since",
+            lambda e, s: change_service.get_changes_since(
+                e, "expenses", datetime(today.year, today.month, today.day)
+            ),
+        ),
+        ("target.get_targets", lambda e, s: target_service.get_targets(s)),
+        (
+            "target.get_target_history[24 mesi]",
+            lambda e, s: target_service.get_target_history(
+                s, today - relativedelta(months=24), today
+            ),
+        ),
+        (
+            "target.set_target",
+            lambda e, s: target_service.set_target(s, DEFAULT_CATEGORIES[5], 400.0),
+        ),
+        (
+            "target.set_targets_bulk",
+            lambda e, s: target_service.set_targets_bulk(
+                s, {category: 300.0 for category in DEFAULT_CATEGORIES}
+            ),
+        ),
+        (
+            "target.align_spending_with_targets",
+            lambda e, s: target_service.align_spending_with_targets(
+                expense_service.get_category_spending(e, today.year, today.month),
+                target_service.get_targets(s),
+            ),
+        ),
+        (
+            "income.get_income",
+            lambda e, s: income_service.get_income(s, 1, today.year, today.month),
+        ),
+        (
+            "income.get_monthly_income",
+            lambda e, s: income_service.get_monthly_income(s, last_year, today),
+        ),
+        (
+            "income.get_savings_series[24 mesi]",
+            lambda e, s: income_service.get_savings_series(
+                s, today - relativedelta(months=24), today
+            ),
+        ),
+        ("account.get_accounts", lambda e, s: account_service.get_accounts(s)),
+        (
+            "page.load_monthly_dashboard",
+            lambda e, s: page_data.load_monthly_dashboard(e, today.year, today.month),
+        ),
+        (
+            "page.load_time_trend",
+            lambda e, s: page_data.load_time_trend(e, last_year, today),
+        ),
+    ]
+
+
+def time_case(engine: Engine, case: Case, repeat: int) -> Dict[str, float]:
+    """Mediana e minimo in millisecondi di `repeat` esecuzioni a cache vuota"""
+    timings = []
+    for _ in range(repeat):
+        clear_cache()
+        with Session(engine) as session:
+            started = time.perf_counter()
+            case(engine, session)
+            timings.append((time.perf_counter() - started) * 1000)
+    return {"median_ms": statistics.median(timings), "min_ms": min(timings)}
+
+
+def git_commit() -> str:
+    proc = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+    )
+    return proc.stdout.strip() or "worktree"
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"commit": git_commit(), "sizes": {}}
+    cases = build_cases(date.today())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = create_engine(url)
+        report["dialect"] = engine.dialect.name
+
+        for size in args.sizes:
+            setup = populate(
+                engine,
+                rows=size,
+                years=args.years,
+                accounts=args.accounts,
+                skew=args.skew,
+                incomes=not args.no_incomes,
+                seed=args.seed,
+            )
+            print(f"{size} righe generate in {setup['seconds']:.1f}s")
+
+            results = {}
+            for name, case in cases:
+                results[name] = time_case(engine, case, args.repeat)
+                print(f"  {name:45} {results[name]['median_ms']:10.2f} ms")
+            report["sizes"][str(size)] = results
+
+        engine.dispose()
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Stampa il rapporto con un'esecuzione precedente; False se ci sono regressioni"""
+    ok = True
+    print(f"\nConfronto {baseline['commit']} -> {report['commit']}")
+    for size, results in report["sizes"].items():
+        previous = baseline["sizes"].get(size, {})
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            ratio = result["median_ms"] / max(previous[name]["median_ms"], 1e-6)
+            flag = ""
+            if ratio > threshold:
+                flag = "  REGRESSIONE"
+                ok = False
+            print(f"  [{size}] {name:45} x{ratio:6.2f}{flag}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000],
+        help="numero di spese per ogni esecuzione (es. 1000000 10000000)",
+    )
+    parser.add_argument(
+        "--url", help="database di benchmark dedicato: verrà svuotato"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    report = run(args)
+
+    output = args.output or RESULTS_DIR / f"{report['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Risultati salvati in {output}")
+
+    if args.compare and not compare(
+        report, json.loads(args.compare.read_text(encoding="utf-8")), args.threshold
+    ):
+        sys.exit(1)
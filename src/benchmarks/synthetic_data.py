@@ -0,0 +1,158 @@
+"""Generatore di storici di spesa sintetici per i benchmark
+
+Uso (dalla cartella src):
+    python -m benchmarks.synthetic_data --url sqlite:///bench.db --rows 100000 --years 5
+"""
+
+import argparse
+import time
+from datetime import date
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Engine, create_engine, insert
+from sqlalchemy.orm import Session
+
+from database.base import Base
+from database.migrations import DEFAULT_CATEGORIES, run_migrations
+from database.models import Account, Income
+from services.category_service import clear_category_cache, with_category_ids
+from services.import_service import load_expense_chunk
+from services.rollup_service import rebuild_expense_rollup
+
+# importo medio (in euro) di una singola spesa per categoria, in ordine di DEFAULT_CATEGORIES
+_BASE_AMOUNTS = np.array(
+    [650, 80, 300, 60, 40, 35, 250, 45, 50, 30, 35, 8, 25, 20, 2, 60], dtype=float
+)
+
+
+def category_weights(skew: float) -> np.ndarray:
+    """Pesi tipo Zipf sulle categorie: con skew=0 sono uniformi"""
+    weights = 1 / np.arange(1, len(DEFAULT_CATEGORIES) + 1) ** skew
+    return np.asarray(weights / weights.sum())
+
+
+def generate_expenses(
+    rng: np.random.Generator,
+    rows: int,
+    start: date,
+    end: date,
+    accounts: int,
+    skew: float,
+) -> pd.DataFrame:
+    """Genera `rows` spese con date uniformi in [start, end) e importi log-normali"""
+    days = (end - start).days
+    category_idx = rng.choice(len(DEFAULT_CATEGORIES), size=rows, p=category_weights(skew))
+    amounts = rng.lognormal(mean=0.0, sigma=0.6, size=rows) * _BASE_AMOUNTS[
+        category_idx % len(_BASE_AMOUNTS)
+    ]
+
+    return pd.DataFrame(
+        {
+            "date": pd.Timestamp(start)
+            + pd.to_timedelta(rng.integers(0, days, size=rows), unit="D"),
+            "category": np.asarray(DEFAULT_CATEGORIES, dtype=object)[category_idx],
+            "amount_cents": np.round(amounts * 100).astype(np.int64),
+            "description": "spesa sintetica",
+            "account_id": rng.integers(1, accounts + 1, size=rows),
+        }
+    )
+
+
+def populate(
+    engine: Engine,
+    rows: int,
+    years: int = 5,
+    accounts: int = 3,
+    skew: float = 1.1,
+    incomes: bool = True,
+    seed: int = 42,
+    chunk_size: int = 200_000,
+) -> Dict[str, Any]:
+    """Ricrea lo schema e lo riempie con uno storico sintetico degli ultimi `years` anni
+
+    Le spese sono `rows` in totale (rows / (years * 12) al mese in media), suddivise tra
+    `accounts` account; se `incomes` è vero ogni account riceve un'entrata al mese.
+    """
+    rng = np.random.default_rng(seed)
+    end = date.today().replace(day=1) + relativedelta(months=1)
+    start = end - relativedelta(years=years)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    # lo schema ricreato ha nuove chiavi per le categorie
+    clear_category_cache()
+
+    started = time.perf_counter()
+    with Session(engine) as session:
+        session.execute(
+            insert(Account), [{"name": f"Conto {i}"} for i in range(1, accounts + 1)]
+        )
+        if incomes:
+            months = pd.date_range(start, end, freq="MS", inclusive="left")
+            session.execute(
+                insert(Income),
+                [
+                    {
+                        "date": month.date() + relativedelta(days=26),
+                        "amount_cents": int(round(rng.normal(2200, 300) * 100)),
+                        "account_id": account_id,
+                    }
+                    for month in months
+                    for account_id in range(1, accounts + 1)
+                ],
+            )
+        session.commit()
+
+        for offset in range(0, rows, chunk_size):
+            df = generate_expenses(
+                rng, min(chunk_size, rows - offset), start, end, accounts, skew
+            )
+            df["date"] = df["date"].dt.date
+            load_expense_chunk(session, with_category_ids(session, df))
+            session.commit()
+
+        rebuild_expense_rollup(session)
+
+    return {
+        "rows": rows,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "accounts": accounts,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument(
+        "--skew", type=float, default=1.1, help="asimmetria tra categorie (0 = uniforme)"
+    )
+    parser.add_argument("--no-incomes", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--url", required=True, help="database di benchmark: verrà svuotato"
+    )
+    parser.add_argument("--rows", type=int, default=100_000)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    print(
+        populate(
+            create_engine(args.url),
+            rows=args.rows,
+            years=args.years,
+            accounts=args.accounts,
+            skew=args.skew,
+            incomes=not args.no_incomes,
+            seed=args.seed,
+        )
+    )
@@ -1,9 +1,11 @@
 import streamlit as st
 from datetime import datetime, date
-from database.postgres_connection import init_postgres_db
+from database.connection import get_engine, session_scope
+from database.instrumentation import page_run
+from services.account_service import get_account_options
+from services.category_service import get_categories
 from services.expense_service import (
-    CATEGORIES,
-    get_all_expenses,
+    list_expenses,
     add_expense,
     get_expense_by_id,
     update_expense,
@@ -12,261 +14,292 @@ from services.expense_service import (
 
 st.set_page_config(page_title="Gestione Spese Personali", page_icon="💰", layout="wide")
 
-pg_engine, pg_session = init_postgres_db()
+pg_engine = get_engine()
+# elenco letto una volta dal database e tenuto in memoria
+categories = get_categories(pg_engine)
 
-st.header("Inserisci una Nuova Spesa")
-st.title("Inserisci una Nuova Spesa")
+with page_run("create_expense"), session_scope() as pg_session:
+    st.header("Inserisci una Nuova Spesa")
+    st.title("Inserisci una Nuova Spesa")
 
-col1, col2 = st.columns(2)
+    col1, col2 = st.columns(2)
 
-with col1:
-    expense_date = st.date_input("Data", value=date.today(), format="YYYY-MM-DD")
+    with col1:
+        expense_date = st.date_input("Data", value=date.today(), format="YYYY-MM-DD")
 
-    category = st.selectbox("Categoria", options=CATEGORIES)
+        category = st.selectbox("Categoria", options=categories)
 
-    amount = st.number_input("Importo (€)", min_value=0.0, step=0.01, format="%.2f")
+        amount = st.number_input("Importo (€)", min_value=0.0, step=0.01, format="%.2f")
 
-with col2:
-    description = st.text_area(
-        "Descrizione *",
-        height=150,
-        placeholder="Inserisci una descrizione della spesa...",
-    )
+        # 0 = nessun account
+        account_options = get_account_options(pg_session)
+        account_id = st.selectbox(
+            "Account", options=list(account_options), format_func=account_options.get
+        )
 
-if st.button("💾 Salva Spesa", type="primary", use_container_width=True):
-    if not expense_date:
-        st.error("⚠️ La data è obbligatoria!")
-    elif not category:
-        st.error("⚠️ La categoria è obbligatoria!")
-    elif amount <= 0:
-        st.error("⚠️ L'importo deve essere maggiore di zero!")
-    else:
-        success = add_expense(
-            session=pg_session,
-            date=expense_date.strftime("%Y-%m-%d"),
-            category=category,
-            amount=amount,
-            description=description,
+    with col2:
+        description = st.text_area(
+            "Descrizione *",
+            height=150,
+            placeholder="Inserisci una descrizione della spesa...",
         )
 
-        if success:
-            st.success(
-                f"✅ Spesa di €{amount:.2f} per '{category}' salvata con successo!"
-            )
-            st.balloons()
+    if st.button("💾 Salva Spesa", type="primary", use_container_width=True):
+        if not expense_date:
+            st.error("⚠️ La data è obbligatoria!")
+        elif not category:
+            st.error("⚠️ La categoria è obbligatoria!")
+        elif amount <= 0:
+            st.error("⚠️ L'importo deve essere maggiore di zero!")
         else:
-            st.error("❌ Errore nel salvare la spesa. Riprova.")
+            success = add_expense(
+                session=pg_session,
+                date=expense_date.strftime("%Y-%m-%d"),
+                category=category,
+                amount=amount,
+                description=description,
+                account_id=account_id or None,
+            )
 
-# Gestione spese esistenti
-st.divider()
-st.subheader("✏️ Gestisci Spese Esistenti")
+            if success:
+                st.success(
+                    f"✅ Spesa di €{amount:.2f} per '{category}' salvata con successo!"
+                )
+                st.balloons()
+            else:
+                st.error("❌ Errore nel salvare la spesa. Riprova.")
 
-all_expenses = get_all_expenses(pg_engine)
+    # Gestione spese esistenti
+    st.divider()
+    st.subheader("✏️ Gestisci Spese Esistenti")
 
-if not all_expenses.empty:
     # Filtri
     col1, col2 = st.columns([2, 1])
     with col1:
         filter_category = st.multiselect(
-            "Filtra per categoria", options=["Tutte"] + CATEGORIES, default=["Tutte"]
+            "Filtra per categoria", options=["Tutte"] + categories, default=["Tutte"]
         )
     with col2:
         num_to_show = st.selectbox(
-            "Numero di spese da mostrare", options=[10, 25, 50, 100, "Tutte"], index=0
+            "Numero di spese da mostrare", options=[10, 25, 50, 100], index=0
         )
 
-    # Applica filtri
-    filtered_expenses = all_expenses.copy()
-    if "Tutte" not in filter_category and filter_category:
-        filtered_expenses = filtered_expenses[
-            filtered_expenses["category"].isin(filter_category)
-        ]
-
-    if num_to_show != "Tutte":
-        filtered_expenses = filtered_expenses.head(num_to_show)  # type: ignore
-
-    # Mostra tabella
-    st.write(f"**{len(filtered_expenses)}** spese trovate")
-
-    # Crea una tabella con azioni
-    for idx, row in filtered_expenses.iterrows():
-        with st.container():
-            col1, col2, col3, col4, col5, col6 = st.columns([1.5, 1.5, 1, 2, 0.8, 0.8])
-
-            with col1:
-                st.write(f"📅 {row['date'].strftime('%d/%m/%Y')}")
-            with col2:
-                st.write(f"🏷️ {row['category']}")
-            with col3:
-                st.write(f"💰 €{row['amount']:.2f}")
-            with col4:
-                if row["description"]:
-                    st.write(
-                        f"📝 {row['description'][:50]}{'...' if len(row['description']) > 50 else ''}"
-                    )
-            with col5:
-                edit_key = f"edit_{row['id']}"
-                if st.button("✏️", key=edit_key, help="Modifica"):
-                    st.session_state["editing_expense_id"] = row["id"]
-                    st.rerun()
-            with col6:
-                delete_key = f"delete_{row['id']}"
-                if st.button("🗑️", key=delete_key, help="Elimina", type="secondary"):
-                    st.session_state["deleting_expense_id"] = row["id"]
-                    st.rerun()
-
-    # Dialogo di modifica
-    if "editing_expense_id" in st.session_state:
-        expense_id = st.session_state["editing_expense_id"]
-        expense = get_expense_by_id(session=pg_session, expense_id=expense_id)
-
-        if expense:
-            st.divider()
-            st.subheader(f"✏️ Modifica Spesa #{expense_id}")
-
-            # Inizializza i valori in session_state se non esistono
-            if f"edit_date_{expense_id}" not in st.session_state:
-                st.session_state[f"edit_date_{expense_id}"] = datetime.strptime(
-                    expense["date"], "%Y-%m-%d"
-                ).date()
-                st.session_state[f"edit_category_{expense_id}"] = expense["category"]
-                st.session_state[f"edit_amount_{expense_id}"] = float(expense["amount"])
-                st.session_state[f"edit_description_{expense_id}"] = expense[
-                    "description"
-                ]
-
-            col1, col2 = st.columns(2)
-
-            with col1:
-                edit_date = st.date_input(
-                    "Data",
-                    value=st.session_state[f"edit_date_{expense_id}"],
-                    format="YYYY-MM-DD",
-                    key=f"date_input_{expense_id}",
-                )
-                st.session_state[f"edit_date_{expense_id}"] = edit_date
-
-                edit_category = st.selectbox(
-                    "Categoria",
-                    options=CATEGORIES,
-                    index=(
-                        CATEGORIES.index(
-                            st.session_state[f"edit_category_{expense_id}"]
+    selected_categories = (
+        filter_category if "Tutte" not in filter_category and filter_category else None
+    )
+
+    # Cursori delle pagine visitate: si riparte dalla prima se cambiano i filtri
+    list_filters = (tuple(filter_category), num_to_show)
+    if st.session_state.get("expense_list_filters") != list_filters:
+        st.session_state["expense_list_filters"] = list_filters
+        st.session_state["expense_list_cursors"] = [None]
+    cursors = st.session_state["expense_list_cursors"]
+
+    filtered_expenses, next_cursor = list_expenses(
+        pg_engine,
+        categories=selected_categories,
+        after=cursors[-1],
+        limit=num_to_show,
+    )
+
+    if not filtered_expenses.empty:
+        # Mostra tabella
+        st.write(
+            f"Pagina **{len(cursors)}**: **{len(filtered_expenses)}** spese mostrate"
+        )
+
+        # Crea una tabella con azioni
+        for idx, row in filtered_expenses.iterrows():
+            with st.container():
+                col1, col2, col3, col4, col5, col6 = st.columns([1.5, 1.5, 1, 2, 0.8, 0.8])
+
+                with col1:
+                    st.write(f"📅 {row['date'].strftime('%d/%m/%Y')}")
+                with col2:
+                    st.write(f"🏷️ {row['category']}")
+                with col3:
+                    st.write(f"💰 €{row['amount']:.2f}")
+                with col4:
+                    if row["description"]:
+                        st.write(
+                            f"📝 {row['description'][:50]}{'...' if len(row['description']) > 50 else ''}"
                         )
-                        if st.session_state[f"edit_category_{expense_id}"] in CATEGORIES
-                        else 0
-                    ),
-                    key=f"category_input_{expense_id}",
-                )
-                st.session_state[f"edit_category_{expense_id}"] = edit_category
-
-                edit_amount = st.number_input(
-                    "Importo (€)",
-                    min_value=0.01,
-                    value=st.session_state[f"edit_amount_{expense_id}"],
-                    step=0.01,
-                    format="%.2f",
-                    key=f"amount_input_{expense_id}",
-                )
-                st.session_state[f"edit_amount_{expense_id}"] = edit_amount
-
-            with col2:
-                edit_description = st.text_area(
-                    "Descrizione *",
-                    value=st.session_state[f"edit_description_{expense_id}"],
-                    height=150,
-                    key=f"description_input_{expense_id}",
-                )
-                st.session_state[f"edit_description_{expense_id}"] = edit_description
-
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button(
-                    "💾 Salva Modifiche",
-                    type="primary",
-                    use_container_width=True,
-                    key=f"save_btn_{expense_id}",
-                ):
-                    if (
-                        not st.session_state[f"edit_description_{expense_id}"]
-                        or st.session_state[f"edit_description_{expense_id}"].strip()
-                        == ""
+                with col5:
+                    edit_key = f"edit_{row['id']}"
+                    if st.button("✏️", key=edit_key, help="Modifica"):
+                        st.session_state["editing_expense_id"] = row["id"]
+                        st.rerun()
+                with col6:
+                    delete_key = f"delete_{row['id']}"
+                    if st.button("🗑️", key=delete_key, help="Elimina", type="secondary"):
+                        st.session_state["deleting_expense_id"] = row["id"]
+                        st.rerun()
+
+        # Navigazione tra le pagine
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            if st.button("◀ Precedenti", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if st.button("Successive ▶", disabled=next_cursor is None):
+                cursors.append(next_cursor)
+                st.rerun()
+
+        # Dialogo di modifica
+        if "editing_expense_id" in st.session_state:
+            expense_id = st.session_state["editing_expense_id"]
+            expense = get_expense_by_id(session=pg_session, expense_id=expense_id)
+
+            if expense:
+                st.divider()
+                st.subheader(f"✏️ Modifica Spesa #{expense_id}")
+
+                # Inizializza i valori in session_state se non esistono
+                if f"edit_date_{expense_id}" not in st.session_state:
+                    st.session_state[f"edit_date_{expense_id}"] = datetime.strptime(
+                        expense["date"], "%Y-%m-%d"
+                    ).date()
+                    st.session_state[f"edit_category_{expense_id}"] = expense["category"]
+                    st.session_state[f"edit_amount_{expense_id}"] = float(expense["amount"])
+                    st.session_state[f"edit_description_{expense_id}"] = expense[
+                        "description"
+                    ]
+
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    edit_date = st.date_input(
+                        "Data",
+                        value=st.session_state[f"edit_date_{expense_id}"],
+                        format="YYYY-MM-DD",
+                        key=f"date_input_{expense_id}",
+                    )
+                    st.session_state[f"edit_date_{expense_id}"] = edit_date
+
+                    edit_category = st.selectbox(
+                        "Categoria",
+                        options=categories,
+                        index=(
+                            categories.index(
+                                st.session_state[f"edit_category_{expense_id}"]
+                            )
+                            if st.session_state[f"edit_category_{expense_id}"] in categories
+                            else 0
+                        ),
+                        key=f"category_input_{expense_id}",
+                    )
+                    st.session_state[f"edit_category_{expense_id}"] = edit_category
+
+                    edit_amount = st.number_input(
+                        "Importo (€)",
+                        min_value=0.01,
+                        value=st.session_state[f"edit_amount_{expense_id}"],
+                        step=0.01,
+                        format="%.2f",
+                        key=f"amount_input_{expense_id}",
+                    )
+                    st.session_state[f"edit_amount_{expense_id}"] = edit_amount
+
+                with col2:
+                    edit_description = st.text_area(
+                        "Descrizione *",
+                        value=st.session_state[f"edit_description_{expense_id}"],
+                        height=150,
+                        key=f"description_input_{expense_id}",
+                    )
+                    st.session_state[f"edit_description_{expense_id}"] = edit_description
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button(
+                        "💾 Salva Modifiche",
+                        type="primary",
+                        use_container_width=True,
+                        key=f"save_btn_{expense_id}",
                     ):
-                        st.error("⚠️ La descrizione è obbligatoria!")
-                    elif st.session_state[f"edit_amount_{expense_id}"] <= 0:
-                        st.error("⚠️ L'importo deve essere maggiore di zero!")
-                    else:
-                        success = update_expense(
-                            session=pg_session,
-                            expense_id=expense_id,
-                            date=st.session_state[f"edit_date_{expense_id}"].strftime(
-                                "%Y-%m-%d"
-                            ),
-                            category=st.session_state[f"edit_category_{expense_id}"],
-                            amount=st.session_state[f"edit_amount_{expense_id}"],
-                            description=st.session_state[
-                                f"edit_description_{expense_id}"
-                            ],
-                        )
+                        if (
+                            not st.session_state[f"edit_description_{expense_id}"]
+                            or st.session_state[f"edit_description_{expense_id}"].strip()
+                            == ""
+                        ):
+                            st.error("⚠️ La descrizione è obbligatoria!")
+                        elif st.session_state[f"edit_amount_{expense_id}"] <= 0:
+                            st.error("⚠️ L'importo deve essere maggiore di zero!")
+                        else:
+                            success = update_expense(
+                                session=pg_session,
+                                expense_id=expense_id,
+                                date=st.session_state[f"edit_date_{expense_id}"].strftime(
+                                    "%Y-%m-%d"
+                                ),
+                                category=st.session_state[f"edit_category_{expense_id}"],
+                                amount=st.session_state[f"edit_amount_{expense_id}"],
+                                description=st.session_state[
+                                    f"edit_description_{expense_id}"
+                                ],
+                            )
 
-                        if success:
-                            st.success("✅ Spesa aggiornata con successo!")
-                            # Pulizia session state
-                            for key in [
-                                f"edit_date_{expense_id}",
-                                f"edit_category_{expense_id}",
-                                f"edit_amount_{expense_id}",
-                                f"edit_description_{expense_id}",
-                            ]:
-                                if key in st.session_state:
-                                    del st.session_state[key]
-                            del st.session_state["editing_expense_id"]
+                            if success:
+                                st.success("✅ Spesa aggiornata con successo!")
+                                # Pulizia session state
+                                for key in [
+                                    f"edit_date_{expense_id}",
+                                    f"edit_category_{expense_id}",
+                                    f"edit_amount_{expense_id}",
+                                    f"edit_description_{expense_id}",
+                                ]:
+                                    if key in st.session_state:
+                                        del st.session_state[key]
+                                del st.session_state["editing_expense_id"]
+                                st.rerun()
+                            else:
+                                st.error("❌ Errore nell'aggiornare la spesa. Riprova.")
+                with col2:
+                    if st.button(
+                        "❌ Annulla",
+                        use_container_width=True,
+                        key=f"cancel_btn_{expense_id}",
+                    ):
+                        # Pulizia session state
+                        for key in [
+                            f"edit_date_{expense_id}",
+                            f"edit_category_{expense_id}",
+                            f"edit_amount_{expense_id}",
+                            f"edit_description_{expense_id}",
+                        ]:
+                            if key in st.session_state:
+                                del st.session_state[key]
+                        del st.session_state["editing_expense_id"]
+                        st.rerun()
+
+        # Dialogo di conferma eliminazione
+        if "deleting_expense_id" in st.session_state:
+            expense_id = st.session_state["deleting_expense_id"]
+            expense = get_expense_by_id(session=pg_session, expense_id=expense_id)
+
+            if expense:
+                st.divider()
+                st.warning("⚠️ **Sei sicuro di voler eliminare questa spesa?**")
+                st.write(f"**Data:** {expense['date']}")
+                st.write(f"**Categoria:** {expense['category']}")
+                st.write(f"**Importo:** €{expense['amount']:.2f}")
+                st.write(f"**Descrizione:** {expense['description']}")
+
+                col1, col2, col3 = st.columns([1, 1, 2])
+                with col1:
+                    if st.button("🗑️ Sì, Elimina", type="primary", use_container_width=True):
+                        if delete_expense(session=pg_session, expense_id=expense_id):
+                            st.success("✅ Spesa eliminata con successo!")
+                            del st.session_state["deleting_expense_id"]
                             st.rerun()
                         else:
-                            st.error("❌ Errore nell'aggiornare la spesa. Riprova.")
-            with col2:
-                if st.button(
-                    "❌ Annulla",
-                    use_container_width=True,
-                    key=f"cancel_btn_{expense_id}",
-                ):
-                    # Pulizia session state
-                    for key in [
-                        f"edit_date_{expense_id}",
-                        f"edit_category_{expense_id}",
-                        f"edit_amount_{expense_id}",
-                        f"edit_description_{expense_id}",
-                    ]:
-                        if key in st.session_state:
-                            del st.session_state[key]
-                    del st.session_state["editing_expense_id"]
-                    st.rerun()
-
-    # Dialogo di conferma eliminazione
-    if "deleting_expense_id" in st.session_state:
-        expense_id = st.session_state["deleting_expense_id"]
-        expense = get_expense_by_id(session=pg_session, expense_id=expense_id)
-
-        if expense:
-            st.divider()
-            st.warning("⚠️ **Sei sicuro di voler eliminare questa spesa?**")
-            st.write(f"**Data:** {expense['date']}")
-            st.write(f"**Categoria:** {expense['category']}")
-            st.write(f"**Importo:** €{expense['amount']:.2f}")
-            st.write(f"**Descrizione:** {expense['description']}")
-
-            col1, col2, col3 = st.columns([1, 1, 2])
-            with col1:
-                if st.button("🗑️ Sì, Elimina", type="primary", use_container_width=True):
-                    if delete_expense(session=pg_session, expense_id=expense_id):
-                        st.success("✅ Spesa eliminata con successo!")
+                            st.error("❌ Errore nell'eliminare la spesa.")
+                with col2:
+                    if st.button("❌ Annulla", use_container_width=True):
                         del st.session_state["deleting_expense_id"]
                         st.rerun()
-                    else:
-                        st.error("❌ Errore nell'eliminare la spesa.")
-            with col2:
-                if st.button("❌ Annulla", use_container_width=True):
-                    del st.session_state["deleting_expense_id"]
-                    st.rerun()
-else:
-    st.info("Nessuna spesa registrata ancora.")
+    elif len(cursors) == 1 and selected_categories is None:
+        st.info("Nessuna spesa registrata ancora.")
+    else:
+        st.info("Nessuna spesa trovata con i filtri selezionati.")
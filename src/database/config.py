@@ -0,0 +1,172 @@
+import os
+import tomllib
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict
+
+# stessi percorsi letti da st.secrets: globale dell'utente, poi quello del progetto
+SECRETS_PATHS = [
+    Path.home() / ".streamlit" / "secrets.toml",
+    Path.cwd() / ".streamlit" / "secrets.toml",
+]
+
+
+@lru_cache(maxsize=1)
+def load_secrets() -> Dict[str, Any]:
+    """Legge i secrets di Streamlit dai file TOML, senza importare streamlit"""
+    secrets: Dict[str, Any] = {}
+    for path in SECRETS_PATHS:
+        if path.is_file():
+            with path.open("rb") as f:
+                secrets.update(tomllib.load(f))
+    return secrets
+
+
+def get_postgres_config() -> Dict[str, Any]:
+    """Credenziali e impostazioni del pool: dai secrets se presenti, altrimenti dall'ambiente"""
+    section = load_secrets().get("postgres")
+    if section:
+        config = {
+            "user": section["DB_USER"],
+            "password": section["DB_PASS"],
+            "host": section["DB_HOST"],
+            "name": section["DB_NAME"],
+        }
+        pool = section.get("pool", {})
+    else:
+        config = {
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASS"),
+            "host": os.getenv("DB_HOST"),
+            "name": os.getenv("DB_NAME"),
+        }
+        pool = {}
+
+    config["pool"] = {
+        name: int(pool.get(name, os.getenv(f"DB_POOL_{name.upper()}", default)))
+        for name, default in [
+            ("size", 5),
+            ("max_overflow", 10),
+            ("timeout", 30),
+            ("recycle", 1800),
+        ]
+    }
+    return config
+
+
+def get_postgres_url(config: Dict[str, Any]) -> str:
+    return (
+        f"postgresql+psycopg2://{config['user']}:{config['password']}@{config['host']}/{config['name']}"
+        "?sslmode=require&channel_binding=require"
+    )
+
+
+# backend usato quando non è configurato nulla
+DEFAULT_BACKEND = "postgresql"
+
+BACKENDS = ("postgresql", "sqlite")
+
+DEFAULT_SQLITE_PATH = Path.cwd() / "expenses.db"
+
+
+def get_backend() -> str:
+    """Database da usare ("postgresql" o "sqlite"): DB_BACKEND dai secrets o dall'ambiente"""
+    backend = (
+        load_secrets().get("DB_BACKEND") or os.getenv("DB_BACKEND") or DEFAULT_BACKEND
+    ).lower()
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"DB_BACKEND non valido: '{backend}'. Valori ammessi: {', '.join(BACKENDS)}"
+        )
+    return backend
+
+
+def get_sqlite_url() -> str:
+    return (
+        load_secrets().get("SQLITE_URL")
+        or os.getenv("SQLITE_URL")
+        or f"sqlite:///{DEFAULT_SQLITE_PATH}"
+    )
+
+
+def get_sqlite_pragmas() -> Dict[str, Any]:
+    """PRAGMA applicati ad ogni connessione SQLite, sovrascrivibili con [sqlite] nei secrets"""
+    pragmas: Dict[str, Any] = {
+        # i lettori non bloccano lo scrittore e viceversa
+        "journal_mode": "WAL",
+        # con WAL resta consistente, perde al più l'ultima transazione in caso di crash
+        "synchronous": "NORMAL",
+        "mmap_size": 256 << 20,
+        # valore negativo = KiB: 64 MiB di page cache per connessione
+        "cache_size": -(64 << 10),
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "foreign_keys": "ON",
+    }
+    pragmas.update(load_secrets().get("sqlite", {}))
+    return pragmas
+
+
+def get_expense_store_settings() -> Dict[str, Any]:
+    """Impostazioni dello snapshot colonnare delle spese: [expense_store] nei secrets o EXPENSE_STORE_*
+
+    Spento di default: ogni processo Streamlit tiene in memoria l'intera tabella expenses
+    (circa 65 byte per spesa più la descrizione, il doppio durante un aggiornamento).
+    """
+    section = load_secrets().get("expense_store", {})
+    enabled = section.get("enabled", os.getenv("EXPENSE_STORE_ENABLED", "0"))
+    return {
+        "enabled": str(enabled).lower() in ("1", "true", "yes"),
+        # ogni quanti secondi cercare le spese scritte da altri processi
+        "refresh_seconds": float(
+            section.get("refresh_seconds", os.getenv("EXPENSE_STORE_REFRESH_SECONDS", 5))
+        ),
+        # ricaricamento completo periodico, per le transazioni confermate dopo il watermark
+        "full_refresh_seconds": float(
+            section.get(
+                "full_refresh_seconds",
+                os.getenv("EXPENSE_STORE_FULL_REFRESH_SECONDS", 300),
+            )
+        ),
+    }
+
+
+def get_diagnostics_settings() -> Dict[str, Any]:
+    """Strumentazione di query e pagine: [diagnostics] nei secrets o DIAGNOSTICS_*, spenta di default"""
+    section = load_secrets().get("diagnostics", {})
+
+    def flag(name: str, default: str) -> bool:
+        value = section.get(name, os.getenv(f"DIAGNOSTICS_{name.upper()}", default))
+        return str(value).lower() in ("1", "true", "yes")
+
+    return {
+        "enabled": flag("enabled", "0"),
+        # cProfile di ogni esecuzione di pagina (rallenta sensibilmente le pagine)
+        "profile": flag("profile", "0"),
+        "max_queries": int(
+            section.get("max_queries", os.getenv("DIAGNOSTICS_MAX_QUERIES", 5000))
+        ),
+        "max_runs": int(section.get("max_runs", os.getenv("DIAGNOSTICS_MAX_RUNS", 500))),
+        # esecuzioni della stessa query in una pagina oltre le quali si segnala un N+1
+        "n_plus_one_threshold": int(
+            section.get(
+                "n_plus_one_threshold", os.getenv("DIAGNOSTICS_N_PLUS_ONE_THRESHOLD", 5)
+            )
+        ),
+    }
+
+
+def get_partitioning_settings() -> Dict[str, Any]:
+    """Partizionamento per anno di expenses (solo PostgreSQL): [partitioning] nei secrets o EXPENSES_PARTITIONING_*"""
+    section = load_secrets().get("partitioning", {})
+    enabled = section.get("enabled", os.getenv("EXPENSES_PARTITIONING_ENABLED", "0"))
+    return {
+        "enabled": str(enabled).lower() in ("1", "true", "yes"),
+        # anni futuri con la partizione già pronta (almeno il successivo)
+        "years_ahead": max(
+            1,
+            int(
+                section.get("years_ahead", os.getenv("EXPENSES_PARTITIONING_YEARS_AHEAD", 1))
+            ),
+        ),
+    }
@@ -0,0 +1,97 @@
+import threading
+from contextlib import contextmanager
+from types import ModuleType
+from typing import Any, Dict, Iterator, Optional
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from .base import Base
+from .config import get_backend
+from .instrumentation import instrument_engine
+from .migrations import run_migrations
+
+# Ogni backend (DB_BACKEND) costruisce solo il proprio engine (URL, pool, PRAGMA):
+# cache dell'engine, schema e sessioni sono gli stessi per tutti e stanno qui.
+
+# collegata all'engine alla prima richiesta: importare il modulo non apre connessioni
+AppSession = sessionmaker()
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _backend() -> ModuleType:
+    """Modulo di connessione del backend configurato (DB_BACKEND), importato solo se usato"""
+    if get_backend() == "sqlite":
+        from . import sqlite_connection
+
+        return sqlite_connection
+
+    from . import postgres_connection
+
+    return postgres_connection
+
+
+def _get_engine() -> Engine:
+    """Engine del backend configurato, creato una sola volta per processo"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = _backend().create_backend_engine()
+                instrument_engine(engine)
+                AppSession.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def ensure_schema() -> None:
+    """Crea e migra lo schema una sola volta per processo"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            engine = _get_engine()
+            Base.metadata.create_all(engine)
+            run_migrations(engine)
+            _schema_ready = True
+
+
+def get_engine() -> Engine:
+    ensure_schema()
+    return _get_engine()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Sessione per un singolo rerun: all'uscita viene chiusa e la connessione torna al pool"""
+    ensure_schema()
+    session = AppSession()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+def new_session() -> Session:
+    """Nuova sessione (da chiudere a cura del chiamante); per le pagine usare session_scope"""
+    ensure_schema()
+    return AppSession()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Stato del pool di connessioni"""
+    pool: Any = _get_engine().pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "status": pool.status(),
+    }
@@ -0,0 +1,15 @@
+from typing import Any, Callable
+from sqlalchemy import Engine, Connection
+
+
+def dialect_insert(bind: Engine | Connection) -> Callable[..., Any]:
+    """Restituisce il costrutto insert con supporto ON CONFLICT per il dialetto in uso"""
+    if bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        return insert
+    if bind.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+
+        return insert
+    raise NotImplementedError(f"Dialetto non supportato: {bind.dialect.name}")
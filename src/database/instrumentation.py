@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterator, List, Optional
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.engine import ExceptionContext, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from .config import get_diagnostics_settings
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Tempi di query e pagine per la pagina di diagnostica. Spenta di default: senza
+# DIAGNOSTICS_ENABLED gli engine non hanno listener e page_run non misura nulla.
+
+_lock = threading.Lock()
+_queries: Deque[Dict[str, Any]] = deque()
+_runs: Deque[Dict[str, Any]] = deque()
+# esecuzione di pagina in corso nel thread (ogni rerun di Streamlit ha il suo thread)
+_local = threading.local()
+
+
+@lru_cache(maxsize=1)
+def _settings() -> Dict[str, Any]:
+    return get_diagnostics_settings()
+
+
+def diagnostics_enabled() -> bool:
+    return bool(_settings()["enabled"])
+
+
+def _before_cursor_execute(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: Optional[ExecutionContext],
+    executemany: bool,
+) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: Any,
+    context: Optional[ExecutionContext],
+    executemany: bool,
+) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    run = getattr(_local, "run", None)
+    record = {
+        "statement": statement,
+        "ms": elapsed * 1000,
+        "rows": cursor.rowcount if cursor.rowcount >= 0 else None,
+        "executemany": executemany,
+        "page": run["page"] if run else None,
+        "run_id": run["run_id"] if run else None,
+        "at": time.time(),
+    }
+    with _lock:
+        _queries.append(record)
+        while len(_queries) > _settings()["max_queries"]:
+            _queries.popleft()
+        # anche i thread di services.page_data aggiornano la stessa esecuzione
+        if run is not None:
+            run["queries"] += 1
+            run["query_ms"] += record["ms"]
+
+
+def _handle_error(exception_context: ExceptionContext) -> None:
+    # la query fallita non arriva ad after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Registra i listener sulle query dell'engine, solo se la diagnostica è attiva"""
+    if not diagnostics_enabled():
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def current_run() -> Optional[Dict[str, Any]]:
+    """Esecuzione di pagina in corso nel thread (None senza diagnostica)"""
+    return getattr(_local, "run", None)
+
+
+@contextmanager
+def attach_run(run: Optional[Dict[str, Any]]) -> Iterator[None]:
+    """Attribuisce a `run` le query di un thread di lavoro"""
+    previous = getattr(_local, "run", None)
+    _local.run = run
+    try:
+        yield
+    finally:
+        _local.run = previous
+
+
+_run_ids = iter(range(1, 1 << 62))
+
+
+@contextmanager
+def page_run(page: str) -> Iterator[None]:
+    """Misura un'esecuzione dello script di pagina (ed eventualmente la profila)"""
+    if not diagnostics_enabled():
+        yield
+        return
+
+    with _lock:
+        run_id = next(_run_ids)
+    run: Dict[str, Any] = {
+        "run_id": run_id,
+        "page": page,
+        "at": time.time(),
+        "queries": 0,
+        "query_ms": 0.0,
+        "profile": None,
+    }
+    profiler = cProfile.Profile() if _settings()["profile"] else None
+    _local.run = run
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        # anche st.stop() e st.rerun() passano da qui (sono eccezioni)
+        if profiler is not None:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(40)
+            run["profile"] = output.getvalue()
+        run["ms"] = (time.perf_counter() - started) * 1000
+        _local.run = None
+        with _lock:
+            _runs.append(run)
+            while len(_runs) > _settings()["max_runs"]:
+                _runs.popleft()
+
+
+def reset_diagnostics() -> None:
+    with _lock:
+        _queries.clear()
+        _runs.clear()
+
+
+def get_query_log() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_queries)
+
+
+def get_page_runs() -> List[Dict[str, Any]]:
+    with _lock:
+        return list(_runs)
+
+
+def slowest_queries(limit: int = 20) -> pd.DataFrame:
+    """Le query più lente registrate"""
+    import pandas as pd
+
+    df = pd.DataFrame(get_query_log())
+    if df.empty:
+        return df
+    return df.nlargest(limit, "ms")[["page", "ms", "rows", "executemany", "statement"]]
+
+
+def page_timings() -> pd.DataFrame:
+    """Esecuzioni, p50 e p95 della durata e delle query per pagina"""
+    import pandas as pd
+
+    df = pd.DataFrame(get_page_runs())
+    if df.empty:
+        return df
+    return (
+        df.groupby("page")
+        .agg(
+            runs=("ms", "size"),
+            p50_ms=("ms", "median"),
+            p95_ms=("ms", lambda ms: ms.quantile(0.95)),
+            queries_p50=("queries", "median"),
+            query_ms_p50=("query_ms", "median"),
+        )
+        .sort_values("p95_ms", ascending=False)
+        .reset_index()
+    )
+
+
+def n_plus_one_patterns(threshold: Optional[int] = None) -> pd.DataFrame:
+    """Query ripetute molte volte nella stessa esecuzione di pagina (tipico N+1)"""
+    import pandas as pd
+
+    threshold = threshold or _settings()["n_plus_one_threshold"]
+    df = pd.DataFrame(get_query_log())
+    if df.empty or df["run_id"].isna().all():
+        return pd.DataFrame()
+
+    per_run = (
+        df.dropna(subset=["run_id"])
+        .groupby(["page", "run_id", "statement"])
+        .agg(executions=("ms", "size"), total_ms=("ms", "sum"))
+        .reset_index()
+    )
+    per_run = per_run[per_run["executions"] >= threshold]
+    return (
+        per_run.groupby(["page", "statement"])
+        .agg(
+            runs=("run_id", "nunique"),
+            max_executions=("executions", "max"),
+            total_ms=("total_ms", "sum"),
+        )
+        .sort_values("total_ms", ascending=False)
+        .reset_index()
+    )
@@ -0,0 +1,321 @@
+from datetime import date
+from sqlalchemy import BigInteger, Date, Engine, column, exists, insert, inspect, select, text
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from .base import Base
+from .models import (
+    Category,
+    Expense,
+    ExpenseRollup,
+    MonthlyTarget,
+    TargetVersion,
+    euros_expr,
+    utc_timestamp,
+    year_month_expr,
+)
+from .partitioning import partition_expenses_by_year
+
+# categorie inserite nei database che non ne hanno ancora (poi si gestiscono da tabella)
+DEFAULT_CATEGORIES = [
+    "Mutuo",
+    "Casa",
+    "Investimenti",
+    "Spese auto",
+    "Svago",
+    "Alimentari",
+    "Viaggi",
+    "Regali",
+    "Salute",
+    "Cane",
+    "Parrucchiere",
+    "Mensa",
+    "Telefono",
+    "Donazione",
+    "Caffè",
+    "Abbigliamento",
+]
+
+
+def _column_names(engine: Engine, table: str) -> set[str]:
+    return {col["name"] for col in inspect(engine).get_columns(table)}
+
+
+# tabelle con la colonna generata year_month calcolata da date
+YEAR_MONTH_TABLES = ("expenses", "incomes")
+
+
+def add_year_month_columns(engine: Engine) -> None:
+    """Aggiunge la colonna generata year_month alle tabelle esistenti"""
+    expr = year_month_expr(column("date", Date)).compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    # SQLite non permette di aggiungere colonne generate STORED a tabelle esistenti
+    storage = "STORED" if engine.dialect.name == "postgresql" else "VIRTUAL"
+
+    for table in YEAR_MONTH_TABLES:
+        if "year_month" in _column_names(engine, table):
+            continue
+
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN year_month INTEGER "
+                    f"GENERATED ALWAYS AS ({expr}) {storage}"
+                )
+            )
+
+
+# tabelle con created_at e updated_at (ChangeTrackingMixin)
+TRACKED_TABLES = ("expenses", "incomes", "accounts")
+
+
+def add_change_tracking(engine: Engine) -> None:
+    """Aggiunge created_at e updated_at alle tabelle esistenti, valorizzate con l'istante attuale"""
+    now = utc_timestamp().compile(dialect=engine.dialect)
+    for table in TRACKED_TABLES:
+        missing = sorted({"created_at", "updated_at"} - _column_names(engine, table))
+        if not missing:
+            continue
+
+        with engine.begin() as conn:
+            for name in missing:
+                if engine.dialect.name == "postgresql":
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {table} ADD COLUMN {name} TIMESTAMP "
+                            f"NOT NULL DEFAULT {now}"
+                        )
+                    )
+                else:
+                    # SQLite non accetta default non costanti in ADD COLUMN
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} TIMESTAMP"))
+                    conn.execute(text(f"UPDATE {table} SET {name} = {now}"))
+
+
+# colonne con default utc_timestamp(), per le scritture fuori dall'ORM (COPY, SQL diretto)
+CHANGE_TIMESTAMP_COLUMNS = [
+    *[(table, name) for table in TRACKED_TABLES for name in ("created_at", "updated_at")],
+    ("deleted_rows", "deleted_at"),
+]
+
+
+def use_utc_change_timestamps(engine: Engine) -> None:
+    """Sostituisce il default CURRENT_TIMESTAMP con l'istante UTC con frazioni di secondo
+
+    Solo PostgreSQL: SQLite non permette di cambiare il default di una colonna esistente
+    (lì CURRENT_TIMESTAMP è già UTC e la finestra di get_changes_since copre il secondo).
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    now = utc_timestamp().compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT table_name || '.' || column_name, column_default "
+                "FROM information_schema.columns WHERE table_schema = current_schema()"
+            )
+        )
+        defaults: Dict[str, Optional[str]] = {key: default for key, default in rows}
+        for table, name in CHANGE_TIMESTAMP_COLUMNS:
+            if "clock_timestamp" not in (defaults.get(f"{table}.{name}") or ""):
+                conn.execute(
+                    text(f"ALTER TABLE {table} ALTER COLUMN {name} SET DEFAULT {now}")
+                )
+
+
+# tabelle con amount_cents e la colonna generata amount
+AMOUNT_TABLES = ("expenses", "incomes")
+
+
+def convert_amounts_to_cents(engine: Engine) -> None:
+    """Sostituisce gli importi Float con centesimi interi e amount generato in euro"""
+    expr = euros_expr(column("amount_cents", BigInteger)).compile(
+        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+    )
+    postgres = engine.dialect.name == "postgresql"
+    for table in AMOUNT_TABLES:
+        if "amount_cents" in _column_names(engine, table):
+            continue
+
+        with engine.begin() as conn:
+            if postgres:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN amount_cents BIGINT"))
+            else:
+                # SQLite aggiunge colonne NOT NULL solo con un default
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} ADD COLUMN amount_cents INTEGER "
+                        "NOT NULL DEFAULT 0"
+                    )
+                )
+            conn.execute(
+                text(f"UPDATE {table} SET amount_cents = CAST(ROUND(amount * 100) AS BIGINT)")
+            )
+            if postgres:
+                conn.execute(
+                    text(f"ALTER TABLE {table} ALTER COLUMN amount_cents SET NOT NULL")
+                )
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN amount"))
+            conn.execute(
+                text(
+                    f"ALTER TABLE {table} ADD COLUMN amount DOUBLE PRECISION "
+                    f"GENERATED ALWAYS AS ({expr}) {'STORED' if postgres else 'VIRTUAL'}"
+                )
+            )
+
+    _recreate_expense_rollups(engine, "total_cents")
+
+
+def _recreate_expense_rollups(engine: Engine, required_column: str) -> None:
+    """Ricrea expense_rollups se manca una colonna: seed_expense_rollups li ripopola"""
+    if required_column not in _column_names(engine, "expense_rollups"):
+        ExpenseRollup.__table__.drop(engine)
+        ExpenseRollup.__table__.create(engine)
+
+
+def seed_categories(engine: Engine) -> None:
+    """Inserisce le categorie iniziali se la tabella è vuota"""
+    with Session(engine) as session:
+        if not session.scalar(select(exists().where(Category.id.isnot(None)))):
+            session.execute(
+                insert(Category), [{"name": name} for name in DEFAULT_CATEGORIES]
+            )
+            session.commit()
+
+
+def normalize_expense_categories(engine: Engine) -> None:
+    """Sostituisce il nome della categoria nelle spese con la chiave category_id"""
+    if "category" in _column_names(engine, "expenses"):
+        with engine.begin() as conn:
+            # anche le categorie usate dalle spese ma assenti dalla tabella
+            conn.execute(
+                text(
+                    "INSERT INTO categories (name) SELECT DISTINCT category FROM expenses "
+                    "WHERE category NOT IN (SELECT name FROM categories) ORDER BY category"
+                )
+            )
+            conn.execute(
+                text(
+                    "ALTER TABLE expenses ADD COLUMN category_id INTEGER "
+                    "REFERENCES categories(id)"
+                )
+            )
+            conn.execute(
+                text(
+                    "UPDATE expenses SET category_id = "
+                    "(SELECT id FROM categories WHERE categories.name = expenses.category)"
+                )
+            )
+            if engine.dialect.name == "postgresql":
+                # SQLite non permette di aggiungere il vincolo a una colonna esistente
+                conn.execute(
+                    text("ALTER TABLE expenses ALTER COLUMN category_id SET NOT NULL")
+                )
+            # sostituito da ix_expenses_category_id_date
+            conn.execute(text("DROP INDEX IF EXISTS ix_expenses_category_date"))
+            conn.execute(text("ALTER TABLE expenses DROP COLUMN category"))
+
+    _recreate_expense_rollups(engine, "category_id")
+
+
+# i target senza storico valevano per ogni mese: la versione copiata parte da qui
+TARGET_HISTORY_START = date(1970, 1, 1)
+
+
+def copy_monthly_targets(engine: Engine) -> None:
+    """Copia i target di monthly_targets in target_versions, validi per tutto lo storico"""
+    with Session(engine) as session:
+        if session.scalar(select(exists().where(TargetVersion.id.isnot(None)))):
+            return
+        targets = session.execute(
+            select(MonthlyTarget.category, MonthlyTarget.target_amount)
+        ).all()
+        if not targets:
+            return
+
+        # import locale: il servizio dipende a sua volta dai modelli
+        from services.money import to_cents
+
+        category_ids = select(Category.name, Category.id)
+        categories: Dict[str, int] = {
+            name: category_id for name, category_id in session.execute(category_ids)
+        }
+        missing = sorted({name for name, _ in targets} - set(categories))
+        if missing:
+            session.execute(insert(Category), [{"name": name} for name in missing])
+            categories = {
+                name: category_id for name, category_id in session.execute(category_ids)
+            }
+
+        session.execute(
+            insert(TargetVersion),
+            [
+                {
+                    "category_id": categories[name],
+                    "valid_from": TARGET_HISTORY_START,
+                    "target_cents": to_cents(amount),
+                }
+                for name, amount in targets
+            ],
+        )
+        session.commit()
+
+
+def create_missing_indexes(engine: Engine) -> None:
+    """Crea gli indici dichiarati nei modelli che mancano nel database"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+def drop_obsolete_indexes(engine: Engine) -> None:
+    """Rimuove gli indici sostituiti da indici più ampi"""
+    with engine.begin() as conn:
+        # sostituito da ix_expenses_date_id
+        conn.execute(text("DROP INDEX IF EXISTS ix_expenses_date"))
+
+
+def seed_expense_rollups(engine: Engine) -> None:
+    """Popola i rollup per i database che avevano già delle spese"""
+    with Session(engine) as session:
+        has_expenses = session.scalar(select(exists().where(Expense.id.isnot(None))))
+        has_rollups = session.scalar(
+            select(exists().where(ExpenseRollup.id.isnot(None)))
+        )
+        if has_expenses and not has_rollups:
+            # import locale: il servizio dipende a sua volta dai modelli
+            from services.rollup_service import rebuild_expense_rollup
+
+            rebuild_expense_rollup(session)
+
+
+# Le migrazioni sono idempotenti e vengono eseguite in ordine ad ogni avvio
+MIGRATIONS = [
+    add_year_month_columns,
+    add_change_tracking,
+    use_utc_change_timestamps,
+    convert_amounts_to_cents,
+    seed_categories,
+    normalize_expense_categories,
+    copy_monthly_targets,
+    # prima degli indici: vengono ricreati sulla tabella partizionata
+    partition_expenses_by_year,
+    create_missing_indexes,
+    drop_obsolete_indexes,
+    seed_expense_rollups,
+]
+
+
+def run_migrations(engine: Engine) -> None:
+    """Porta uno schema esistente allo stato dei modelli"""
+    for migration in MIGRATIONS:
+        migration(engine)
+
+
+if __name__ == "__main__":
+
+    from database.connection import get_engine
+
+    # crea lo schema mancante ed esegue le migrazioni
+    get_engine()
@@ -1,49 +1,201 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey
+from sqlalchemy import (
+    Column,
+    BigInteger,
+    Integer,
+    String,
+    Float,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    UniqueConstraint,
+    Computed,
+    cast,
+    extract,
+)
 from .base import Base
 from typing import Any
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.functions import FunctionElement
 
 
-class Expense(Base):
+def year_month_expr(column: Any) -> Any:
+    """Espressione intera YYYYMM calcolata da una colonna data (indicizzabile)"""
+    return cast(extract("year", column) * 100 + extract("month", column), Integer)
+
+
+def euros_expr(column: Any) -> Any:
+    """Importo in euro calcolato da una colonna in centesimi interi"""
+    return cast(column, Float) / 100
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class utc_timestamp(FunctionElement):
+    """Istante UTC con frazioni di secondo calcolato dal database, come _utcnow
+
+    CURRENT_TIMESTAMP non basta: su SQLite ha la precisione del secondo, su PostgreSQL è
+    nel fuso della sessione e fermo all'inizio della transazione.
+    """
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utc_timestamp, "postgresql")
+def _utc_timestamp_postgresql(element: Any, compiler: Any, **kw: Any) -> str:
+    return "timezone('utc', clock_timestamp())"
+
+
+@compiles(utc_timestamp, "sqlite")
+def _utc_timestamp_sqlite(element: Any, compiler: Any, **kw: Any) -> str:
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+@compiles(utc_timestamp)
+def _utc_timestamp_default(element: Any, compiler: Any, **kw: Any) -> str:
+    return "CURRENT_TIMESTAMP"
+
+
+class ChangeTrackingMixin:
+    """Istanti (UTC) di creazione e ultima modifica, per le sincronizzazioni incrementali"""
+
+    # il default Python vale per ORM e Core, quello del server per COPY e SQL diretto
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        default=_utcnow,
+        server_default=utc_timestamp(),
+    )
+    updated_at = Column(
+        DateTime,
+        nullable=False,
+        default=_utcnow,
+        onupdate=_utcnow,
+        server_default=utc_timestamp(),
+        index=True,
+    )
+
+
+class Category(Base):
+    """Categorie di spesa, referenziate dalle spese con una chiave intera"""
+
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+    expenses = relationship("Expense", back_populates="category")
+
+
+class Expense(ChangeTrackingMixin, Base):
+    # su PostgreSQL può essere partizionata per anno (database/partitioning.py):
+    # la chiave primaria nel database diventa (id, date), per l'ORM resta id
     __tablename__ = "expenses"
 
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
-    category = Column(String(100), nullable=False)
-    amount = Column(Float, nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    # importo in centesimi: le somme sono intere ed esatte
+    amount_cents = Column(BigInteger, nullable=False)
+    # importo in euro generato dal database (sola lettura)
+    amount = Column(Float, Computed(euros_expr(amount_cents), persisted=True))
     description = Column(String(255))
 
     # chiave esterna verso Account
     account_id = Column(Integer, ForeignKey("accounts.id", ondelete="SET NULL"))
 
-    # relazione verso Account
+    # mese di competenza (YYYYMM) generato dal database, usato per i raggruppamenti
+    year_month = Column(Integer, Computed(year_month_expr(date), persisted=True))
+
+    # relazioni verso Category e Account
+    category = relationship("Category", back_populates="expenses")
     account = relationship("Account", back_populates="expenses")
 
+    __table_args__ = (
+        # copre sia i filtri per data sia la paginazione keyset su (date, id)
+        Index("ix_expenses_date_id", "date", "id"),
+        Index("ix_expenses_category_id_date", "category_id", "date"),
+        Index("ix_expenses_account_date", "account_id", "date"),
+        Index("ix_expenses_year_month", "year_month"),
+    )
+
     def to_dict(self) -> dict[str, Any]:
         return {
             "id": self.id,
             "date": self.date.isoformat() if self.date else None,
-            "category": self.category,
+            "category": self.category.name if self.category else None,
             "amount": self.amount,
             "description": self.description,
         }
 
 
+class ExpenseRollup(Base):
+    """Totali pre-aggregati delle spese per periodo, categoria e account"""
+
+    __tablename__ = "expense_rollups"
+
+    id = Column(Integer, primary_key=True)
+    # granularità del periodo: "day", "month" o "year"
+    grain = Column(String(5), nullable=False)
+    period_start = Column(Date, nullable=False)
+    category_id = Column(Integer, nullable=False)
+    # 0 per le spese non associate ad alcun account (NULL non è confrontabile nel vincolo)
+    account_id = Column(Integer, nullable=False, default=0)
+    total_cents = Column(BigInteger, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    year_month = Column(
+        Integer, Computed(year_month_expr(period_start), persisted=True)
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "grain",
+            "period_start",
+            "category_id",
+            "account_id",
+            name="uq_expense_rollups_key",
+        ),
+    )
+
+
 class MonthlyTarget(Base):
+    """Target senza storico (schema precedente): la migrazione li copia in target_versions"""
+
     __tablename__ = "monthly_targets"
 
     id = Column(Integer, primary_key=True)
     category = Column(String(100), unique=True, nullable=False)
     target_amount = Column(Float, nullable=False)
-    created_at = Column(
-        DateTime,
-        default=datetime.now(timezone.utc),
-        onupdate=datetime.now(timezone.utc),
+    # callable: valutato ad ogni scrittura, non una volta all'import del modulo
+    created_at = Column(DateTime, default=_utcnow, onupdate=_utcnow)
+
+
+class TargetVersion(Base):
+    """Target mensile di una categoria, valido dal mese valid_from fino alla versione successiva"""
+
+    __tablename__ = "target_versions"
+
+    id = Column(Integer, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    # primo giorno del mese da cui vale il target
+    valid_from = Column(Date, nullable=False)
+    # 0 = nessun target da valid_from in poi
+    target_cents = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+
+    __table_args__ = (
+        # una versione per categoria e mese; l'indice serve le ricerche "valido al mese X"
+        UniqueConstraint("category_id", "valid_from", name="uq_target_versions_key"),
     )
 
 
-class Account(Base):
+class Account(ChangeTrackingMixin, Base):
     __tablename__ = "accounts"
 
     id = Column(Integer, primary_key=True)
@@ -53,11 +205,41 @@ class Account(Base):
     expenses = relationship("Expense", back_populates="account")
     incomes = relationship("Income", back_populates="account")
 
-class Income(Base):
+class Income(ChangeTrackingMixin, Base):
     __tablename__ = "incomes"
 
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(BigInteger, nullable=False)
+    amount = Column(Float, Computed(euros_expr(amount_cents), persisted=True))
     account_id = Column(Integer, ForeignKey("accounts.id", ondelete="SET NULL"))
-    account = relationship("Account", back_populates="incomes")
\ No newline at end of file
+    account = relationship("Account", back_populates="incomes")
+
+    # mese di competenza (YYYYMM), come per le spese
+    year_month = Column(Integer, Computed(year_month_expr(date), persisted=True))
+
+    __table_args__ = (
+        # filtri per intervallo di date, anche per singolo account
+        Index("ix_incomes_date", "date"),
+        Index("ix_incomes_account_date", "account_id", "date"),
+    )
+
+
+class DeletedRow(Base):
+    """Tombstone delle righe cancellate, per propagare le cancellazioni a chi sincronizza"""
+
+    __tablename__ = "deleted_rows"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(50), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    deleted_at = Column(
+        DateTime,
+        nullable=False,
+        default=_utcnow,
+        server_default=utc_timestamp(),
+    )
+
+    __table_args__ = (
+        Index("ix_deleted_rows_table_deleted_at", "table_name", "deleted_at"),
+    )
@@ -0,0 +1,214 @@
+"""Partizionamento per anno (RANGE su date) della tabella expenses, solo PostgreSQL
+
+Ogni anno ha la propria partizione expenses_<anno>; le date fuori dagli anni creati finiscono
+in expenses_default. Le query con un filtro su date leggono solo le partizioni interessate e
+vacuum e manutenzione degli indici lavorano un anno alla volta. La chiave primaria diventa
+(id, date), come richiesto da PostgreSQL per le tabelle partizionate.
+"""
+
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, Set
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.exc import OperationalError
+from .config import get_partitioning_settings
+from .models import Expense
+
+DEFAULT_PARTITION = "expenses_default"
+
+# attesa massima del lock su expenses quando una scrittura crea una partizione
+PARTITION_LOCK_TIMEOUT = "5s"
+
+# anni con la partizione già verificata, per database: il controllo prima delle scritture
+# interroga il catalogo solo la prima volta che un processo scrive in un anno
+_ready_years: Dict[str, Set[int]] = {}
+_ready_lock = threading.Lock()
+
+
+def partition_name(year: int) -> str:
+    return f"expenses_{year}"
+
+
+def _writable_columns() -> str:
+    """Colonne di expenses non generate dal database, per copiare le righe"""
+    return ", ".join(
+        column.name for column in Expense.__table__.columns if column.computed is None
+    )
+
+
+def is_partitioned(conn: Connection) -> bool:
+    return bool(
+        conn.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = to_regclass('expenses'))"
+            )
+        )
+    )
+
+
+def _existing_partitions(conn: Connection) -> set[str]:
+    rows = conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass('expenses')"
+        )
+    )
+    return {name for (name,) in rows}
+
+
+def _create_year_partition(conn: Connection, year: int) -> None:
+    """Crea la partizione di un anno, spostandovi le righe finite nel frattempo in default"""
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    bounds = {"start": start, "end": end}
+    columns = _writable_columns()
+
+    # PostgreSQL rifiuta la nuova partizione se default contiene righe del suo intervallo
+    conn.execute(
+        text(
+            "CREATE TEMP TABLE expenses_moved AS "
+            f"SELECT {columns} FROM {DEFAULT_PARTITION} "
+            "WHERE date >= :start AND date < :end"
+        ),
+        bounds,
+    )
+    conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end"),
+        bounds,
+    )
+    conn.execute(
+        text(
+            f"CREATE TABLE {partition_name(year)} PARTITION OF expenses "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    )
+    conn.execute(
+        text(f"INSERT INTO expenses ({columns}) SELECT {columns} FROM expenses_moved")
+    )
+    conn.execute(text("DROP TABLE expenses_moved"))
+
+
+def ensure_year_partitions(conn: Connection, years: List[int]) -> List[int]:
+    """Crea le partizioni mancanti per gli anni indicati; restituisce quelli creati"""
+    existing = _existing_partitions(conn)
+    created = []
+    for year in sorted(set(years)):
+        if partition_name(year) not in existing:
+            _create_year_partition(conn, year)
+            created.append(year)
+    return created
+
+
+def _upcoming_years() -> List[int]:
+    """Anno corrente e successivi, secondo years_ahead"""
+    current = date.today().year
+    return list(range(current, current + get_partitioning_settings()["years_ahead"] + 1))
+
+
+def _convert_to_partitioned(conn: Connection) -> None:
+    """Ricrea expenses come tabella partizionata per anno copiando le righe esistenti"""
+    years = [
+        int(year)
+        for (year,) in conn.execute(
+            text("SELECT DISTINCT EXTRACT(YEAR FROM date) FROM expenses")
+        )
+    ]
+    columns = _writable_columns()
+    sequence = conn.scalar(text("SELECT pg_get_serial_sequence('expenses', 'id')"))
+
+    conn.execute(text("ALTER TABLE expenses RENAME TO expenses_unpartitioned"))
+    # la sequenza degli id passa alla nuova tabella: non deve sparire con la vecchia
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    # LIKE copia colonne, NOT NULL, default e colonne generate, ma non chiavi e indici
+    conn.execute(
+        text(
+            "CREATE TABLE expenses (LIKE expenses_unpartitioned "
+            "INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (date)"
+        )
+    )
+    conn.execute(
+        text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF expenses DEFAULT")
+    )
+    ensure_year_partitions(conn, years + _upcoming_years())
+    conn.execute(
+        text(
+            f"INSERT INTO expenses ({columns}) "
+            f"SELECT {columns} FROM expenses_unpartitioned"
+        )
+    )
+    # gli indici della vecchia tabella (stessi nomi) spariscono con lei:
+    # create_missing_indexes li ricrea sulla tabella partizionata
+    conn.execute(text("DROP TABLE expenses_unpartitioned"))
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY expenses.id"))
+    conn.execute(text("ALTER TABLE expenses ADD PRIMARY KEY (id, date)"))
+    conn.execute(
+        text(
+            "ALTER TABLE expenses ADD FOREIGN KEY (category_id) REFERENCES categories (id)"
+        )
+    )
+    conn.execute(
+        text(
+            "ALTER TABLE expenses ADD FOREIGN KEY (account_id) "
+            "REFERENCES accounts (id) ON DELETE SET NULL"
+        )
+    )
+
+
+def partition_expenses_by_year(engine: Engine) -> None:
+    """Partiziona expenses per anno se abilitato e crea le partizioni degli anni successivi"""
+    if engine.dialect.name != "postgresql" or not get_partitioning_settings()["enabled"]:
+        return
+
+    with engine.connect() as conn:
+        # di solito non c'è nulla da fare: nessun lock sulla tabella ad ogni avvio
+        if is_partitioned(conn) and {
+            partition_name(year) for year in _upcoming_years()
+        } <= _existing_partitions(conn):
+            return
+
+    with engine.begin() as conn:
+        # un solo processo alla volta converte o aggiunge partizioni
+        conn.execute(text("LOCK TABLE expenses IN ACCESS EXCLUSIVE MODE"))
+        if not is_partitioned(conn):
+            _convert_to_partitioned(conn)
+        else:
+            ensure_year_partitions(conn, _upcoming_years())
+
+
+def ensure_expense_partitions(engine: Engine, years: Iterable[int]) -> None:
+    """Crea, prima di una scrittura, le partizioni mancanti degli anni indicati
+
+    All'avvio vengono create solo quelle fino a years_ahead: un server in esecuzione oltre
+    quegli anni (o una spesa con una data lontana) finirebbe a scrivere in expenses_default.
+    Va chiamata prima che la transazione della scrittura legga o scriva expenses, perché
+    l'eventuale creazione blocca la tabella da una connessione separata; se il lock non
+    arriva entro PARTITION_LOCK_TIMEOUT le righe restano in expenses_default.
+    """
+    if engine.dialect.name != "postgresql" or not get_partitioning_settings()["enabled"]:
+        return
+
+    key = str(engine.url)
+    missing = set(years) - _ready_years.get(key, set())
+    if not missing:
+        return
+
+    with _ready_lock:
+        with engine.connect() as conn:
+            if not is_partitioned(conn):
+                # la conversione la fa la migrazione all'avvio
+                return
+            existing = _existing_partitions(conn)
+        if {partition_name(year) for year in missing} - existing:
+            try:
+                with engine.begin() as conn:
+                    # non attende le transazioni lunghe (o quella del chiamante) all'infinito
+                    conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+                    conn.execute(text("LOCK TABLE expenses IN ACCESS EXCLUSIVE MODE"))
+                    ensure_year_partitions(conn, sorted(missing | set(_upcoming_years())))
+            except OperationalError as e:
+                # la scrittura va comunque in expenses_default; si riprova alla prossima
+                print(f"Partizioni di {sorted(missing)} non create, uso {DEFAULT_PARTITION}: {e}")
+                return
+        _ready_years.setdefault(key, set()).update(missing)
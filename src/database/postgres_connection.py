@@ -1,28 +1,34 @@
 from sqlalchemy import create_engine, Engine
-from sqlalchemy.orm import sessionmaker, Session
-from .base import Base
-import streamlit as st
-import os
-from streamlit.runtime.secrets import StreamlitSecretNotFoundError
+from sqlalchemy.orm import Session
+from .config import get_postgres_config, get_postgres_url
 
-try:
-    db_user = st.secrets["postgres"]["DB_USER"]
-    db_pass = st.secrets["postgres"]["DB_PASS"]
-    db_host = st.secrets["postgres"]["DB_HOST"]
-    db_name = st.secrets["postgres"]["DB_NAME"]
-except StreamlitSecretNotFoundError:
-    db_user = os.getenv("DB_USER")
-    db_pass = os.getenv("DB_PASS")
-    db_host = os.getenv("DB_HOST")
-    db_name = os.getenv("DB_NAME")
 
-
-conn_string = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}/{db_name}?sslmode=require&channel_binding=require"
-
-pg_engine = create_engine(conn_string)
-PostgresSession = sessionmaker(bind=pg_engine)
+def create_backend_engine() -> Engine:
+    """Engine PostgreSQL con il pool configurato (cache e schema in connection.py)"""
+    config = get_postgres_config()
+    pool = config["pool"]
+    # Le connessioni restano aperte nel pool e riusano la sessione TLS già negoziata:
+    # pre_ping scarta quelle cadute, recycle le rinnova prima dei timeout lato server,
+    # LIFO tiene calde poche connessioni e i keepalive evitano chiusure silenziose.
+    return create_engine(
+        get_postgres_url(config),
+        pool_size=pool["size"],
+        max_overflow=pool["max_overflow"],
+        pool_timeout=pool["timeout"],
+        pool_recycle=pool["recycle"],
+        pool_pre_ping=True,
+        pool_use_lifo=True,
+        connect_args={
+            "keepalives": 1,
+            "keepalives_idle": 30,
+            "keepalives_interval": 10,
+            "keepalives_count": 5,
+        },
+    )
 
 
 def init_postgres_db() -> tuple[Engine, Session]:
-    Base.metadata.create_all(pg_engine)
-    return pg_engine, PostgresSession()
+    """Engine e nuova sessione (da chiudere a cura del chiamante); per le pagine usare session_scope"""
+    from .connection import get_engine, new_session
+
+    return get_engine(), new_session()
@@ -1,12 +1,36 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from .base import Base
-import streamlit as st
+from typing import Any
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.orm import Session
+from .config import get_sqlite_pragmas, get_sqlite_url
 
-sqlite_engine = create_engine(st.secrets["SQLITE_URL"])
-SQLiteSession = sessionmaker(bind=sqlite_engine)
 
+def _set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    """Applica i PRAGMA ad ogni nuova connessione (valgono solo per quella connessione)"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in get_sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
 
-def init_sqlite_db():
-    Base.metadata.create_all(sqlite_engine)
-    return SQLiteSession()
+
+def create_backend_engine() -> Engine:
+    """Engine SQLite con i PRAGMA configurati (cache e schema in connection.py)"""
+    # Ogni thread (un rerun di Streamlit) prende dal pool una connessione tutta sua,
+    # che poi torna al pool e viene riusata dal rerun successivo insieme alla sua
+    # page cache: check_same_thread=False permette solo questo passaggio di mano.
+    engine = create_engine(
+        get_sqlite_url(),
+        pool_size=5,
+        max_overflow=5,
+        pool_use_lifo=True,
+        connect_args={"check_same_thread": False},
+    )
+    event.listen(engine, "connect", _set_pragmas)
+    return engine
+
+
+def init_sqlite_db() -> Session:
+    from .connection import new_session
+
+    return new_session()
@@ -1,4 +1,6 @@
 from enum import Enum
+from typing import List, Optional
+from sqlalchemy.orm import Session
 
 
 class AppPages(Enum):
@@ -8,6 +10,7 @@ class AppPages(Enum):
     ComparativeAnalysis = "🔄 Analisi Comparative"
     SetBenchmark = "🎯 Imposta Target"
     ImportData = "📥 Importa Dati"
+    Diagnostics = "🩺 Diagnostica"
 
 
 # Dizionario per la traduzione dei mesi in italiano
@@ -30,3 +33,20 @@ MESI_ITALIANI = {
 def format_month_year(year: int, month: int) -> str:
     """Formatta mese e anno in italiano"""
     return f"{MESI_ITALIANI[month]} {year}"
+
+
+def select_accounts(session: Session) -> Optional[List[int]]:
+    """Filtro per account delle pagine di analisi: nessuna selezione = tutti (None)"""
+    import streamlit as st
+    from services.account_service import get_account_options
+
+    account_options = get_account_options(session)
+    return (
+        st.multiselect(
+            "Account",
+            options=list(account_options),
+            format_func=account_options.get,
+            placeholder="Tutti gli account",
+        )
+        or None
+    )
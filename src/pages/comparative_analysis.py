@@ -1,328 +1,251 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
-from database.postgres_connection import init_postgres_db
+from database.connection import get_engine, session_scope
+from database.instrumentation import page_run
 
-from models import format_month_year, MESI_ITALIANI
-from services.expense_service import (
-    get_expenses_by_month,
-    get_category_spending,
-    get_expenses_by_year,
-    get_expenses_by_date_range,
-    CATEGORIES,
-)
+from models import format_month_year, select_accounts, MESI_ITALIANI
+from services.expense_service import compare_periods
+from services.target_service import get_period_targets
 
-pg_engine, pg_session = init_postgres_db()
+pg_engine = get_engine()
 
+with page_run("comparative_analysis"), session_scope() as pg_session:
+    st.header("Analisi Comparative tra Periodi")
+    st.set_page_config(
+        page_title="Analisi Comparative tra Periodi", page_icon="💰", layout="wide"
+    )
+    st.title("Analisi Comparative tra Periodi")
 
-st.header("Analisi Comparative tra Periodi")
-st.set_page_config(
-    page_title="Analisi Comparative tra Periodi", page_icon="💰", layout="wide"
-)
-st.title("Analisi Comparative tra Periodi")
-
-st.info(
-    "💡 Confronta le tue spese tra due periodi diversi per identificare cambiamenti e tendenze."
-)
-
-# Selezione tipo di confronto
-comparison_type = st.radio(
-    "Tipo di confronto:",
-    ["Mese vs Mese", "Anno vs Anno", "Periodo Personalizzato"],
-    horizontal=True,
-)
-
-if comparison_type == "Mese vs Mese":
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Periodo 1")
-        year1 = st.selectbox(
-            "Anno",
-            options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
-            index=0,
-            key="year1",
-        )
-        month1 = st.selectbox(
-            "Mese",
-            options=list(range(1, 13)),
-            format_func=lambda x: MESI_ITALIANI[x],
-            index=datetime.now().month - 2 if datetime.now().month > 1 else 11,
-            key="month1",
-        )
-
-    with col2:
-        st.subheader("Periodo 2")
-        year2 = st.selectbox(
-            "Anno",
-            options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
-            index=0,
-            key="year2",
-        )
-        month2 = st.selectbox(
-            "Mese",
-            options=list(range(1, 13)),
-            format_func=lambda x: MESI_ITALIANI[x],
-            index=datetime.now().month - 1,
-            key="month2",
-        )
-
-    # Recupera i dati per entrambi i periodi
-    expenses1 = get_expenses_by_month(pg_engine, year1, month1)
-    expenses2 = get_expenses_by_month(pg_engine, year2, month2)
-    category_spending1 = get_category_spending(pg_engine, year1, month1)
-    category_spending2 = get_category_spending(pg_engine, year2, month2)
-
-    period1_label = format_month_year(year1, month1)
-    period2_label = format_month_year(year2, month2)
-
-elif comparison_type == "Anno vs Anno":
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Anno 1")
-        year1 = st.selectbox(
-            "Seleziona anno",
-            options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
-            index=1,
-            key="year1_full",
-        )
-
-    with col2:
-        st.subheader("Anno 2")
-        year2 = st.selectbox(
-            "Seleziona anno",
-            options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
-            index=0,
-            key="year2_full",
-        )
-
-    # Recupera i dati per entrambi gli anni
-    expenses1 = get_expenses_by_year(pg_engine, year1)
-    expenses2 = get_expenses_by_year(pg_engine, year2)
-
-    # Calcola totali per categoria
-    if not expenses1.empty:
-        category_spending1 = expenses1.groupby("category")["amount"].sum().reset_index()
-        category_spending1.columns = ["category", "total"]
-    else:
-        category_spending1 = pd.DataFrame(columns=["category", "total"])
-
-    if not expenses2.empty:
-        category_spending2 = expenses2.groupby("category")["amount"].sum().reset_index()
-        category_spending2.columns = ["category", "total"]
-    else:
-        category_spending2 = pd.DataFrame(columns=["category", "total"])
-
-    period1_label = str(year1)
-    period2_label = str(year2)
-
-else:  # Periodo Personalizzato
-    col1, col2 = st.columns(2)
-
-    with col1:
-        st.subheader("Periodo 1")
-        start1 = st.date_input(
-            "Data inizio",
-            value=date.today() - relativedelta(months=2),
-            key="start1",
-            format="YYYY-MM-DD",
-        )
-        end1 = st.date_input(
-            "Data fine",
-            value=date.today() - relativedelta(months=1),
-            key="end1",
-            format="YYYY-MM-DD",
-        )
+    st.info(
+        "💡 Confronta le tue spese tra più periodi per identificare cambiamenti e tendenze."
+    )
 
-    with col2:
-        st.subheader("Periodo 2")
-        start2 = st.date_input(
-            "Data inizio",
-            value=date.today() - relativedelta(months=1),
-            key="start2",
-            format="YYYY-MM-DD",
-        )
-        end2 = st.date_input(
-            "Data fine", value=date.today(), key="end2", format="YYYY-MM-DD"
-        )
+    # Selezione tipo di confronto
+    comparison_type = st.radio(
+        "Tipo di confronto:",
+        ["Mese vs Mese", "Anno vs Anno", "Periodo Personalizzato"],
+        horizontal=True,
+    )
 
-    # Recupera i dati per i periodi personalizzati
-    expenses1 = get_expenses_by_date_range(pg_engine, start1, end1)
-    expenses2 = get_expenses_by_date_range(pg_engine, start2, end2)
+    # Filtro per account: nessuna selezione = tutti gli account
+    account_ids = select_accounts(pg_session)
 
-    # Calcola totali per categoria
-    if not expenses1.empty:
-        category_spending1 = expenses1.groupby("category")["amount"].sum().reset_index()
-        category_spending1.columns = ["category", "total"]
-    else:
-        category_spending1 = pd.DataFrame(columns=["category", "total"])
+    num_periods = st.number_input(
+        "Numero di periodi da confrontare", min_value=2, max_value=6, value=2, step=1
+    )
 
-    if not expenses2.empty:
-        category_spending2 = expenses2.groupby("category")["amount"].sum().reset_index()
-        category_spending2.columns = ["category", "total"]
-    else:
-        category_spending2 = pd.DataFrame(columns=["category", "total"])
+    year_options = list(range(datetime.now().year, datetime.now().year - 10, -1))
+    today = date.today()
 
-    period1_label = f"{start1.strftime('%d/%m/%Y')} - {end1.strftime('%d/%m/%Y')}"
-    period2_label = f"{start2.strftime('%d/%m/%Y')} - {end2.strftime('%d/%m/%Y')}"
+    # Ogni periodo è (etichetta, inizio, fine esclusa), dal più vecchio al più recente
+    periods = []
+    columns = st.columns(num_periods)
 
-# Mostra confronto solo se entrambi i periodi hanno dati
-if not expenses1.empty or not expenses2.empty:
-    st.subheader(f"📊 Confronto: {period1_label} vs {period2_label}")
+    for i, col in enumerate(columns):
+        # distanza dal periodo più recente (l'ultimo a destra)
+        offset = num_periods - 1 - i
 
-    # Calcola statistiche generali
-    total1 = expenses1["amount"].sum() if not expenses1.empty else 0
-    total2 = expenses2["amount"].sum() if not expenses2.empty else 0
-    count1 = len(expenses1) if not expenses1.empty else 0
-    count2 = len(expenses2) if not expenses2.empty else 0
-    avg1 = total1 / count1 if count1 > 0 else 0
-    avg2 = total2 / count2 if count2 > 0 else 0
+        with col:
+            st.subheader(f"Periodo {i + 1}")
 
-    # Delta calcoli
-    total_delta = total2 - total1
-    total_delta_pct = ((total2 - total1) / total1 * 100) if total1 > 0 else 0
-    count_delta = count2 - count1
-    avg_delta = avg2 - avg1
+            if comparison_type == "Mese vs Mese":
+                default_month = today.replace(day=1) - relativedelta(months=offset)
+                year = st.selectbox(
+                    "Anno",
+                    options=year_options,
+                    index=year_options.index(default_month.year),
+                    key=f"year{i}",
+                )
+                month = st.selectbox(
+                    "Mese",
+                    options=list(range(1, 13)),
+                    format_func=lambda x: MESI_ITALIANI[x],
+                    index=default_month.month - 1,
+                    key=f"month{i}",
+                )
+                start = date(year, month, 1)
+                periods.append(
+                    (
+                        format_month_year(year, month),
+                        start,
+                        start + relativedelta(months=1),
+                    )
+                )
 
-    # Metriche principali
-    col1, col2, col3 = st.columns(3)
+            elif comparison_type == "Anno vs Anno":
+                year = st.selectbox(
+                    "Seleziona anno",
+                    options=year_options,
+                    index=min(offset, len(year_options) - 1),
+                    key=f"year{i}_full",
+                )
+                periods.append((str(year), date(year, 1, 1), date(year + 1, 1, 1)))
+
+            else:  # Periodo Personalizzato
+                start = st.date_input(
+                    "Data inizio",
+                    value=today - relativedelta(months=offset + 1),
+                    key=f"start{i}",
+                    format="YYYY-MM-DD",
+                )
+                end = st.date_input(
+                    "Data fine",
+                    value=today - relativedelta(months=offset),
+                    key=f"end{i}",
+                    format="YYYY-MM-DD",
+                )
+                periods.append(
+                    (
+                        f"{start.strftime('%d/%m/%Y')} - {end.strftime('%d/%m/%Y')}",
+                        start,
+                        end,
+                    )
+                )
 
-    col1.metric(
-        "Totale Speso",
-        f"€{total2:.2f}",
-        delta=f"€{total_delta:+.2f} ({total_delta_pct:+.1f}%)",
-        delta_color="inverse",
-    )
-    col2.metric(
-        "Numero Transazioni", count2, delta=f"{count_delta:+d}", delta_color="off"
-    )
-    col3.metric(
-        "Media per Transazione",
-        f"€{avg2:.2f}",
-        delta=f"€{avg_delta:+.2f}",
-        delta_color="inverse",
+    # Le etichette identificano le colonne: rendile univoche se lo stesso periodo è ripetuto
+    labels = [label for label, _, _ in periods]
+    if len(set(labels)) < len(labels):
+        periods = [
+            (f"{i + 1}) {label}", start, end) for i, (label, start, end) in enumerate(periods)
+        ]
+        labels = [label for label, _, _ in periods]
+
+    # Totali e conteggi categoria × periodo in un'unica query
+    comparison = compare_periods(pg_engine, periods, account_ids)
+    period_totals = comparison.groupby("period", observed=True)[["total", "count"]].sum()
+    # target storici di ogni periodo (somma dei mesi), con un'unica lettura
+    period_targets = (
+        get_period_targets(pg_session, periods).groupby("period")["target"].sum()
     )
 
-    # Confronto per categoria
-    st.subheader("Confronto per Categoria")
-
-    # Prepara dati per il confronto
-    comparison_data = []
-    for category in CATEGORIES:
-        spent1 = category_spending1[category_spending1["category"] == category][
-            "total"
-        ].sum()
-        spent2 = category_spending2[category_spending2["category"] == category][
-            "total"
-        ].sum()
-
-        if spent1 > 0 or spent2 > 0:
-            delta = spent2 - spent1
-            delta_pct = (
-                ((spent2 - spent1) / spent1 * 100)
-                if spent1 > 0
-                else (100 if spent2 > 0 else 0)
-            )
-
-            comparison_data.append(
-                {
-                    "Categoria": category,
-                    period1_label: f"€{spent1:.2f}",
-                    period2_label: f"€{spent2:.2f}",
-                    "Differenza": f"€{delta:+.2f}",
-                    "Variazione %": f"{delta_pct:+.1f}%",
-                }
+    # Mostra confronto solo se almeno un periodo ha dati
+    if period_totals["count"].sum() > 0:
+        st.subheader(f"📊 Confronto: {' vs '.join(labels)}")
+
+        # Metriche per periodo, con la variazione rispetto al periodo precedente
+        metric_columns = st.columns(len(labels))
+        previous = None
+        for col, label in zip(metric_columns, labels):
+            total = period_totals.loc[label, "total"]
+            count = int(period_totals.loc[label, "count"])
+            avg = total / count if count > 0 else 0
+
+            with col:
+                st.markdown(f"**{label}**")
+                if previous is None:
+                    st.metric("Totale Speso", f"€{total:.2f}")
+                    st.metric("Numero Transazioni", count)
+                    st.metric("Media per Transazione", f"€{avg:.2f}")
+                else:
+                    prev_total, prev_count, prev_avg = previous
+                    total_delta_pct = (
+                        (total - prev_total) / prev_total * 100 if prev_total > 0 else 0
+                    )
+                    st.metric(
+                        "Totale Speso",
+                        f"€{total:.2f}",
+                        delta=f"€{total - prev_total:+.2f} ({total_delta_pct:+.1f}%)",
+                        delta_color="inverse",
+                    )
+                    st.metric(
+                        "Numero Transazioni",
+                        count,
+                        delta=f"{count - prev_count:+d}",
+                        delta_color="off",
+                    )
+                    st.metric(
+                        "Media per Transazione",
+                        f"€{avg:.2f}",
+                        delta=f"€{avg - prev_avg:+.2f}",
+                        delta_color="inverse",
+                    )
+                target = period_targets.get(label, 0.0)
+                if target > 0:
+                    st.metric(
+                        "Target del Periodo",
+                        f"€{target:.2f}",
+                        delta=f"€{total - target:+.2f}",
+                        delta_color="inverse",
+                    )
+            previous = (total, count, avg)
+
+        # Confronto per categoria
+        st.subheader("Confronto per Categoria")
+
+        spent = comparison.pivot(index="category", columns="period", values="total")
+        spent = spent[spent.sum(axis=1) > 0]
+
+        if not spent.empty:
+            # plotly viene importato solo quando ci sono grafici da mostrare
+            import plotly.express as px
+
+            last_label = labels[-1]
+            last = comparison[comparison["period"] == last_label].set_index("category")
+
+            df_comparison = spent.copy()
+            df_comparison.columns = list(df_comparison.columns)
+            df_comparison["Differenza"] = last["delta"]
+            df_comparison["Variazione %"] = last["delta_pct"]
+            df_comparison = df_comparison.rename_axis("Categoria").reset_index()
+
+            euro = st.column_config.NumberColumn(format="€%.2f")
+            st.dataframe(
+                df_comparison,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    **{label: euro for label in labels},
+                    "Differenza": st.column_config.NumberColumn(format="€%+.2f"),
+                    "Variazione %": st.column_config.NumberColumn(format="%+.1f%%"),
+                },
             )
-
-    if comparison_data:
-        df_comparison = pd.DataFrame(comparison_data)
-        st.dataframe(df_comparison, use_container_width=True, hide_index=True)
-
-        # Grafico a barre comparativo
-        chart_data = []
-        for category in CATEGORIES:
-            spent1 = category_spending1[category_spending1["category"] == category][
-                "total"
-            ].sum()
-            spent2 = category_spending2[category_spending2["category"] == category][
-                "total"
-            ].sum()
-
-            if spent1 > 0 or spent2 > 0:
-                chart_data.append(
-                    {
-                        "Categoria": category,
-                        period1_label: spent1,
-                        period2_label: spent2,
-                    }
+            if len(labels) > 2:
+                st.caption(
+                    f"Differenza e variazione: {last_label} rispetto a {labels[-2]}"
                 )
 
-        if chart_data:
-            df_chart = pd.DataFrame(chart_data)
-
-            fig_comparison = go.Figure(
-                data=[
-                    go.Bar(
-                        name=period1_label,
-                        x=df_chart["Categoria"],
-                        y=df_chart[period1_label],
-                        marker_color="lightblue",
-                    ),
-                    go.Bar(
-                        name=period2_label,
-                        x=df_chart["Categoria"],
-                        y=df_chart[period2_label],
-                        marker_color="lightcoral",
-                    ),
-                ]
+            # Grafico a barre comparativo
+            chart_data = comparison[comparison["category"].isin(spent.index)]
+            fig_comparison = px.bar(
+                chart_data,
+                x="category",
+                y="total",
+                color="period",
+                barmode="group",
+                category_orders={"period": labels},
+                title=f"Confronto Spese per Categoria: {' vs '.join(labels)}",
             )
             fig_comparison.update_layout(
-                barmode="group",
-                title=f"Confronto Spese per Categoria: {period1_label} vs {period2_label}",
-                xaxis_title="Categoria",
-                yaxis_title="Importo (€)",
+                xaxis_title="Categoria", yaxis_title="Importo (€)", legend_title="Periodo"
             )
             st.plotly_chart(fig_comparison, use_container_width=True)
 
             # Grafico variazione percentuale
             st.subheader("Variazioni Percentuali per Categoria")
 
-            variation_data = []
-            for category in CATEGORIES:
-                spent1 = category_spending1[category_spending1["category"] == category][
-                    "total"
-                ].sum()
-                spent2 = category_spending2[category_spending2["category"] == category][
-                    "total"
-                ].sum()
-
-                if spent1 > 0:
-                    delta_pct = (spent2 - spent1) / spent1 * 100
-                    variation_data.append(
-                        {"Categoria": category, "Variazione %": delta_pct}
-                    )
-
-            if variation_data:
-                df_variation = pd.DataFrame(variation_data).sort_values(
-                    "Variazione %", ascending=True
-                )
+            df_variation = (
+                last["delta_pct"]
+                .dropna()
+                .rename("Variazione %")
+                .rename_axis("Categoria")
+                .reset_index()
+                .sort_values("Variazione %", ascending=True)
+            )
 
+            if not df_variation.empty:
                 fig_variation = px.bar(
                     df_variation,
                     x="Variazione %",
                     y="Categoria",
                     orientation="h",
-                    title="Variazione Percentuale delle Spese per Categoria",
+                    title=f"Variazione Percentuale delle Spese per Categoria ({labels[-2]} → {last_label})",
                     color="Variazione %",
                     color_continuous_scale=["green", "yellow", "red"],
                     color_continuous_midpoint=0,
                 )
                 st.plotly_chart(fig_variation, use_container_width=True)
+        else:
+            st.info("Nessuna spesa da confrontare per le categorie selezionate.")
     else:
-        st.info("Nessuna spesa da confrontare per le categorie selezionate.")
-else:
-    st.warning("⚠️ Nessun dato disponibile per i periodi selezionati.")
+        st.warning("⚠️ Nessun dato disponibile per i periodi selezionati.")
@@ -0,0 +1,101 @@
+import streamlit as st
+from database.connection import get_pool_stats
+from database.instrumentation import (
+    diagnostics_enabled,
+    get_page_runs,
+    n_plus_one_patterns,
+    page_timings,
+    reset_diagnostics,
+    slowest_queries,
+)
+from services.cache import cache_stats
+
+st.set_page_config(page_title="Diagnostica", page_icon="🩺", layout="wide")
+st.title("Diagnostica delle Prestazioni")
+
+if not diagnostics_enabled():
+    st.info(
+        "💡 La strumentazione è disattivata. Avvia l'app con DIAGNOSTICS_ENABLED=1 "
+        "(o `enabled = true` nella sezione [diagnostics] dei secrets) per registrare "
+        "query e tempi delle pagine; DIAGNOSTICS_PROFILE=1 aggiunge il profilo cProfile "
+        "di ogni esecuzione."
+    )
+    st.stop()
+
+if st.button("🗑️ Azzera le misure"):
+    reset_diagnostics()
+
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("Connessioni")
+    st.json(get_pool_stats())
+with col2:
+    st.subheader("Cache delle letture")
+    st.json(cache_stats())
+
+st.subheader("Tempi per Pagina")
+timings = page_timings()
+if timings.empty:
+    st.info("Nessuna esecuzione di pagina registrata: apri le altre pagine dell'app.")
+else:
+    st.dataframe(
+        timings,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "page": "Pagina",
+            "runs": "Esecuzioni",
+            "p50_ms": st.column_config.NumberColumn("p50 (ms)", format="%.1f"),
+            "p95_ms": st.column_config.NumberColumn("p95 (ms)", format="%.1f"),
+            "queries_p50": st.column_config.NumberColumn("Query (p50)", format="%d"),
+            "query_ms_p50": st.column_config.NumberColumn(
+                "Tempo SQL p50 (ms)", format="%.1f"
+            ),
+        },
+    )
+
+st.subheader("Query più Lente")
+slowest = slowest_queries()
+if slowest.empty:
+    st.info("Nessuna query registrata.")
+else:
+    st.dataframe(
+        slowest,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "page": "Pagina",
+            "ms": st.column_config.NumberColumn("Durata (ms)", format="%.2f"),
+            "rows": "Righe",
+            "executemany": "Executemany",
+            "statement": st.column_config.TextColumn("Query", width="large"),
+        },
+    )
+
+st.subheader("Possibili N+1")
+patterns = n_plus_one_patterns()
+if patterns.empty:
+    st.success("✅ Nessuna query ripetuta troppe volte nella stessa esecuzione.")
+else:
+    st.dataframe(
+        patterns,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "page": "Pagina",
+            "statement": st.column_config.TextColumn("Query", width="large"),
+            "runs": "Esecuzioni coinvolte",
+            "max_executions": "Ripetizioni (max)",
+            "total_ms": st.column_config.NumberColumn("Tempo totale (ms)", format="%.1f"),
+        },
+    )
+
+profiled = [run for run in get_page_runs() if run["profile"]]
+if profiled:
+    st.subheader("Profilo delle Esecuzioni")
+    run = st.selectbox(
+        "Esecuzione",
+        list(reversed(profiled)),
+        format_func=lambda run: f"#{run['run_id']} {run['page']} ({run['ms']:.0f} ms)",
+    )
+    st.code(run["profile"])
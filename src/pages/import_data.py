@@ -1,178 +1,233 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import io
-from database.postgres_connection import init_postgres_db
+import tempfile
+from database.connection import get_engine, session_scope
+from database.instrumentation import page_run
+from services.category_service import get_categories
 from services.expense_service import (
-    CATEGORIES,
-    get_all_expenses,
     import_expenses_from_dataframe,
+    validate_expenses_dataframe,
+)
+from services.import_service import bulk_import_expenses_csv
+from services.money import cents_series, to_euros
+from services.export_service import (
+    get_export_summary,
+    export_expenses_csv,
+    export_expenses_excel,
+    export_expenses_parquet,
 )
 
+# formato -> (funzione di esportazione, estensione, mime type)
+EXPORT_FORMATS = {
+    "CSV": (export_expenses_csv, "csv", "text/csv"),
+    "Excel": (
+        export_expenses_excel,
+        "xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "Parquet": (export_expenses_parquet, "parquet", "application/vnd.apache.parquet"),
+}
+
+# intestazioni della tabella delle righe non valide
+ERROR_COLUMN_LABELS = {
+    "row": "Riga",
+    "date": "Data",
+    "category": "Categoria",
+    "amount": "Importo",
+    "reasons": "Motivi",
+}
+
+
+pg_engine = get_engine()
+# elenco letto una volta dal database e tenuto in memoria
+categories = get_categories(pg_engine)
+
+with page_run("import_data"), session_scope() as pg_session:
+    st.header("Importa ed Esporta Dati")
+    st.set_page_config(page_title="Importa ed Esporta Dati", page_icon="💰", layout="wide")
+    st.title("Importa ed Esporta Dati")
+
+    # Sezione Esportazione
+    st.subheader("📤 Esporta le Tue Spese")
+
+    export_summary = get_export_summary(pg_engine)
+
+    if export_summary["count"] > 0:
+        col1, col2, col3 = st.columns(3)
+
+        with col1:
+            st.metric("Totale Spese", export_summary["count"])
+        with col2:
+            st.metric("Importo Totale", f"€{export_summary['total']:.2f}")
+        with col3:
+            st.metric(
+                "Periodo",
+                f"{export_summary['first_date']} - {export_summary['last_date']}",
+            )
 
-pg_engine, pg_session = init_postgres_db()
-
-st.header("Importa ed Esporta Dati")
-st.set_page_config(page_title="Importa ed Esporta Dati", page_icon="💰", layout="wide")
-st.title("Importa ed Esporta Dati")
-
-# Sezione Esportazione
-st.subheader("📤 Esporta le Tue Spese")
-
-all_expenses_export = get_all_expenses(pg_engine)
-
-if not all_expenses_export.empty:
-    # Prepara i dati per l'esportazione
-    export_df = all_expenses_export.copy()
-    export_df["date"] = export_df["date"].dt.strftime("%Y-%m-%d")
-    export_df = export_df[["date", "category", "amount", "description"]]
-
-    col1, col2, col3 = st.columns(3)
-
-    with col1:
-        st.metric("Totale Spese", len(export_df))
-    with col2:
-        st.metric("Importo Totale", f"€{export_df['amount'].sum():.2f}")
-    with col3:
-        st.metric("Periodo", f"{export_df['date'].min()} - {export_df['date'].max()}")
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        # Download CSV
-        csv_data = export_df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            label="📥 Scarica CSV",
-            data=csv_data,
-            file_name=f"spese_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv",
-            use_container_width=True,
-            type="primary",
+        export_format = st.radio(
+            "Formato",
+            options=list(EXPORT_FORMATS),
+            horizontal=True,
+            help="Parquet mantiene i tipi delle colonne ed è il formato più compatto",
         )
 
-    with col2:
-        # Download Excel
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            export_df.to_excel(writer, index=False, sheet_name="Spese")
-        excel_data = output.getvalue()
-
-        st.download_button(
-            label="📥 Scarica Excel",
-            data=excel_data,
-            file_name=f"spese_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True,
-            type="primary",
+        if st.button("⚙️ Prepara File", use_container_width=True):
+            exporter, extension, mime = EXPORT_FORMATS[export_format]
+            # l'esportazione scrive a blocchi su disco; download_button legge poi il file
+            # e Streamlit ne tiene il contenuto in memoria per servire il download
+            with tempfile.TemporaryFile() as export_file:
+                with st.spinner("Esportazione in corso..."):
+                    exporter(pg_engine, export_file)
+                export_file.seek(0)
+
+                st.download_button(
+                    label=f"📥 Scarica {export_format}",
+                    data=export_file,
+                    file_name=f"spese_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime=mime,
+                    use_container_width=True,
+                    type="primary",
+                )
+    else:
+        st.info(
+            "Nessuna spesa da esportare. Aggiungi delle spese prima di procedere con l'esportazione."
         )
-else:
-    st.info(
-        "Nessuna spesa da esportare. Aggiungi delle spese prima di procedere con l'esportazione."
-    )
 
-# Sezione Importazione
-st.divider()
-st.subheader("📥 Importa Spese da File")
+    # Sezione Importazione
+    st.divider()
+    st.subheader("📥 Importa Spese da File")
 
-st.info(
-    """
+    st.info(
+        """
 📋 **Formato richiesto per il file:**
 - Colonne necessarie: `date`, `category`, `amount`, `description`
 - Formato data: YYYY-MM-DD (es. 2025-01-15)
 - Categorie devono corrispondere a quelle disponibili nell'app
 - Formati supportati: CSV, Excel (.xlsx, .xls)
 """
-)
-
-# Mostra esempio di formato
-with st.expander("📄 Visualizza esempio di formato corretto"):
-    example_data = pd.DataFrame(
-        {
-            "date": ["2025-01-15", "2025-01-20", "2025-02-05"],
-            "category": ["Alimentari", "Spese auto", "Svago"],
-            "amount": [50.25, 60.00, 35.80],
-            "description": ["Spesa settimanale", "Rifornimento auto", "Cena con amici"],
-        }
     )
-    st.dataframe(example_data, use_container_width=True, hide_index=True)
 
-# Mostra le categorie valide
-with st.expander("📋 Lista categorie valide"):
-    st.write(", ".join(CATEGORIES))
+    # Mostra esempio di formato
+    with st.expander("📄 Visualizza esempio di formato corretto"):
+        example_data = pd.DataFrame(
+            {
+                "date": ["2025-01-15", "2025-01-20", "2025-02-05"],
+                "category": ["Alimentari", "Spese auto", "Svago"],
+                "amount": [50.25, 60.00, 35.80],
+                "description": ["Spesa settimanale", "Rifornimento auto", "Cena con amici"],
+            }
+        )
+        st.dataframe(example_data, use_container_width=True, hide_index=True)
 
-# Upload file
-uploaded_file = st.file_uploader(
-    "Carica il file con le spese",
-    type=["csv", "xlsx", "xls"],
-    help="Carica un file CSV o Excel con le tue spese",
-)
+    # Mostra le categorie valide
+    with st.expander("📋 Lista categorie valide"):
+        st.write(", ".join(categories))
 
-if uploaded_file is not None:
-    try:
-        # Leggi il file in base al tipo
-        if uploaded_file.name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
-        else:
-            df = pd.read_excel(uploaded_file)
+    # Upload file
+    uploaded_file = st.file_uploader(
+        "Carica il file con le spese",
+        type=["csv", "xlsx", "xls"],
+        help="Carica un file CSV o Excel con le tue spese",
+    )
+    bulk_mode = st.toggle(
+        "⚡ Importazione veloce a blocchi (solo CSV)",
+        help="Per file di grandi dimensioni: il file viene letto e salvato a blocchi, senza caricarlo tutto in memoria",
+    )
 
+    if uploaded_file is not None and bulk_mode and uploaded_file.name.endswith(".csv"):
         st.subheader("Anteprima Dati")
-        st.dataframe(df.head(10), use_container_width=True)
-
-        # Validazione delle colonne
-        required_columns = ["date", "category", "amount", "description"]
-        validation_errors = []
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            validation_errors.append(
-                f"❌ Colonne mancanti nel file: {', '.join(missing_columns)}"
-            )
-        # Validazione date
-        if not validation_errors:
+        st.dataframe(pd.read_csv(uploaded_file, nrows=10), use_container_width=True)
+        uploaded_file.seek(0)
+
+        if st.button("📥 Importa Spese", type="primary", use_container_width=True):
+            progress_text = st.empty()
             try:
-                for idx, row in df.iterrows():
-                    row["date"] = (
-                        datetime.strptime(row["date"], "%Y-%m-%d").date().isoformat()
+                with st.spinner("Importazione in corso..."):
+                    report = bulk_import_expenses_csv(
+                        pg_engine,
+                        uploaded_file,
+                        progress=lambda rows: progress_text.write(
+                            f"{rows} righe importate..."
+                        ),
                     )
-            except Exception:
-                validation_errors.append(
-                    f"❌ Row {idx} has invalid date format: {row['date']}"
+                progress_text.empty()
+                st.success(
+                    f"✅ {report['rows']} spese importate in {report['seconds']:.1f}s "
+                    f"({report['rows_per_second']:.0f} righe/s, {report['chunks']} blocchi)"
                 )
-
-        if validation_errors:
-            for err in validation_errors:
-                st.error(err)
-        else:
-            # Validazione categorie
-            invalid_categories = df[~df["category"].isin(CATEGORIES)][
-                "category"
-            ].unique()
-
-            if len(invalid_categories) > 0:
-                st.warning(
-                    f"⚠️ Attenzione: alcune categorie non sono valide: {', '.join(invalid_categories)}"
+                # le righe non valide vengono saltate: l'utente deve sapere quali
+                if report["invalid_rows"]:
+                    st.warning(
+                        f"⚠️ {report['invalid_rows']} righe non valide non sono state importate"
+                    )
+                    st.dataframe(
+                        report["errors"].rename(columns=ERROR_COLUMN_LABELS),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+            except Exception as e:
+                st.error(f"❌ {str(e)}")
+
+    elif uploaded_file is not None:
+        try:
+            # Leggi il file in base al tipo
+            if uploaded_file.name.endswith(".csv"):
+                df = pd.read_csv(uploaded_file)
+            else:
+                df = pd.read_excel(uploaded_file)
+
+            st.subheader("Anteprima Dati")
+            st.dataframe(df.head(10), use_container_width=True)
+
+            # Validazione delle colonne
+            required_columns = ["date", "category", "amount", "description"]
+            validation_errors = []
+            missing_columns = [col for col in required_columns if col not in df.columns]
+            if missing_columns:
+                validation_errors.append(
+                    f"❌ Colonne mancanti nel file: {', '.join(missing_columns)}"
                 )
-                st.write("Categorie valide:", ", ".join(CATEGORIES))
-
-            # Mostra statistiche
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Righe Totali", len(df))
-            col2.metric("Importo Totale", f"€{df['amount'].sum():.2f}")
-            col3.metric("Periodo", f"{df['date'].min()} - {df['date'].max()}")
-
-            # Pulsante per importare
-            if st.button("📥 Importa Spese", type="primary", use_container_width=True):
-                with st.spinner("Importazione in corso..."):
-                    success_count = import_expenses_from_dataframe(pg_session, df)
-
-                if success_count > 0:
-                    st.success(f"✅ {success_count} spese importate con successo!")
-
-                    st.balloons()
-                else:
+            if validation_errors:
+                for err in validation_errors:
+                    st.error(err)
+            else:
+                # Validazione di date, categorie e importi su tutte le righe
+                df, row_errors = validate_expenses_dataframe(pg_engine, df)
+
+                if not row_errors.empty:
                     st.error(
-                        "❌ Errore nell'importazione. Verifica il formato del file."
+                        f"❌ {len(row_errors)} righe non valide: correggi il file e ricaricalo"
                     )
-
-    except Exception as e:
-        st.error(f"❌ Errore nella lettura del file: {str(e)}")
-        st.info("Assicurati che il file sia nel formato corretto.")
+                    st.dataframe(
+                        row_errors.rename(columns=ERROR_COLUMN_LABELS),
+                        use_container_width=True,
+                        hide_index=True,
+                    )
+                    st.write("Categorie valide:", ", ".join(categories))
+                    st.stop()
+
+                # Mostra statistiche
+                col1, col2, col3 = st.columns(3)
+                col1.metric("Righe Totali", len(df))
+                col2.metric("Importo Totale", f"€{to_euros(cents_series(df['amount']).sum()):.2f}")
+                col3.metric("Periodo", f"{df['date'].min()} - {df['date'].max()}")
+
+                # Pulsante per importare
+                if st.button("📥 Importa Spese", type="primary", use_container_width=True):
+                    with st.spinner("Importazione in corso..."):
+                        success_count = import_expenses_from_dataframe(pg_session, df)
+
+                    if success_count > 0:
+                        st.success(f"✅ {success_count} spese importate con successo!")
+
+                        st.balloons()
+                    else:
+                        st.error(
+                            "❌ Errore nell'importazione. Verifica il formato del file."
+                        )
+
+        except Exception as e:
+            st.error(f"❌ Errore nella lettura del file: {str(e)}")
+            st.info("Assicurati che il file sia nel formato corretto.")
@@ -1,191 +1,178 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
 
-from models import MESI_ITALIANI, format_month_year
-from database.postgres_connection import init_postgres_db
-from services.expense_service import (
-    CATEGORIES,
-    get_expenses_by_month,
-    get_category_spending,
-)
-from services.target_service import get_targets
-from services.income_service import get_income
-
-pg_engine, pg_session = init_postgres_db()
-st.header("Dashboard Mensile")
-st.set_page_config(page_title="Dashboard Mensile", page_icon="💰", layout="wide")
-st.title("Dashboard Mensile")
-
-# Selettori per mese e anno
-col1, col2 = st.columns(2)
-
-with col1:
-    selected_year = st.selectbox(
-        "Anno",
-        options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
-        index=0,
-    )
-
-with col2:
-    selected_month = st.selectbox(
-        "Mese",
-        options=list(range(1, 13)),
-        format_func=lambda x: MESI_ITALIANI[x],
-        index=datetime.now().month - 1,
-    )
-
-# Recupera i dati del mese
-monthly_expenses = get_expenses_by_month(pg_engine, selected_year, selected_month)
-category_spending = get_category_spending(pg_engine, selected_year, selected_month)
-targets = get_targets(pg_session)
-income = get_income(pg_session, 1, selected_year, selected_month)
-
-
-# Statistiche generali
-st.subheader(f"📅 Riepilogo {format_month_year(selected_year, selected_month)}")
-
-if not monthly_expenses.empty:
-    total_spent = monthly_expenses["amount"].sum()
-    saves = income.amount - total_spent if income else -total_spent 
-    num_transactions = len(monthly_expenses)
-    avg_transaction = total_spent / num_transactions if num_transactions > 0 else 0
-
-    # Calcola target totale (solo target > 0) e verifica superamenti
-    total_target = sum(v for v in targets.values() if v > 0) if targets else 0
-    exceeded_categories = []
-    has_any_targets = total_target > 0
-
-    if targets:
-        for category in CATEGORIES:
-            spent = category_spending[category_spending["category"] == category][
-                "total"
-            ].sum()
-            target = targets.get(category, 0)
-            # Solo categorie con target impostato (> 0) e superato
-            if target > 0 and spent > target:
-                exceeded_categories.append(
-                    {
-                        "category": category,
-                        "spent": spent,
-                        "target": target,
-                        "excess": spent - target,
-                        "percentage": (spent / target * 100),
-                    }
-                )
+from models import MESI_ITALIANI, format_month_year, select_accounts
+from database.connection import get_engine, session_scope
+from database.instrumentation import page_run
+from services.page_data import load_monthly_dashboard
+from services.target_service import align_spending_with_targets
+from services.money import to_euros
+
+pg_engine = get_engine()
 
-    # Alert per superamento target (solo se ci sono target impostati)
-    if has_any_targets and exceeded_categories:
-        st.error(
-            f"⚠️ **ATTENZIONE: {len(exceeded_categories)} {'categoria ha' if len(exceeded_categories) == 1 else 'categorie hanno'} superato il target mensile!**"
+with page_run("monthly_dashboard"), session_scope() as pg_session:
+    st.header("Dashboard Mensile")
+    st.set_page_config(page_title="Dashboard Mensile", page_icon="💰", layout="wide")
+    st.title("Dashboard Mensile")
+
+    # Selettori per mese e anno
+    col1, col2 = st.columns(2)
+
+    with col1:
+        selected_year = st.selectbox(
+            "Anno",
+            options=list(range(datetime.now().year, datetime.now().year - 10, -1)),
+            index=0,
         )
 
-        for cat in exceeded_categories:
-            with st.expander(
-                f"❌ **{cat['category']}**: Superamento di €{cat['excess']:.2f} ({cat['percentage']:.1f}% del target)",
-                expanded=False,
-            ):
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Speso", f"€{cat['spent']:.2f}")
-                col2.metric("Target", f"€{cat['target']:.2f}")
-                col3.metric(
-                    "Eccedenza",
-                    f"€{cat['excess']:.2f}",
-                    delta=f"+{cat['percentage'] - 100:.1f}%",
-                    delta_color="inverse",
-                )
+    with col2:
+        selected_month = st.selectbox(
+            "Mese",
+            options=list(range(1, 13)),
+            format_func=lambda x: MESI_ITALIANI[x],
+            index=datetime.now().month - 1,
+        )
 
-    # Verifica budget totale (solo se ci sono target impostati)
-    if has_any_targets:
-        if total_spent > total_target:
-            st.warning(
-                f"⚠️ Il budget totale mensile di €{total_target:.2f} è stato superato di €{total_spent - total_target:.2f}"
-            )
-        else:
-            remaining = total_target - total_spent
-            st.success(
-                f"✅ Sei in budget! Rimangono €{remaining:.2f} del budget mensile totale"
+    # Filtro per account: nessuna selezione = tutti gli account
+    account_ids = select_accounts(pg_session)
+
+    # Recupera i dati del mese
+    # letture indipendenti in parallelo: il tempo è quello della query più lenta
+    data = load_monthly_dashboard(pg_engine, selected_year, selected_month, account_ids)
+    monthly_expenses = data.expenses
+    category_spending = data.category_spending
+    targets = data.targets
+    # entrate e spese del mese degli account selezionati
+    month_summary = data.month_summary
+    account_spending = data.account_spending
+
+    # Statistiche generali
+    st.subheader(f"📅 Riepilogo {format_month_year(selected_year, selected_month)}")
+
+    if not monthly_expenses.empty:
+        # plotly viene importato solo quando ci sono grafici da mostrare
+        import plotly.express as px
+        import plotly.graph_objects as go
+
+        # somme intere in centesimi, esatte anche su molti movimenti
+        total_spent = to_euros(int(monthly_expenses["amount_cents"].sum()))
+        saves = float(month_summary["savings"].sum())
+        num_transactions = len(monthly_expenses)
+        avg_transaction = total_spent / num_transactions if num_transactions > 0 else 0
+
+        # Spesa e target per categoria, allineati in un unico DataFrame
+        aligned = align_spending_with_targets(category_spending, targets)
+
+        # Calcola target totale (solo target > 0) e verifica superamenti
+        total_target = aligned["target"].sum()
+        exceeded_categories = aligned[aligned["exceeded"]]
+        has_any_targets = total_target > 0
+
+        # Alert per superamento target (solo se ci sono target impostati)
+        if has_any_targets and not exceeded_categories.empty:
+            st.error(
+                f"⚠️ **ATTENZIONE: {len(exceeded_categories)} {'categoria ha' if len(exceeded_categories) == 1 else 'categorie hanno'} superato il target mensile!**"
             )
 
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Totale Speso", f"€{total_spent:.2f}")
-    col1.metric("Risparmi", f"€{saves:.2f}")
-    col2.metric("Numero Transazioni", num_transactions)
-    col3.metric("Media per Transazione", f"€{avg_transaction:.2f}")
-
-    # Grafico a torta per categorie
-    st.subheader("Distribuzione Spese per Categoria")
-    fig_pie = px.pie(
-        category_spending,
-        values="total",
-        names="category",
-        title=f"Distribuzione Spese - {format_month_year(selected_year, selected_month)}",
-    )
-    st.plotly_chart(fig_pie, use_container_width=True)
-
-    # Confronto con i target
-    st.subheader("🎯 Confronto con i Target Mensili")
-
-    if targets:
-        comparison_data = []
-
-        for category in CATEGORIES:
-            spent = category_spending[category_spending["category"] == category][
-                "total"
-            ].sum()
-            target = targets.get(category, 0)
-
-            if target > 0 or spent > 0:
-                percentage = (spent / target * 100) if target > 0 else 100
-                status = (
-                    "✅"
-                    if spent <= target and target > 0
-                    else "⚠️" if target > 0 else "➖"
+            for cat in exceeded_categories.itertuples():
+                with st.expander(
+                    f"❌ **{cat.category}**: Superamento di €{cat.excess:.2f} ({cat.pct:.1f}% del target)",
+                    expanded=False,
+                ):
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Speso", f"€{cat.spent:.2f}")
+                    col2.metric("Target", f"€{cat.target:.2f}")
+                    col3.metric(
+                        "Eccedenza",
+                        f"€{cat.excess:.2f}",
+                        delta=f"+{cat.pct - 100:.1f}%",
+                        delta_color="inverse",
+                    )
+
+        # Verifica budget totale (solo se ci sono target impostati)
+        if has_any_targets:
+            if total_spent > total_target:
+                st.warning(
+                    f"⚠️ Il budget totale mensile di €{total_target:.2f} è stato superato di €{total_spent - total_target:.2f}"
+                )
+            else:
+                remaining = total_target - total_spent
+                st.success(
+                    f"✅ Sei in budget! Rimangono €{remaining:.2f} del budget mensile totale"
                 )
 
-                comparison_data.append(
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Totale Speso", f"€{total_spent:.2f}")
+        col1.metric("Risparmi", f"€{saves:.2f}")
+        col2.metric("Numero Transazioni", num_transactions)
+        col3.metric("Media per Transazione", f"€{avg_transaction:.2f}")
+
+        # Grafico a torta per categorie
+        st.subheader("Distribuzione Spese per Categoria")
+        fig_pie = px.pie(
+            category_spending,
+            values="total",
+            names="category",
+            title=f"Distribuzione Spese - {format_month_year(selected_year, selected_month)}",
+        )
+        st.plotly_chart(fig_pie, use_container_width=True)
+
+        # Spese per account, suddivise per categoria
+        if account_spending["account_id"].nunique() > 1:
+            st.subheader("💳 Spese per Account")
+            fig_accounts = px.bar(
+                account_spending,
+                x="account",
+                y="total",
+                color="category",
+                title=f"Spese per Account - {format_month_year(selected_year, selected_month)}",
+                labels={"account": "Account", "total": "Importo (€)", "category": "Categoria"},
+            )
+            st.plotly_chart(fig_accounts, use_container_width=True)
+
+        # Confronto con i target
+        st.subheader("🎯 Confronto con i Target Mensili")
+
+        if targets:
+            shown = aligned[aligned["has_target"] | (aligned["spent"] > 0)]
+
+            if not shown.empty:
+                df_comparison = pd.DataFrame(
                     {
-                        "Categoria": category,
-                        "Speso": f"€{spent:.2f}",
-                        "Target": f"€{target:.2f}" if target > 0 else "Non impostato",
-                        "Percentuale": f"{percentage:.1f}%" if target > 0 else "N/A",
-                        "Status": status,
+                        "Categoria": shown["category"],
+                        "Speso": shown["spent"],
+                        "Target": shown["target"].where(shown["has_target"]),
+                        "Percentuale": shown["pct"],
+                        "Status": shown["status"],
                     }
                 )
+                st.dataframe(
+                    df_comparison,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "Speso": st.column_config.NumberColumn(format="€%.2f"),
+                        "Target": st.column_config.NumberColumn(
+                            format="€%.2f", help="Vuoto se non impostato"
+                        ),
+                        "Percentuale": st.column_config.NumberColumn(format="%.1f%%"),
+                    },
+                )
 
-        if comparison_data:
-            df_comparison = pd.DataFrame(comparison_data)
-            st.dataframe(df_comparison, use_container_width=True, hide_index=True)
-
-            # Grafico a barre confronto
-            chart_data = []
-            for category in CATEGORIES:
-                spent = category_spending[category_spending["category"] == category][
-                    "total"
-                ].sum()
-                target = targets.get(category, 0)
-
-                if target > 0 or spent > 0:
-                    chart_data.append(
-                        {"Categoria": category, "Speso": spent, "Target": target}
-                    )
-
-            if chart_data:
-                df_chart = pd.DataFrame(chart_data)
+                # Grafico a barre confronto
                 fig_bar = go.Figure(
                     data=[
                         go.Bar(
                             name="Speso",
-                            x=df_chart["Categoria"],
-                            y=df_chart["Speso"],
+                            x=shown["category"],
+                            y=shown["spent"],
                             marker_color="indianred",
                         ),
                         go.Bar(
                             name="Target",
-                            x=df_chart["Categoria"],
-                            y=df_chart["Target"],
+                            x=shown["category"],
+                            y=shown["target"],
                             marker_color="lightseagreen",
                         ),
                     ]
@@ -197,25 +184,25 @@ if not monthly_expenses.empty:
                     yaxis_title="Importo (€)",
                 )
                 st.plotly_chart(fig_bar, use_container_width=True)
+            else:
+                st.info("Imposta dei target per vedere il confronto.")
         else:
-            st.info("Imposta dei target per vedere il confronto.")
+            st.info(
+                "Nessun target impostato. Vai alla sezione 'Imposta Target' per configurarli."
+            )
+
+        # Dettaglio transazioni del mese
+        st.subheader("Dettaglio Transazioni")
+        st.dataframe(
+            monthly_expenses[["date", "category", "amount", "description"]],
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "date": st.column_config.DateColumn(format="DD/MM/YYYY"),
+                "amount": st.column_config.NumberColumn(format="€%.2f"),
+            },
+        )
     else:
         st.info(
-            "Nessun target impostato. Vai alla sezione 'Imposta Target' per configurarli."
+            f"Nessuna spesa registrata per {format_month_year(selected_year, selected_month)}"
         )
-
-    # Dettaglio transazioni del mese
-    st.subheader("Dettaglio Transazioni")
-    monthly_display = monthly_expenses.copy()
-    monthly_display["date"] = monthly_display["date"].dt.strftime("%d/%m/%Y")
-    monthly_display["amount"] = monthly_display["amount"].apply(lambda x: f"€{x:.2f}")
-
-    st.dataframe(
-        monthly_display[["date", "category", "amount", "description"]],
-        use_container_width=True,
-        hide_index=True,
-    )
-else:
-    st.info(
-        f"Nessuna spesa registrata per {format_month_year(selected_year, selected_month)}"
-    )
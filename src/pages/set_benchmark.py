@@ -1,88 +1,122 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from database.postgres_connection import init_postgres_db
-from services.expense_service import CATEGORIES
-from services.target_service import get_targets, set_target
-
-pg_engine, pg_session = init_postgres_db()
-
-st.header("Imposta Target Mensili per Categoria")
-st.set_page_config(
-    page_title="Imposta Target Mensili per Categoria", page_icon="💰", layout="wide"
-)
-st.title("Imposta Target Mensili per Categoria")
-
-st.info(
-    "💡 Imposta i limiti di spesa mensili che desideri rispettare per ogni categoria."
-)
-
-# Recupera i target esistenti
-current_targets = get_targets(pg_session)
-
-# Form per impostare i target
-with st.form("targets_form"):
-    st.subheader("Configura i Target")
-
-    targets_data = {}
-
-    # Crea due colonne per organizzare meglio i campi
-    col1, col2 = st.columns(2)
-
-    for i, category in enumerate(CATEGORIES):
-        current_value = current_targets.get(category, 0.0)
-
-        with col1 if i % 2 == 0 else col2:
-            targets_data[category] = st.number_input(
-                f"{category}",
-                min_value=0.0,
-                value=current_value,
-                step=10.0,
-                format="%.2f",
-                key=f"target_{category}",
-            )
-
-    submitted = st.form_submit_button(
-        "💾 Salva Tutti i Target", type="primary", use_container_width=True
+from datetime import date
+from database.connection import get_engine, session_scope
+from database.instrumentation import page_run
+from services.category_service import add_category, get_categories
+from services.target_service import get_targets, set_targets_bulk
+
+pg_engine = get_engine()
+# elenco letto una volta dal database e tenuto in memoria
+categories = get_categories(pg_engine)
+
+with page_run("set_benchmark"), session_scope() as pg_session:
+    st.header("Imposta Target Mensili per Categoria")
+    st.set_page_config(
+        page_title="Imposta Target Mensili per Categoria", page_icon="💰", layout="wide"
     )
+    st.title("Imposta Target Mensili per Categoria")
 
-    if submitted:
-        success_count = 0
-        for category, target_amount in targets_data.items():
-            if target_amount > 0:
-                if set_target(pg_session, category, target_amount):
-                    success_count += 1
-
-        if success_count > 0:
-            st.success(f"✅ {success_count} target salvati con successo!")
-            st.rerun()
-        else:
-            st.warning("⚠️ Nessun target impostato (tutti i valori sono zero).")
-
-# Mostra i target attuali
-if current_targets:
-    st.subheader(f"Target Attuali: Totale €{sum(current_targets.values())}")
-
-    targets_display = pd.DataFrame(
-        [
-            {"Categoria": cat, "Target Mensile": f"€{amount:.2f}"}
-            for cat, amount in current_targets.items()
-        ]
+    st.info(
+        "💡 Imposta i limiti di spesa mensili che desideri rispettare per ogni categoria."
     )
-    targets_display = targets_display.sort_values("Categoria")
 
-    st.dataframe(targets_display, use_container_width=True, hide_index=True)
+    # Nuove categorie: vengono salvate nel database, senza modificare il codice
+    with st.expander("➕ Aggiungi una categoria"):
+        new_category = st.text_input("Nome della categoria")
+        if st.button("Aggiungi categoria"):
+            if new_category.strip() in categories:
+                st.warning(f"⚠️ La categoria '{new_category.strip()}' esiste già.")
+            elif add_category(pg_session, new_category):
+                st.success(f"✅ Categoria '{new_category.strip()}' aggiunta!")
+                st.rerun()
+            else:
+                st.error("❌ Impossibile aggiungere la categoria.")
+
+    # Recupera i target validi nel mese corrente
+    current_targets = get_targets(pg_session)
 
-    # Grafico a barre dei target
-    fig_targets = px.bar(
-        pd.DataFrame(
+    st.subheader("Configura i Target")
+
+    # fuori dal form: cambiando mese i campi mostrano i target validi in quel mese
+    # (i mesi precedenti restano confrontati con i target validi allora)
+    valid_from = st.date_input(
+        "Validi dal mese",
+        value=date.today().replace(day=1),
+        format="YYYY-MM-DD",
+        help="I target valgono dal mese della data scelta in poi.",
+    ).replace(day=1)
+    targets_as_of = get_targets(pg_session, as_of=valid_from)
+
+    # Form per impostare i target
+    with st.form("targets_form"):
+        targets_data = {}
+
+        # Crea due colonne per organizzare meglio i campi
+        col1, col2 = st.columns(2)
+
+        for i, category in enumerate(categories):
+            current_value = targets_as_of.get(category, 0.0)
+
+            with col1 if i % 2 == 0 else col2:
+                targets_data[category] = st.number_input(
+                    f"{category}",
+                    min_value=0.0,
+                    value=current_value,
+                    step=10.0,
+                    format="%.2f",
+                    # un campo per mese: il valore iniziale segue il mese scelto
+                    key=f"target_{category}_{valid_from.isoformat()}",
+                )
+
+        submitted = st.form_submit_button(
+            "💾 Salva Tutti i Target", type="primary", use_container_width=True
+        )
+
+        if submitted:
+            # solo i target diversi da quelli validi in valid_from (0 toglie il target),
+            # in un solo upsert e un solo commit
+            to_save = {
+                category: target_amount
+                for category, target_amount in targets_data.items()
+                if target_amount != targets_as_of.get(category, 0.0)
+            }
+
+            if not to_save:
+                st.warning("⚠️ Nessun target modificato.")
+            elif set_targets_bulk(pg_session, to_save, valid_from):
+                st.success(f"✅ {len(to_save)} target salvati con successo!")
+                st.rerun()
+            else:
+                st.error("❌ Errore nel salvare i target. Riprova.")
+
+    # Mostra i target attuali
+    if current_targets:
+        # plotly viene importato solo quando ci sono grafici da mostrare
+        import plotly.express as px
+
+        st.subheader(f"Target Attuali: Totale €{sum(current_targets.values())}")
+
+        targets_display = pd.DataFrame(
             [
-                {"Categoria": cat, "Target": amount}
+                {"Categoria": cat, "Target Mensile": f"€{amount:.2f}"}
                 for cat, amount in current_targets.items()
             ]
-        ).sort_values("Target", ascending=False),
-        x="Categoria",
-        y="Target",
-        title="Visualizzazione Target Mensili",
-    )
-    st.plotly_chart(fig_targets, use_container_width=True)
+        )
+        targets_display = targets_display.sort_values("Categoria")
+
+        st.dataframe(targets_display, use_container_width=True, hide_index=True)
+
+        # Grafico a barre dei target
+        fig_targets = px.bar(
+            pd.DataFrame(
+                [
+                    {"Categoria": cat, "Target": amount}
+                    for cat, amount in current_targets.items()
+                ]
+            ).sort_values("Target", ascending=False),
+            x="Categoria",
+            y="Target",
+            title="Visualizzazione Target Mensili",
+        )
+        st.plotly_chart(fig_targets, use_container_width=True)
@@ -3,6 +3,10 @@ from database.models import Account
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, select,extract, insert
 from typing import Dict
+from services.cache import bump_data_version, cached_read
+
+# etichetta delle spese registrate senza account (account_id 0 nei rollup)
+NO_ACCOUNT_LABEL = "Senza account"
 
 
 def set_account(session: Session, name:str) -> bool:
@@ -14,6 +18,7 @@ def set_account(session: Session, name:str) -> bool:
 
         session.execute(stmt)
         session.commit()
+        bump_data_version()
         return True
     except Exception as e:
         print(f"Errore nell'impostare il target: {e}")
@@ -26,6 +31,15 @@ def get_accounts(session: Session) -> Dict[str, float]:
     result = session.execute(stmt).scalars().all()
     return result
 
+
+@cached_read
+def get_account_options(session: Session) -> Dict[int, str]:
+    """Account selezionabili nei filtri delle analisi (0 = spese senza account)"""
+    stmt = select(Account.id, Account.name).order_by(Account.name)
+    options = {0: NO_ACCOUNT_LABEL}
+    options.update(session.execute(stmt).all())
+    return options
+
 if __name__ == "__main__":
 
     from database.postgres_connection import init_postgres_db
@@ -0,0 +1,145 @@
+import functools
+import threading
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Optional,
+    ParamSpec,
+    TypeVar,
+    cast,
+    overload,
+)
+from cachetools import LRUCache
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+# numero massimo di risultati tenuti in memoria (politica LRU)
+CACHE_MAX_ENTRIES = 256
+
+_lock = threading.Lock()
+_cache: LRUCache = LRUCache(maxsize=CACHE_MAX_ENTRIES)
+_data_version: int = 0
+_hits: int = 0
+_misses: int = 0
+
+
+def get_data_version() -> int:
+    """Versione corrente dei dati: cambia ad ogni scrittura"""
+    return _data_version
+
+
+def bump_data_version() -> int:
+    """Invalida tutti i risultati in cache; da chiamare dopo ogni scrittura"""
+    global _data_version
+    with _lock:
+        _data_version += 1
+        _cache.clear()
+        return _data_version
+
+
+def cache_stats() -> Dict[str, int]:
+    """Statistiche di utilizzo della cache"""
+    return {
+        "hits": _hits,
+        "misses": _misses,
+        "entries": len(_cache),
+        "max_entries": int(_cache.maxsize),
+        "data_version": _data_version,
+    }
+
+
+def clear_cache() -> None:
+    global _hits, _misses
+    with _lock:
+        _cache.clear()
+        _hits = 0
+        _misses = 0
+
+
+def _key_part(value: Any) -> Hashable:
+    # engine e sessioni cambiano ad ogni rerun: conta solo il database puntato
+    if isinstance(value, Engine):
+        return str(value.url)
+    if isinstance(value, Session):
+        # get_bind può restituire una Connection: l'URL è quello del suo engine
+        return str(value.get_bind().engine.url)
+    if isinstance(value, (list, set, tuple)):
+        return tuple(_key_part(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    return cast(Hashable, value)
+
+
+def _copy_result(result: Any) -> Any:
+    # i DataFrame sono mutabili: il chiamante non deve poter alterare la copia in cache
+    if isinstance(result, tuple):
+        return tuple(_copy_result(item) for item in result)
+    if hasattr(result, "copy"):
+        return result.copy()
+    return result
+
+
+def _cached(
+    read: Callable[P, T], skip_if: Optional[Callable[[], bool]]
+) -> Callable[P, T]:
+    @functools.wraps(read)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        global _hits, _misses
+        if skip_if is not None and skip_if():
+            return read(*args, **kwargs)
+
+        key = (
+            read.__qualname__,
+            _key_part(args),
+            _key_part(kwargs),
+            _data_version,
+        )
+
+        with _lock:
+            if key in _cache:
+                _hits += 1
+                return cast(T, _copy_result(_cache[key]))
+            _misses += 1
+
+        result = read(*args, **kwargs)
+
+        with _lock:
+            # la versione potrebbe essere cambiata durante la lettura
+            if key[-1] == _data_version:
+                _cache[key] = result
+        return cast(T, _copy_result(result))
+
+    return wrapper
+
+
+@overload
+def cached_read(func: Callable[P, T]) -> Callable[P, T]:
+    ...
+
+
+@overload
+def cached_read(
+    *, skip_if: Optional[Callable[[], bool]] = None
+) -> Callable[[Callable[P, T]], Callable[P, T]]:
+    ...
+
+
+def cached_read(
+    func: Optional[Callable[P, T]] = None,
+    *,
+    skip_if: Optional[Callable[[], bool]] = None,
+) -> Any:
+    """Memorizza il risultato di una lettura, indicizzato su argomenti e versione dei dati
+
+    Con skip_if la lettura non passa dalla cache quando la condizione è vera: serve per le
+    letture servite dallo snapshot delle spese, che si aggiorna da solo con le modifiche
+    degli altri processi (una copia in cache le nasconderebbe).
+    """
+    if func is None:
+        return lambda read: _cached(read, skip_if)
+    return _cached(func, skip_if)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+from database.models import Category
+from services.cache import bump_data_version
+from sqlalchemy import Engine, insert, select
+from sqlalchemy.orm import Session
+from typing import TYPE_CHECKING, Any, Dict, List, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Le categorie cambiano di rado: vengono lette una volta per database e tenute in memoria
+# finché add_category (o clear_category_cache) non le invalida.
+
+_lock = threading.Lock()
+_categories: Dict[str, Dict[str, Any]] = {}
+
+
+def _engine(bind: Union[Engine, Session]) -> Engine:
+    # get_bind può restituire una Connection: conta il suo engine
+    return bind.get_bind().engine if isinstance(bind, Session) else bind
+
+
+def _load(bind: Union[Engine, Session]) -> Dict[str, Any]:
+    engine = _engine(bind)
+    key = str(engine.url)
+    with _lock:
+        if key not in _categories:
+            with engine.connect() as conn:
+                rows = conn.execute(
+                    select(Category.id, Category.name).order_by(Category.id)
+                ).all()
+            _categories[key] = {
+                "names": [name for _, name in rows],
+                "ids": {name: category_id for category_id, name in rows},
+            }
+        return _categories[key]
+
+
+def clear_category_cache() -> None:
+    with _lock:
+        _categories.clear()
+
+
+def get_categories(bind: Union[Engine, Session]) -> List[str]:
+    """Nomi delle categorie, nell'ordine di inserimento"""
+    return list(_load(bind)["names"])
+
+
+def get_category_ids(bind: Union[Engine, Session]) -> Dict[str, int]:
+    """Chiave intera di ogni categoria, per nome"""
+    return dict(_load(bind)["ids"])
+
+
+def category_dtype(bind: Union[Engine, Session]) -> pd.CategoricalDtype:
+    """Dtype Categorical con tutte le categorie (anche quelle senza spese)"""
+    import pandas as pd
+
+    return pd.CategoricalDtype(_load(bind)["names"])
+
+
+def category_names(bind: Union[Engine, Session], ids: Any) -> pd.Categorical:
+    """Converte le chiavi category_id in un Categorical dei nomi, senza passare dalle stringhe"""
+    import numpy as np
+    import pandas as pd
+
+    known = list(_load(bind)["ids"].values())
+    ids = np.asarray(ids, dtype=np.int64)
+    # posizione del nome di ogni id; gli id sconosciuti (-1) diventano NaN
+    lookup = np.full(max(known, default=0) + 2, -1, dtype=np.int64)
+    lookup[known] = np.arange(len(known))
+    codes = lookup[np.clip(ids, 0, len(lookup) - 1)]
+    return pd.Categorical.from_codes(codes, dtype=category_dtype(bind))
+
+
+def with_category_names(bind: Union[Engine, Session], df: pd.DataFrame) -> pd.DataFrame:
+    """Sostituisce la colonna category_id con category (Categorical dei nomi)"""
+    if "category_id" not in df.columns:
+        return df
+    df = df.copy()
+    df.insert(
+        df.columns.get_loc("category_id"),
+        "category",
+        category_names(bind, df.pop("category_id").to_numpy()),
+    )
+    return df
+
+
+def with_category_ids(bind: Union[Engine, Session], df: pd.DataFrame) -> pd.DataFrame:
+    """Sostituisce la colonna category (nomi) con category_id, per le scritture in blocco"""
+    import numpy as np
+
+    categories = _load(bind)
+    names = df["category"].astype(category_dtype(bind))
+    if names.isna().any():
+        raise ValueError("Categorie non presenti nella tabella categories")
+    ids = np.asarray([categories["ids"][name] for name in categories["names"]], dtype=np.int64)
+
+    df = df.copy()
+    df.insert(
+        df.columns.get_loc("category"),
+        "category_id",
+        ids[names.cat.codes.to_numpy()],
+    )
+    return df.drop(columns="category")
+
+
+def add_category(session: Session, name: str) -> bool:
+    """Aggiunge una nuova categoria"""
+    try:
+        name = name.strip()
+        if not name:
+            print("Errore: il nome della categoria è vuoto")
+            return False
+        session.execute(insert(Category).values(name=name))
+        session.commit()
+        clear_category_cache()
+        bump_data_version()
+        return True
+    except Exception as e:
+        session.rollback()
+        print(f"Errore nell'aggiungere la categoria: {e}")
+        return False
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from database.models import Account, DeletedRow, Expense, Income
+from sqlalchemy.orm import Session
+from sqlalchemy import Engine, func, insert, select
+from typing import Any, Dict, Iterable, Optional
+
+# Ogni lettura riparte un po' prima del watermark: le righe con lo stesso istante (secondi
+# interi dei vecchi default SQLite) o confermate da transazioni iniziate prima dell'ultima
+# lettura arrivano comunque. Le righe della finestra possono quindi tornare più volte.
+WATERMARK_OVERLAP = timedelta(seconds=5)
+
+TRACKED_MODELS: Dict[str, Any] = {
+    "expenses": Expense,
+    "incomes": Income,
+    "accounts": Account,
+}
+
+
+def _model(table_name: str) -> Any:
+    if table_name not in TRACKED_MODELS:
+        raise ValueError(
+            f"Tabella '{table_name}' non tracciata. Tabelle ammesse: {', '.join(TRACKED_MODELS)}"
+        )
+    return TRACKED_MODELS[table_name]
+
+
+def record_deletes(session: Session, table_name: str, row_ids: Iterable[int]) -> None:
+    """Registra le tombstone delle righe cancellate, nella transazione del chiamante"""
+    _model(table_name)
+    rows = [{"table_name": table_name, "row_id": row_id} for row_id in row_ids]
+    if rows:
+        session.execute(insert(DeletedRow), rows)
+
+
+def get_change_watermark(engine: Engine, table_name: str) -> Optional[datetime]:
+    """Istante dell'ultima modifica o cancellazione nota per la tabella"""
+    model = _model(table_name)
+    with engine.connect() as conn:
+        updated = conn.scalar(select(func.max(model.updated_at)))
+        deleted = conn.scalar(
+            select(func.max(DeletedRow.deleted_at)).where(
+                DeletedRow.table_name == table_name
+            )
+        )
+    return max((ts for ts in (updated, deleted) if ts is not None), default=None)
+
+
+def get_changes_since(
+    engine: Engine,
+    table_name: str,
+    watermark: Optional[datetime] = None,
+    overlap: timedelta = WATERMARK_OVERLAP,
+) -> Dict[str, Any]:
+    """Righe inserite, modificate e cancellate da `watermark - overlap` in poi (None = tutto)
+
+    Restituisce "inserted" e "updated" (DataFrame con tutte le colonne), "deleted" (id)
+    e il nuovo "watermark" da passare alla chiamata successiva. Ogni id compare una sola
+    volta, secondo l'ultima operazione: le cancellazioni vanno applicate prima degli
+    inserimenti. Le righe della finestra di sovrapposizione possono ripetersi tra una
+    chiamata e l'altra: chi applica le modifiche scarta quelle già note (id e updated_at).
+    Le query usano gli indici su updated_at e (table_name, deleted_at).
+    """
+    import pandas as pd
+
+    model = _model(table_name)
+    stmt = select(model).order_by(model.updated_at, model.id)
+    tombstones = select(DeletedRow.row_id, DeletedRow.deleted_at).where(
+        DeletedRow.table_name == table_name
+    )
+    if watermark is not None:
+        since = watermark - overlap
+        stmt = stmt.where(model.updated_at >= since)
+        tombstones = tombstones.where(DeletedRow.deleted_at >= since)
+
+    changed = pd.read_sql(stmt, con=engine, parse_dates=["created_at", "updated_at"])
+    deleted = pd.read_sql(tombstones, con=engine, parse_dates=["deleted_at"])
+
+    # un id cancellato e poi riusato (SQLite) resta solo se la riga è più recente
+    last_deleted = deleted.groupby("row_id")["deleted_at"].max()
+    deleted_at = changed["id"].map(last_deleted)
+    changed = changed[deleted_at.isna() | (changed["updated_at"] > deleted_at)]
+    deleted = last_deleted[
+        ~last_deleted.index.isin(changed["id"])
+    ].index.astype(int).tolist()
+
+    new_watermark = max(
+        (
+            ts
+            for ts in (
+                watermark,
+                changed["updated_at"].max() if not changed.empty else None,
+                last_deleted.max() if not last_deleted.empty else None,
+            )
+            if ts is not None
+        ),
+        default=None,
+    )
+    inserted = (
+        changed["created_at"] >= since
+        if watermark is not None
+        else pd.Series(True, index=changed.index)
+    )
+    return {
+        "inserted": changed[inserted].reset_index(drop=True),
+        "updated": changed[~inserted].reset_index(drop=True),
+        "deleted": deleted,
+        "watermark": (
+            pd.Timestamp(new_watermark).to_pydatetime()
+            if new_watermark is not None
+            else None
+        ),
+    }
@@ -1,48 +1,110 @@
-from datetime import date
-from database.models import Expense
+from __future__ import annotations
+
+from datetime import date, datetime
+from database.models import Account, Expense, ExpenseRollup
+from database.partitioning import ensure_expense_partitions
 from sqlalchemy.orm import Session
 from sqlalchemy import Engine
-from typing import Optional, Dict, Any
-import pandas as pd
-from sqlalchemy import select, insert, func
-from numpy import nan
-
-CATEGORIES = [
-    "Mutuo",
-    "Casa",
-    "Investimenti",
-    "Spese auto",
-    "Svago",
-    "Alimentari",
-    "Viaggi",
-    "Regali",
-    "Salute",
-    "Cane",
-    "Parrucchiere",
-    "Mensa",
-    "Telefono",
-    "Donazione",
-    "Caffè",
-    "Abbigliamento",
-]
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Tuple, Union
+from sqlalchemy import Date, Integer, select, insert, func, literal, tuple_, case, and_, or_
+from services.cache import cached_read, bump_data_version
+from services import expense_store
+from services.account_service import NO_ACCOUNT_LABEL
+from services.change_service import record_deletes
+from services.money import sum_cents, to_cents, to_euros, with_cents
+from services.category_service import (
+    category_dtype,
+    get_categories,
+    get_category_ids,
+    with_category_ids,
+    with_category_names,
+)
+from services.rollup_service import (
+    account_filter,
+    apply_expense_delta,
+    apply_dataframe_delta,
+    format_year_month,
+    rollup_range_filter,
+)
+
+if TYPE_CHECKING:
+    # pandas viene importato solo dalle funzioni che lo usano (avvio più rapido)
+    import pandas as pd
+
+
+def _category_id(session: Session, category: str) -> Optional[int]:
+    """Chiave della categoria, stampando un errore se non esiste"""
+    category_id = get_category_ids(session).get(category)
+    if category_id is None:
+        print(
+            f"Errore: categoria '{category}' non valida. Categorie ammesse: "
+            f"{', '.join(get_categories(session))}"
+        )
+    return category_id
+
+
+def _expenses_frame(engine: Engine, df: pd.DataFrame) -> pd.DataFrame:
+    """Forma comune dei DataFrame di spese: date datetime64 e category Categorical"""
+    import pandas as pd
+
+    # lo snapshot restituisce già datetime64
+    if not df.empty and not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df["date"] = pd.to_datetime(df["date"])
+    return with_category_names(engine, df)
+
+
+def _to_date(value: Any) -> date:
+    """Converte stringhe ISO, datetime e date in date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _rollup_values(
+    session: Session, expense_id: int
+) -> Optional[Tuple[date, int, Optional[int], int]]:
+    """Data, categoria, account e importo in centesimi di una spesa, per i delta dei rollup"""
+    row = session.execute(
+        select(
+            Expense.date, Expense.category_id, Expense.account_id, Expense.amount_cents
+        ).where(Expense.id == expense_id)
+    ).one_or_none()
+    return None if row is None else row._tuple()
 
 
 def add_expense(
-    session: Session, date: str, category: str, amount: float, description: str
+    session: Session,
+    date: Union[str, date],
+    category: str,
+    amount: float,
+    description: str,
+    account_id: Optional[int] = None,
 ) -> bool:
     try:
         # Validazione categoria
-        if category not in CATEGORIES:
-            print(
-                f"Errore: categoria '{category}' non valida. Categorie ammesse: {', '.join(CATEGORIES)}"
-            )
+        category_id = _category_id(session, category)
+        if category_id is None:
             return False
 
-        expense = Expense(
-            date=date, category=category, amount=amount, description=description
+        expense_date, amount_cents = _to_date(date), to_cents(amount)
+        ensure_expense_partitions(session.get_bind().engine, [expense_date.year])
+        session.add(
+            Expense(
+                date=expense_date,
+                category_id=category_id,
+                amount_cents=amount_cents,
+                description=description,
+                account_id=account_id,
+            )
+        )
+        session.flush()
+        apply_expense_delta(
+            session, expense_date, category_id, account_id, amount_cents, 1
         )
-        session.add(expense)
         session.commit()
+        bump_data_version()
         return True
     except Exception as e:
         session.rollback()
@@ -53,30 +115,50 @@ def add_expense(
 def update_expense(
     session: Session,
     expense_id: int,
-    date: str,
+    date: Union[str, date],
     category: str,
     amount: float,
     description: str,
 ) -> bool:
     try:
-        if category not in CATEGORIES:
-            print(
-                f"Errore: categoria '{category}' non valida. Categorie ammesse: {', '.join(CATEGORIES)}"
-            )
+        category_id = _category_id(session, category)
+        if category_id is None:
+            return False
+        new_date = _to_date(date)
+        # prima di leggere expenses: la creazione della partizione blocca la tabella
+        ensure_expense_partitions(session.get_bind().engine, [new_date.year])
+
+        old = _rollup_values(session, expense_id)
+        if old is None:
             return False
+        old_date, old_category_id, account_id, old_cents = old
+        apply_expense_delta(
+            session, old_date, old_category_id, account_id, -old_cents, -1
+        )
+
         rows_affected = (
             session.query(Expense)
-            .filter(Expense.id == expense_id)
+            # la data rende la scrittura mirata anche con expenses partizionata per anno
+            .filter(Expense.id == expense_id, Expense.date == old_date)
             .update(
                 {
-                    Expense.date: date,
-                    Expense.category: category,
-                    Expense.amount: amount,
+                    Expense.date: new_date,
+                    Expense.category_id: category_id,
+                    Expense.amount_cents: to_cents(amount),
                     Expense.description: description,
                 }
             )
         )
+        apply_expense_delta(
+            session,
+            new_date,
+            category_id,
+            account_id,
+            to_cents(amount),
+            1,
+        )
         session.commit()
+        bump_data_version()
         return rows_affected > 0
 
     except Exception as e:
@@ -88,15 +170,31 @@ def update_expense(
 def delete_expense(session: Session, expense_id: int) -> bool:
     """Elimina una spesa dal database"""
     try:
-        rows_affected = session.query(Expense).filter(Expense.id == expense_id).delete()
+        old = _rollup_values(session, expense_id)
+        if old is None:
+            return False
+        old_date, old_category_id, account_id, old_cents = old
+        apply_expense_delta(
+            session, old_date, old_category_id, account_id, -old_cents, -1
+        )
+
+        rows_affected = (
+            session.query(Expense)
+            .filter(Expense.id == expense_id, Expense.date == old_date)
+            .delete()
+        )
+        record_deletes(session, "expenses", [expense_id])
         session.commit()
+        bump_data_version()
 
         return rows_affected > 0
     except Exception as e:
+        session.rollback()
         print(f"Errore nell'eliminare la spesa: {e}")
         return False
 
 
+@cached_read
 def get_expense_by_id(session: Session, expense_id: int) -> Optional[Dict[str, Any]]:
     """Recupera una singola spesa per ID"""
     try:
@@ -111,155 +209,488 @@ def get_expense_by_id(session: Session, expense_id: int) -> Optional[Dict[str, A
         return None
 
 
-def get_all_expenses(engine: Engine) -> pd.DataFrame:
-    """Recupera tutte le spese come DataFrame"""
-    stmt = select(Expense).order_by(Expense.date.desc())
-    df = pd.read_sql(stmt, con=engine)
-
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"])
+@cached_read(skip_if=expense_store.store_enabled)
+def get_all_expenses(
+    engine: Engine, account_ids: Optional[List[int]] = None
+) -> pd.DataFrame:
+    """Recupera tutte le spese come DataFrame (eventualmente dei soli account indicati)"""
+    import pandas as pd
+    if expense_store.store_enabled():
+        return _expenses_frame(
+            engine, expense_store.get_expenses_frame(engine, account_ids=account_ids)
+        )
 
-    return df
+    stmt = (
+        select(Expense)
+        .where(account_filter(Expense.account_id, account_ids))
+        .order_by(Expense.date.desc())
+    )
+    return _expenses_frame(engine, pd.read_sql(stmt, con=engine))
 
 
-def get_expenses_by_month(engine: Engine, year: int, month: int) -> pd.DataFrame:
+@cached_read(skip_if=expense_store.store_enabled)
+def get_expenses_by_month(
+    engine: Engine, year: int, month: int, account_ids: Optional[List[int]] = None
+) -> pd.DataFrame:
     """Recupera le spese per un mese specifico"""
+    import pandas as pd
     # Crea il range di date per il mese
-    start_date = f"{year}-{month:02d}-01"
+    start_date = date(year, month, 1)
     if month == 12:
-        end_date = f"{year + 1}-01-01"
+        end_date = date(year + 1, 1, 1)
     else:
-        end_date = f"{year}-{month + 1:02d}-01"
+        end_date = date(year, month + 1, 1)
+
+    if expense_store.store_enabled():
+        return _expenses_frame(
+            engine,
+            expense_store.get_expenses_frame(engine, start_date, end_date, account_ids),
+        )
 
     stmt = (
         select(Expense)
-        .where(Expense.date >= start_date, Expense.date < end_date)
+        .where(
+            Expense.date >= start_date,
+            Expense.date < end_date,
+            account_filter(Expense.account_id, account_ids),
+        )
         .order_by(Expense.date.desc())
     )
 
-    df = pd.read_sql(stmt, con=engine)
-
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"])
-
-    return df
+    return _expenses_frame(engine, pd.read_sql(stmt, con=engine))
 
 
-def get_expenses_by_year(engine: Engine, year: int) -> pd.DataFrame:
+@cached_read(skip_if=expense_store.store_enabled)
+def get_expenses_by_year(
+    engine: Engine, year: int, account_ids: Optional[List[int]] = None
+) -> pd.DataFrame:
     """Recupera le spese per un anno specifico"""
+    import pandas as pd
 
-    start_date = f"{year}-01-01"
-    end_date = f"{year + 1}-01-01"
+    start_date = date(year, 1, 1)
+    end_date = date(year + 1, 1, 1)
+
+    if expense_store.store_enabled():
+        return _expenses_frame(
+            engine,
+            expense_store.get_expenses_frame(engine, start_date, end_date, account_ids),
+        )
 
     stmt = (
         select(Expense)
-        .where(Expense.date >= start_date, Expense.date < end_date)
+        .where(
+            Expense.date >= start_date,
+            Expense.date < end_date,
+            account_filter(Expense.account_id, account_ids),
+        )
         .order_by(Expense.date.desc())
     )
 
-    df = pd.read_sql(stmt, con=engine)
-
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"])
-
-    return df
+    return _expenses_frame(engine, pd.read_sql(stmt, con=engine))
 
 
+@cached_read(skip_if=expense_store.store_enabled)
 def get_expenses_by_date_range(
-    engine: Engine, start_date: date, end_date: date
+    engine: Engine,
+    start_date: date,
+    end_date: date,
+    account_ids: Optional[List[int]] = None,
 ) -> pd.DataFrame:
     """Recupera le spese per un range di date personalizzato"""
+    import pandas as pd
+    if expense_store.store_enabled():
+        return _expenses_frame(
+            engine,
+            expense_store.get_expenses_frame(
+                engine, _to_date(start_date), _to_date(end_date), account_ids
+            ),
+        )
 
     stmt = (
         select(Expense)
-        .where(Expense.date >= start_date, Expense.date < end_date)
+        .where(
+            Expense.date >= start_date,
+            Expense.date < end_date,
+            account_filter(Expense.account_id, account_ids),
+        )
         .order_by(Expense.date.desc())
     )
 
-    df = pd.read_sql(stmt, con=engine)
+    return _expenses_frame(engine, pd.read_sql(stmt, con=engine))
+
+
+def _list_expenses_stmt(
+    category_ids: Optional[List[int]],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    account_ids: Optional[List[int]],
+    min_amount: Optional[float],
+    max_amount: Optional[float],
+    after: Optional[Tuple[date, int]],
+    limit: int,
+) -> Any:
+    stmt = select(Expense)
+
+    if category_ids is not None:
+        stmt = stmt.where(Expense.category_id.in_(category_ids))
+    if start_date is not None:
+        stmt = stmt.where(Expense.date >= start_date)
+    if end_date is not None:
+        stmt = stmt.where(Expense.date < end_date)
+    stmt = stmt.where(account_filter(Expense.account_id, account_ids))
+    if min_amount is not None:
+        stmt = stmt.where(Expense.amount_cents >= to_cents(min_amount))
+    if max_amount is not None:
+        stmt = stmt.where(Expense.amount_cents <= to_cents(max_amount))
+    if after is not None:
+        after_date, after_id = after
+        # il limite esplicito sulla data esclude anche le partizioni più recenti del cursore
+        stmt = stmt.where(
+            Expense.date <= after_date,
+            tuple_(Expense.date, Expense.id)
+            < tuple_(literal(after_date, Date), literal(after_id, Integer)),
+        )
 
-    if not df.empty:
-        df["date"] = pd.to_datetime(df["date"])
+    # una riga in più indica se esiste una pagina successiva
+    return stmt.order_by(Expense.date.desc(), Expense.id.desc()).limit(limit + 1)
+
+
+@cached_read(skip_if=expense_store.store_enabled)
+def list_expenses(
+    engine: Engine,
+    categories: Optional[List[str]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    account_ids: Optional[List[int]] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    after: Optional[Tuple[date, int]] = None,
+    limit: int = 25,
+) -> Tuple[pd.DataFrame, Optional[Tuple[date, int]]]:
+    """Recupera una pagina di spese filtrate, dalla più recente (paginazione keyset su date, id)
+
+    Restituisce la pagina e il cursore da passare come `after` per la pagina successiva
+    (None se non ci sono altre spese). end_date è esclusa.
+    """
+    import pandas as pd
+    category_ids = None
+    if categories:
+        ids = get_category_ids(engine)
+        category_ids = [ids[name] for name in categories if name in ids]
+
+    if expense_store.store_enabled():
+        df = expense_store.list_expenses_page(
+            engine,
+            category_ids,
+            start_date,
+            end_date,
+            account_ids,
+            min_amount,
+            max_amount,
+            after,
+            limit,
+        )
+    else:
+        df = pd.read_sql(
+            _list_expenses_stmt(
+                category_ids,
+                start_date,
+                end_date,
+                account_ids,
+                min_amount,
+                max_amount,
+                after,
+                limit,
+            ),
+            con=engine,
+        )
 
-    return df
+    next_cursor = None
+    if len(df) > limit:
+        df = df.head(limit)
+        last = df.iloc[-1]
+        next_cursor = (pd.Timestamp(last["date"]).date(), int(last["id"]))
 
+    return _expenses_frame(engine, df), next_cursor
 
-def import_expenses_from_dataframe(session: Session, df: pd.DataFrame) -> int:
-    """Importa spese da un DataFrame con validazione rigida delle categorie"""
-    invalid_categories = set(
-        [
-            row["category"]
-            for _, row in df.iterrows()
-            if row["category"] not in CATEGORIES
-        ]
+
+IMPORT_COLUMNS = ["date", "category", "amount", "description"]
+
+
+def validate_expenses_dataframe(
+    bind: Union[Engine, Session], df: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Valida in blocco le spese da importare
+
+    Restituisce le righe valide normalizzate (date, categorie Categorical, importi numerici,
+    descrizioni None) e una tabella con tutte le righe non valide e i relativi motivi.
+    """
+    import pandas as pd
+    import numpy as np
+    missing_columns = [col for col in IMPORT_COLUMNS if col not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Colonne mancanti nel file: {', '.join(missing_columns)}")
+
+    if pd.api.types.is_datetime64_any_dtype(df["date"]):
+        # es. colonne data già convertite da read_excel
+        dates = df["date"]
+    else:
+        dates = pd.to_datetime(
+            df["date"].astype(str), format="%Y-%m-%d", errors="coerce"
+        )
+    amounts = pd.to_numeric(df["amount"], errors="coerce")
+    # le categorie sconosciute diventano NaN nella conversione a Categorical
+    categories = df["category"].astype(category_dtype(bind))
+
+    checks = pd.DataFrame(
+        {
+            "data non valida (formato YYYY-MM-DD)": dates.isna(),
+            "categoria non valida": categories.isna(),
+            "importo non numerico": amounts.isna(),
+        },
+        index=df.index,
     )
-    if invalid_categories:
+    invalid = checks.any(axis=1)
+
+    # ogni combinazione di errori diventa un intero: le etichette si calcolano una volta sola
+    failed = checks[invalid]
+    codes = failed.to_numpy().astype(int) @ (1 << np.arange(len(checks.columns)))
+    labels = {
+        code: "; ".join(
+            reason
+            for bit, reason in enumerate(checks.columns)
+            if code & (1 << bit)
+        )
+        for code in np.unique(codes)
+    }
+    reasons = pd.Series(codes).map(labels)
+    errors = pd.DataFrame(
+        {
+            "row": failed.index,
+            "date": df.loc[invalid, "date"].to_numpy(),
+            "category": df.loc[invalid, "category"].to_numpy(),
+            "amount": df.loc[invalid, "amount"].to_numpy(),
+            "reasons": reasons.to_numpy(),
+        }
+    )
+
+    valid = ~invalid
+    clean = pd.DataFrame(
+        {
+            "date": dates[valid].dt.date,
+            "category": categories[valid],
+            "amount": amounts[valid].astype(float),
+            "description": df.loc[valid, "description"]
+            .astype(object)
+            .where(df.loc[valid, "description"].notna(), None),
+        }
+    )
+    if "account_id" in df.columns:
+        clean["account_id"] = df.loc[valid, "account_id"]
+
+    return clean, errors
+
+
+def import_expenses_from_dataframe(session: Session, df: pd.DataFrame) -> int:
+    """Importa spese da un DataFrame con validazione rigida di date, categorie e importi"""
+    import numpy as np
+    df, errors = validate_expenses_dataframe(session, df)
+    if not errors.empty:
         raise Exception(
-            f"Trovate le seguenti categorie non valide: {invalid_categories}"
+            f"Trovate {len(errors)} righe non valide, ad esempio: "
+            f"{errors.head(5).to_dict(orient='records')}"
         )
 
+    ensure_expense_partitions(
+        session.get_bind().engine, {day.year for day in df["date"].dropna()}
+    )
     stmt = insert(Expense)
-    df = df.replace({nan: None})
+    df = with_category_ids(session, with_cents(df)).replace({np.nan: None})
     data = df.to_dict(orient="records")
     session.execute(stmt, data)  # type: ignore
+    apply_dataframe_delta(session, df)
     session.commit()
+    bump_data_version()
 
     return len(df)
 
 
-def get_category_spending(engine: Engine, year: int, month: int) -> pd.DataFrame:
+@cached_read
+def get_category_spending(
+    engine: Engine, year: int, month: int, account_ids: Optional[List[int]] = None
+) -> pd.DataFrame:
     """Calcola la spesa totale per categoria in un mese specifico"""
-    df = get_expenses_by_month(engine, year, month)
+    import pandas as pd
+    stmt = (
+        select(
+            ExpenseRollup.category_id,
+            sum_cents(ExpenseRollup.total_cents).label("total"),
+        )
+        .where(
+            ExpenseRollup.grain == "month",
+            ExpenseRollup.period_start == date(year, month, 1),
+            account_filter(ExpenseRollup.account_id, account_ids),
+        )
+        .group_by(ExpenseRollup.category_id)
+    )
 
-    if df.empty:
-        # Ritorna un DataFrame vuoto con le colonne corrette
-        return pd.DataFrame(columns=["category", "total"])
+    df = pd.read_sql(stmt, con=engine)
+    df["total"] = to_euros(df["total"])
+    return with_category_names(engine, df)
 
-    category_totals = df.groupby("category")["amount"].sum().reset_index()
-    category_totals.columns = ["category", "total"]
 
-    return category_totals
+@cached_read(skip_if=expense_store.store_enabled)
+def compare_periods(
+    engine: Engine,
+    periods: List[Tuple[str, date, date]],
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Confronta la spesa per categoria su N periodi con una sola query
+
+    periods è una lista di (etichetta, inizio, fine esclusa), con etichette univoche e
+    periodi non sovrapposti (una spesa viene attribuita al primo periodo che la contiene).
+    Restituisce una riga per categoria e periodo con total, count e la variazione rispetto
+    al periodo precedente (delta, delta_pct); period è un Categorical ordinato come l'input.
+    """
+    import pandas as pd
+    labels = [label for label, _, _ in periods]
+
+    if expense_store.store_enabled():
+        df = expense_store.period_category_totals(engine, periods, account_ids)
+    else:
+        in_period = [
+            and_(Expense.date >= start, Expense.date < end) for _, start, end in periods
+        ]
+        bucket = case(*zip(in_period, labels))
+        stmt = (
+            select(
+                bucket.label("period"),
+                Expense.category_id,
+                sum_cents(Expense.amount_cents).label("total"),
+                func.count().label("count"),
+            )
+            .where(
+                # intervallo complessivo: con expenses partizionata legge solo gli anni coinvolti
+                Expense.date >= min(start for _, start, _ in periods),
+                Expense.date < max(end for _, _, end in periods),
+                or_(*in_period),
+                account_filter(Expense.account_id, account_ids),
+            )
+            .group_by("period", Expense.category_id)
+        )
+        df = pd.read_sql(stmt, con=engine)
+        df["total"] = to_euros(df["total"])
+
+    # matrice completa categoria × periodo, con zero dove non ci sono spese
+    df = with_category_names(engine, df)
+    categories = sorted(get_categories(engine))
+    df = (
+        df.set_index(["category", "period"])
+        .reindex(
+            pd.MultiIndex.from_product([categories, labels], names=["category", "period"]),
+            fill_value=0,
+        )
+        .reset_index()
+    )
+    df["category"] = df["category"].astype(category_dtype(engine))
+    df["period"] = pd.Categorical(df["period"], categories=labels, ordered=True)
+    df["count"] = df["count"].astype(int)
 
+    previous = df.groupby("category", observed=True)["total"].shift()
+    df["delta"] = df["total"] - previous
+    df["delta_pct"] = (df["delta"] / previous.where(previous > 0)) * 100
+
+    return df
 
-def get_monthly_totals(session: Session, start_date, end_date, dialect="postgresql"):
-    if dialect == "postgresql":
-        month_expr = func.to_char(Expense.date, "YYYY-MM")
-    else:
-        month_expr = func.strftime("%Y-%m", Expense.date)
 
+@cached_read
+def get_monthly_totals(
+    session: Session, start_date, end_date, account_ids: Optional[List[int]] = None
+):
+    import pandas as pd
     stmt = (
         select(
-            month_expr.label("month"),
-            Expense.category,
-            func.sum(Expense.amount).label("total"),
+            ExpenseRollup.year_month,
+            ExpenseRollup.category_id,
+            sum_cents(ExpenseRollup.total_cents).label("total"),
+        )
+        .where(
+            rollup_range_filter(_to_date(start_date), _to_date(end_date)),
+            account_filter(ExpenseRollup.account_id, account_ids),
         )
-        .where(Expense.date >= start_date, Expense.date <= end_date)
-        .group_by("month", Expense.category)
-        .order_by("month")
+        .group_by(ExpenseRollup.year_month, ExpenseRollup.category_id)
+        .order_by(ExpenseRollup.year_month)
     )
 
     df = pd.DataFrame(session.execute(stmt).mappings().all())
-    return df
+    if not df.empty:
+        df["total"] = to_euros(df["total"])
+    return format_year_month(with_category_names(session, df))
 
 
+@cached_read
 def get_overall_monthly_totals(
-    session: Session, start_date, end_date, dialect="postgresql"
+    session: Session, start_date, end_date, account_ids: Optional[List[int]] = None
 ):
-    if dialect == "postgresql":
-        month_expr = func.to_char(Expense.date, "YYYY-MM")
-    else:
-        month_expr = func.strftime("%Y-%m", Expense.date)
-
+    import pandas as pd
     stmt = (
         select(
-            month_expr.label("month"),
-            Expense.category,
-            func.sum(Expense.amount).label("total"),
+            ExpenseRollup.year_month,
+            sum_cents(ExpenseRollup.total_cents).label("total"),
         )
-        .where(Expense.date >= start_date, Expense.date <= end_date)
-        .group_by("month")
-        .order_by("month")
+        .where(
+            rollup_range_filter(_to_date(start_date), _to_date(end_date)),
+            account_filter(ExpenseRollup.account_id, account_ids),
+        )
+        .group_by(ExpenseRollup.year_month)
+        .order_by(ExpenseRollup.year_month)
     )
 
     df = pd.DataFrame(session.execute(stmt).mappings().all())
-    return df
+    if not df.empty:
+        df["total"] = to_euros(df["total"])
+    return format_year_month(df)
+
+
+@cached_read
+def get_account_category_monthly(
+    session: Session, start_date, end_date, account_ids: Optional[List[int]] = None
+) -> pd.DataFrame:
+    """Spesa mensile per account e categoria in [start_date, end_date], dai rollup
+
+    Colonne: month (YYYY-MM), account_id (0 = spese senza account), account (nome),
+    category (Categorical), total (euro) e count.
+    """
+    import pandas as pd
+
+    stmt = (
+        select(
+            ExpenseRollup.year_month,
+            ExpenseRollup.account_id,
+            func.coalesce(Account.name, NO_ACCOUNT_LABEL).label("account"),
+            ExpenseRollup.category_id,
+            sum_cents(ExpenseRollup.total_cents).label("total"),
+            func.sum(ExpenseRollup.count).label("count"),
+        )
+        # account_id 0 (nessun account) non ha una riga in accounts
+        .outerjoin(Account, Account.id == ExpenseRollup.account_id)
+        .where(
+            rollup_range_filter(_to_date(start_date), _to_date(end_date)),
+            account_filter(ExpenseRollup.account_id, account_ids),
+        )
+        .group_by(
+            ExpenseRollup.year_month,
+            ExpenseRollup.account_id,
+            Account.name,
+            ExpenseRollup.category_id,
+        )
+        .order_by(ExpenseRollup.year_month, ExpenseRollup.account_id)
+    )
+
+    df = pd.DataFrame(
+        session.execute(stmt).all(),
+        columns=["year_month", "account_id", "account", "category_id", "total", "count"],
+    )
+    df["total"] = to_euros(df["total"])
+    df["count"] = df["count"].astype(int)
+    return format_year_month(with_category_names(session, df))
@@ -0,0 +1,410 @@
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, timedelta
+from database.config import get_expense_store_settings
+from database.models import Expense
+from sqlalchemy import Engine, Row, select
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from services.cache import get_data_version
+from services.change_service import get_change_watermark, get_changes_since
+from services.money import to_cents, to_euros
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+STORE_COLUMNS = [column.name for column in Expense.__table__.columns]
+
+# righe lette dal database ad ogni giro durante un caricamento completo
+STORE_BATCH_SIZE = 50_000
+
+# _lock protegge solo i dizionari: le letture dal database avvengono fuori, sotto il lock
+# di aggiornamento del singolo database
+_lock = threading.Lock()
+_snapshots: Dict[str, Dict[str, Any]] = {}
+_refresh_locks: Dict[str, threading.Lock] = {}
+
+
+def store_enabled() -> bool:
+    return bool(get_expense_store_settings()["enabled"])
+
+
+def _schema() -> pa.Schema:
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "date": pa.date32(),
+        "category_id": pa.int32(),
+        "amount_cents": pa.int64(),
+        "amount": pa.float64(),
+        "description": pa.string(),
+        "account_id": pa.int64(),
+        "year_month": pa.int32(),
+        "created_at": pa.timestamp("us"),
+        "updated_at": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[name]) for name in STORE_COLUMNS])
+
+
+def _iter_batches(engine: Engine) -> Iterator[Sequence[Row[Any]]]:
+    stmt = select(*[Expense.__table__.c[name] for name in STORE_COLUMNS])
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=STORE_BATCH_SIZE
+        ).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+def _fetch(engine: Engine) -> pa.Table:
+    """Legge tutte le spese in una tabella Arrow"""
+    import pyarrow as pa
+
+    schema = _schema()
+    batches = [
+        pa.record_batch(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema,
+        )
+        for rows in _iter_batches(engine)
+    ]
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+_EPOCH = date(1970, 1, 1)
+
+
+def _epoch_days(day: date) -> int:
+    """Giorni dal 1970-01-01, la rappresentazione interna di date32"""
+    return (day - _EPOCH).days
+
+
+def _days(table: pa.Table) -> Any:
+    """Vista numpy int32 (senza copia) della colonna date di una tabella in un solo blocco"""
+    import pyarrow as pa
+
+    return table.column("date").chunk(0).view(pa.int32()).to_numpy()
+
+
+def _sort_keys(table: pa.Table) -> Any:
+    """Chiave int64 che ordina come (date, id): giorni nei 32 bit alti, id in quelli bassi"""
+    import numpy as np
+    import pyarrow as pa
+
+    days = table.column("date").combine_chunks().view(pa.int32()).to_numpy()
+    ids = table.column("id").combine_chunks().to_numpy()
+    return (days.astype(np.int64) << 32) | ids
+
+
+def _sort(table: pa.Table) -> pa.Table:
+    """Ordina per (date, id) in un unico blocco contiguo, così gli intervalli sono slice"""
+    return table.sort_by([("date", "ascending"), ("id", "ascending")]).combine_chunks()
+
+
+def _unseen_changes(table: pa.Table, changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Scarta le modifiche già nello snapshot, ripetute dalla finestra di get_changes_since"""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    def unseen(frame: pd.DataFrame) -> pd.DataFrame:
+        if frame.empty:
+            return frame
+        position = pc.index_in(pa.array(frame["id"], pa.int64()), value_set=table["id"])
+        known = position.is_valid().to_numpy(zero_copy_only=False)
+        seen = np.zeros(len(frame), dtype=bool)
+        stored = table["updated_at"].take(position.filter(position.is_valid()))
+        seen[known] = stored.to_numpy() == frame["updated_at"].to_numpy(
+            "datetime64[us]"
+        )[known]
+        return frame[~seen].reset_index(drop=True)
+
+    present = pc.is_in(
+        pa.array(changes["deleted"], pa.int64()), value_set=table["id"]
+    ).to_numpy(zero_copy_only=False)
+    return {
+        **changes,
+        "inserted": unseen(changes["inserted"]),
+        "updated": unseen(changes["updated"]),
+        "deleted": [row_id for row_id, keep in zip(changes["deleted"], present) if keep],
+    }
+
+
+def _apply_changes(table: pa.Table, changes: Dict[str, Any]) -> pa.Table:
+    """Toglie le righe modificate o cancellate e intercala la loro versione corrente
+
+    Lo snapshot resta ordinato per (date, id) senza riordinarlo: le righe nuove, ordinate
+    tra loro, prendono il posto indicato dalla ricerca binaria sulle chiavi esistenti.
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    upserts = pd.concat([changes["inserted"], changes["updated"]], ignore_index=True)
+    stale = pa.array(changes["deleted"] + upserts["id"].tolist(), pa.int64())
+    if len(stale):
+        # filter conserva l'ordine delle righe rimaste
+        table = table.filter(pc.invert(pc.is_in(table["id"], value_set=stale)))
+    if upserts.empty:
+        return table.combine_chunks()
+
+    upserts = upserts[STORE_COLUMNS].astype({"date": "datetime64[ns]"})
+    new_rows = _sort(pa.Table.from_pandas(upserts, schema=_schema(), preserve_index=False))
+    # posizione di ogni riga nuova nella tabella unita
+    positions = np.searchsorted(_sort_keys(table), _sort_keys(new_rows)) + np.arange(
+        len(new_rows)
+    )
+    is_new = np.zeros(len(table) + len(new_rows), dtype=bool)
+    is_new[positions] = True
+    order = np.empty(len(is_new), dtype=np.int64)
+    order[is_new] = np.arange(len(table), len(is_new))
+    order[~is_new] = np.arange(len(table))
+    return pa.concat_tables([table, new_rows]).take(order).combine_chunks()
+
+
+def _new_snapshot(table: pa.Table, **state: Any) -> Dict[str, Any]:
+    return {
+        "table": table,
+        # per la ricerca binaria degli intervalli
+        "days": _days(table) if table.column("date").num_chunks else None,
+        **state,
+    }
+
+
+def _is_stale(snapshot: Dict[str, Any], now: float) -> bool:
+    settings = get_expense_store_settings()
+    return bool(
+        now - snapshot["loaded_at"] > settings["full_refresh_seconds"]
+        or snapshot["data_version"] != get_data_version()
+        or now - snapshot["checked_at"] > settings["refresh_seconds"]
+    )
+
+
+def _refresh(engine: Engine, key: str) -> Dict[str, Any]:
+    """Legge dal database la versione aggiornata dello snapshot e la sostituisce in blocco
+
+    Lo snapshot precedente non viene modificato: chi lo sta leggendo continua a vederlo
+    intero, i lettori successivi trovano quello nuovo.
+    """
+    settings = get_expense_store_settings()
+    now = time.monotonic()
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and not _is_stale(snapshot, now):
+        # aggiornato da un altro thread mentre si aspettava il turno
+        return snapshot
+    # letta prima del database: una scrittura durante la lettura forza un altro giro
+    data_version = get_data_version()
+
+    if (
+        snapshot is None
+        or now - snapshot["loaded_at"] > settings["full_refresh_seconds"]
+    ):
+        # watermark letto prima: ciò che cambia durante il caricamento arriva col delta
+        watermark = get_change_watermark(engine, "expenses")
+        table = _sort(_fetch(engine))
+        loaded_at = now
+    else:
+        # solo le spese inserite, modificate o cancellate dopo l'ultimo watermark
+        changes = _unseen_changes(
+            snapshot["table"], get_changes_since(engine, "expenses", snapshot["watermark"])
+        )
+        watermark = changes["watermark"]
+        table = snapshot["table"]
+        if len(changes["inserted"]) or len(changes["updated"]) or changes["deleted"]:
+            table = _apply_changes(table, changes)
+        loaded_at = snapshot["loaded_at"]
+
+    snapshot = _new_snapshot(
+        table,
+        loaded_at=loaded_at,
+        checked_at=now,
+        watermark=watermark,
+        data_version=data_version,
+    )
+    with _lock:
+        _snapshots[key] = snapshot
+    return snapshot
+
+
+def _refresh_lock(key: str) -> threading.Lock:
+    with _lock:
+        return _refresh_locks.setdefault(key, threading.Lock())
+
+
+def _snapshot(engine: Engine) -> Dict[str, Any]:
+    """Snapshot corrente, aggiornato se serve da un solo thread alla volta per database
+
+    Durante un aggiornamento periodico gli altri thread usano lo snapshot precedente;
+    aspettano solo se manca o se questo processo ha scritto (deve leggere le sue modifiche).
+    """
+    key = str(engine.url)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and not _is_stale(snapshot, time.monotonic()):
+        return snapshot
+
+    refresh_lock = _refresh_lock(key)
+    if snapshot is not None and snapshot["data_version"] == get_data_version():
+        # aggiornamento periodico già in corso in un altro thread: va bene lo snapshot attuale
+        if not refresh_lock.acquire(blocking=False):
+            return snapshot
+    else:
+        refresh_lock.acquire()
+    try:
+        return _refresh(engine, key)
+    finally:
+        refresh_lock.release()
+
+
+def get_expense_table(
+    engine: Engine, start_date: Optional[date] = None, end_date: Optional[date] = None
+) -> pa.Table:
+    """Spese in [start_date, end_date) ordinate per (date, id), come slice senza copia dello snapshot"""
+    import numpy as np
+
+    snapshot = _snapshot(engine)
+    table = snapshot["table"]
+    if snapshot["days"] is None:
+        return table
+
+    days = snapshot["days"]
+    lo = 0 if start_date is None else int(np.searchsorted(days, _epoch_days(start_date)))
+    hi = len(days) if end_date is None else int(np.searchsorted(days, _epoch_days(end_date)))
+    return table.slice(lo, max(hi - lo, 0))
+
+
+def to_frame(table: pa.Table) -> pd.DataFrame:
+    """DataFrame dalla più recente alla meno recente, con date come datetime64"""
+    df = table.to_pandas(date_as_object=False)[::-1].reset_index(drop=True)
+    df["date"] = df["date"].astype("datetime64[ns]")
+    return df
+
+
+def _filter_accounts(table: pa.Table, account_ids: Optional[List[int]]) -> pa.Table:
+    """Righe degli account richiesti (tutte se account_ids è vuoto)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not account_ids:
+        return table
+    # le spese senza account (NULL) corrispondono all'account 0, come nei rollup
+    accounts = pc.fill_null(table["account_id"], 0)
+    return table.filter(pc.is_in(accounts, value_set=pa.array(account_ids, pa.int64())))
+
+
+def get_expenses_frame(
+    engine: Engine,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Spese in [start_date, end_date) dallo snapshot, dalla più recente"""
+    return to_frame(
+        _filter_accounts(get_expense_table(engine, start_date, end_date), account_ids)
+    )
+
+
+def list_expenses_page(
+    engine: Engine,
+    category_ids: Optional[List[int]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    account_ids: Optional[List[int]] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    after: Optional[Tuple[date, int]] = None,
+    limit: int = 25,
+) -> pd.DataFrame:
+    """Filtri di list_expenses applicati allo snapshot con maschere vettoriali (limit + 1 righe)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if after is not None:
+        # le spese successive al cursore hanno data <= a quella del cursore
+        cursor_end = after[0] + timedelta(days=1)
+        end_date = cursor_end if end_date is None else min(end_date, cursor_end)
+    table = _filter_accounts(get_expense_table(engine, start_date, end_date), account_ids)
+
+    mask = pa.scalar(True)
+    if category_ids is not None:
+        mask = pc.and_(
+            mask,
+            pc.is_in(table["category_id"], value_set=pa.array(category_ids, pa.int32())),
+        )
+    if min_amount is not None:
+        mask = pc.and_(mask, pc.greater_equal(table["amount_cents"], to_cents(min_amount)))
+    if max_amount is not None:
+        mask = pc.and_(mask, pc.less_equal(table["amount_cents"], to_cents(max_amount)))
+    if after is not None:
+        after_date = pa.scalar(after[0], pa.date32())
+        mask = pc.and_(
+            mask,
+            pc.or_(
+                pc.less(table["date"], after_date),
+                pc.and_(pc.equal(table["date"], after_date), pc.less(table["id"], after[1])),
+            ),
+        )
+
+    selected = table if isinstance(mask, pa.Scalar) else table.filter(mask)
+    # lo snapshot è in ordine crescente: la pagina sono le ultime righe
+    return to_frame(selected.slice(max(len(selected) - (limit + 1), 0)))
+
+
+def period_category_totals(
+    engine: Engine,
+    periods: List[Tuple[str, date, date]],
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Totale e numero di spese per periodo e categoria (come compare_periods, dallo snapshot)
+
+    Ogni spesa è attribuita al primo periodo che la contiene; le chiavi di raggruppamento
+    sono interi (indice del periodo e category_id).
+    """
+    import numpy as np
+    import pandas as pd
+
+    columns = ["period", "category_id", "total", "count"]
+    if not periods:
+        return pd.DataFrame(columns=columns)
+
+    table = get_expense_table(
+        engine, min(start for _, start, _ in periods), max(end for _, _, end in periods)
+    )
+    if account_ids:
+        # il filtro produce una copia: si ricombina in un blocco per la vista delle date
+        table = _filter_accounts(table, account_ids).combine_chunks()
+    days = _days(table) if table.column("date").num_chunks else np.empty(0, np.int32)
+    bucket = np.select(
+        [
+            (days >= _epoch_days(start)) & (days < _epoch_days(end))
+            for _, start, end in periods
+        ],
+        list(range(len(periods))),
+        default=-1,
+    )
+    in_period = bucket >= 0
+
+    df = pd.DataFrame(
+        {
+            "period": bucket[in_period],
+            "category_id": table.column("category_id").to_numpy()[in_period],
+            "amount_cents": table.column("amount_cents").to_numpy()[in_period],
+        }
+    )
+    # somma intera in centesimi, convertita in euro solo alla fine
+    totals = (
+        df.groupby(["period", "category_id"], sort=False)["amount_cents"]
+        .agg(total="sum", count="size")
+        .reset_index()
+    )
+    totals["period"] = np.asarray([label for label, _, _ in periods], dtype=object)[
+        totals["period"].to_numpy()
+    ]
+    totals["total"] = to_euros(totals["total"])
+    return totals[columns]
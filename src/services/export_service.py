@@ -0,0 +1,136 @@
+import csv
+import io
+from database.models import Category, Expense
+from sqlalchemy import Engine, Row, func, select
+from typing import Any, BinaryIO, Dict, Iterator, Sequence
+from services.cache import cached_read
+from services.money import sum_cents, to_euros
+
+EXPORT_COLUMNS = ["date", "category", "amount", "description"]
+
+# righe lette dal cursore lato server ad ogni giro
+EXPORT_BATCH_SIZE = 10_000
+
+
+def _iter_batches(engine: Engine, batch_size: int) -> Iterator[Sequence[Row[Any]]]:
+    """Legge le spese a blocchi con un cursore lato server"""
+    stmt = (
+        select(
+            Expense.date,
+            Category.name.label("category"),
+            Expense.amount,
+            Expense.description,
+        )
+        .join(Category, Expense.category_id == Category.id)
+        .order_by(Expense.date, Expense.id)
+    )
+
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(stmt)
+        for partition in result.partitions():
+            yield partition
+
+
+@cached_read
+def get_export_summary(engine: Engine) -> Dict[str, Any]:
+    """Numero di spese, importo totale e periodo coperto, calcolati nel database"""
+    stmt = select(
+        func.count().label("count"),
+        sum_cents(Expense.amount_cents).label("total"),
+        func.min(Expense.date).label("first_date"),
+        func.max(Expense.date).label("last_date"),
+    )
+    with engine.connect() as conn:
+        summary = dict(conn.execute(stmt).mappings().one())
+    summary["total"] = to_euros(summary["total"])
+    return summary
+
+
+def iter_expenses_csv(
+    engine: Engine, batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """Genera il CSV delle spese un blocco alla volta"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(EXPORT_COLUMNS)
+
+    for rows in _iter_batches(engine, batch_size):
+        writer.writerows(
+            (row.date.isoformat(), row.category, row.amount, row.description)
+            for row in rows
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_expenses_csv(
+    engine: Engine, output: BinaryIO, batch_size: int = EXPORT_BATCH_SIZE
+) -> int:
+    """Scrive il CSV delle spese su un file, senza tenerlo tutto in memoria"""
+    written = 0
+    for chunk in iter_expenses_csv(engine, batch_size):
+        output.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def export_expenses_parquet(
+    engine: Engine,
+    output: BinaryIO,
+    batch_size: int = EXPORT_BATCH_SIZE,
+    compression: str = "zstd",
+) -> int:
+    """Scrive le spese in formato Parquet (colonne tipizzate e compresse), un row group per blocco"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("date", pa.date32()),
+            ("category", pa.string()),
+            ("amount", pa.float64()),
+            ("description", pa.string()),
+        ]
+    )
+
+    rows_written = 0
+    with pq.ParquetWriter(output, schema, compression=compression) as writer:
+        for rows in _iter_batches(engine, batch_size):
+            columns = list(zip(*rows))
+            writer.write_batch(
+                pa.record_batch(
+                    [
+                        pa.array(values, type=field.type)
+                        for values, field in zip(columns, schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            rows_written += len(rows)
+    return rows_written
+
+
+def export_expenses_excel(
+    engine: Engine, output: BinaryIO, batch_size: int = EXPORT_BATCH_SIZE
+) -> int:
+    """Scrive le spese in un file Excel in modalità write-only (righe scritte in streaming)"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Spese")
+    sheet.append(EXPORT_COLUMNS)
+
+    rows_written = 0
+    for rows in _iter_batches(engine, batch_size):
+        for row in rows:
+            sheet.append(list(row))
+        rows_written += len(rows)
+
+    workbook.save(output)
+    return rows_written
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+from datetime import date
+from database.models import ExpenseRollup
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Tuple
+from services.cache import cached_read
+from services.category_service import category_names
+from services.money import sum_cents, to_euros
+from services.rollup_service import (
+    account_filter,
+    format_year_month,
+    rollup_range_filter,
+)
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+MODELS = ("linear", "seasonal", "smoothing")
+
+# colonne del rollup per cui si possono separare le serie
+SERIES_KEYS = ("category", "account_id")
+
+# la categoria resta la chiave intera category_id fino al risultato finale
+_SERIES_COLUMNS = {
+    "category": ExpenseRollup.category_id,
+    "account_id": ExpenseRollup.account_id,
+}
+
+# mesi usati dal modello lineare (come la regressione storica della pagina)
+LINEAR_WINDOW = 6
+
+SEASON_LENGTH = 12
+
+# quantile della normale per l'intervallo di previsione al 90%
+DEFAULT_Z = 1.645
+
+
+def _month_ordinal(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+def _series_matrix(
+    df: pd.DataFrame, keys: Sequence[str], period: Optional[Tuple[date, date]] = None
+) -> Tuple[pd.DataFrame, pd.Period, np.ndarray]:
+    """Porta il formato lungo (month, keys..., total) in una matrice serie × mesi
+
+    Le colonne vanno dal primo all'ultimo mese di `period` (se assente, dei dati); i mesi
+    senza spese valgono 0. Restituisce anche le chiavi di ogni riga e l'ultimo mese.
+    """
+    import numpy as np
+    import pandas as pd
+
+    months = pd.to_datetime(df["month"], format="%Y-%m")
+    ordinal = (months.dt.year * 12 + months.dt.month - 1).to_numpy()
+    if period is not None:
+        first, last = _month_ordinal(period[0]), _month_ordinal(period[1])
+    else:
+        first, last = int(ordinal.min()), int(ordinal.max())
+
+    if keys:
+        grouped = df.groupby(list(keys), sort=True)
+        series = grouped.ngroup().to_numpy()
+        series_keys = grouped.size().index.to_frame(index=False)
+    else:
+        series = np.zeros(len(df), dtype=int)
+        series_keys = pd.DataFrame(index=range(1))
+
+    Y = np.zeros((len(series_keys), last - first + 1))
+    np.add.at(Y, (series, ordinal - first), df["total"].to_numpy(dtype=float))
+    last_month = pd.Period(year=last // 12, month=last % 12 + 1, freq="M")
+    return series_keys, last_month, Y
+
+
+def _linear(Y: np.ndarray, steps: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Trend lineare sugli ultimi `window` mesi, proiettato dall'ultimo valore osservato"""
+    import numpy as np
+
+    recent = Y[:, -window:]
+    n = recent.shape[1]
+    t = np.arange(n) - (n - 1) / 2
+    denominator = t @ t
+    slope = (recent @ t) / denominator if denominator else np.zeros(len(Y))
+
+    forecast = recent[:, -1:] + slope[:, None] * steps
+    fitted = recent.mean(axis=1, keepdims=True) + slope[:, None] * t
+    dof = max(n - 2, 1)
+    sigma = np.sqrt(((recent - fitted) ** 2).sum(axis=1) / dof)
+    # partendo dall'ultimo valore l'incertezza cresce come una passeggiata aleatoria
+    spread = sigma[:, None] * np.sqrt(steps)
+    return forecast, spread
+
+
+def _seasonal(Y: np.ndarray, steps: np.ndarray, season: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Stesso mese dell'anno precedente (serve almeno una stagione di storico)"""
+    import numpy as np
+
+    n = Y.shape[1]
+    if n < season:
+        # storico troppo corto: media degli ultimi tre mesi
+        level = Y[:, -3:].mean(axis=1, keepdims=True)
+        sigma = Y[:, -3:].std(axis=1, ddof=0)
+        return np.repeat(level, len(steps), axis=1), sigma[:, None] * np.sqrt(steps)
+
+    forecast = Y[:, n - season + (steps - 1) % season]
+    if n > season:
+        sigma = (Y[:, season:] - Y[:, :-season]).std(axis=1, ddof=0)
+    else:
+        sigma = Y.std(axis=1, ddof=0)
+    seasons_ahead = (steps - 1) // season + 1
+    return forecast, sigma[:, None] * np.sqrt(seasons_ahead)
+
+
+def _smoothing(Y: np.ndarray, steps: np.ndarray, alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Smorzamento esponenziale semplice, calcolato per tutte le serie insieme"""
+    import numpy as np
+
+    level = Y[:, 0].copy()
+    errors = np.empty((len(Y), Y.shape[1] - 1))
+    for i in range(1, Y.shape[1]):
+        errors[:, i - 1] = Y[:, i] - level
+        level += alpha * errors[:, i - 1]
+
+    sigma = np.sqrt((errors**2).mean(axis=1)) if errors.size else np.zeros(len(Y))
+    spread = sigma[:, None] * np.sqrt(1 + (steps - 1) * alpha**2)
+    return np.repeat(level[:, None], len(steps), axis=1), spread
+
+
+def forecast_series(
+    df: pd.DataFrame,
+    keys: Sequence[str] = (),
+    model: str = "linear",
+    horizon: int = 3,
+    z: float = DEFAULT_Z,
+    alpha: float = 0.5,
+    window: int = LINEAR_WINDOW,
+    period: Optional[Tuple[date, date]] = None,
+) -> pd.DataFrame:
+    """Previsione di tutte le serie di un DataFrame (month, keys..., total) in un colpo solo
+
+    Restituisce keys..., month, step, forecast, lower, upper e trend (variazione mensile
+    media prevista rispetto all'ultimo mese osservato); previsioni e limiti non sono negativi.
+    Con `period` (inizio, fine) la storia copre tutti i suoi mesi, anche quelli senza spese
+    ai bordi, e la previsione parte dal mese successivo alla fine.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if model not in MODELS:
+        raise ValueError(f"Modello '{model}' non valido. Modelli ammessi: {', '.join(MODELS)}")
+
+    columns = [*keys, "month", "step", "forecast", "lower", "upper", "trend"]
+    if df.empty or horizon < 1:
+        return pd.DataFrame(columns=columns)
+
+    series_keys, last_month, Y = _series_matrix(df, keys, period)
+    steps = np.arange(1, horizon + 1)
+
+    if model == "linear":
+        forecast, spread = _linear(Y, steps, window)
+    elif model == "seasonal":
+        forecast, spread = _seasonal(Y, steps, SEASON_LENGTH)
+    else:
+        forecast, spread = _smoothing(Y, steps, alpha)
+
+    trend = (forecast[:, -1] - Y[:, -1]) / horizon
+    forecast = np.clip(forecast, 0, None)
+    future = pd.period_range(last_month + 1, periods=horizon, freq="M").strftime("%Y-%m")
+
+    result = series_keys.loc[series_keys.index.repeat(horizon)].reset_index(drop=True)
+    result["month"] = np.tile(future, len(Y))
+    result["step"] = np.tile(steps, len(Y))
+    result["forecast"] = forecast.ravel()
+    result["lower"] = np.clip(forecast - z * spread, 0, None).ravel()
+    result["upper"] = (forecast + z * spread).ravel()
+    result["trend"] = np.repeat(trend, horizon)
+    return result[columns]
+
+
+def _monthly_series(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    keys: Sequence[str],
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Totali mensili dai rollup, separati per le colonne in `keys`"""
+    import pandas as pd
+
+    key_columns: list[Any] = [_SERIES_COLUMNS[key] for key in keys]
+    stmt = (
+        select(
+            ExpenseRollup.year_month,
+            *[column.label(key) for key, column in zip(keys, key_columns)],
+            sum_cents(ExpenseRollup.total_cents).label("total"),
+        )
+        .where(
+            rollup_range_filter(start_date, end_date),
+            account_filter(ExpenseRollup.account_id, account_ids),
+        )
+        .group_by(ExpenseRollup.year_month, *key_columns)
+        .order_by(ExpenseRollup.year_month)
+    )
+    df = pd.DataFrame(session.execute(stmt).mappings().all())
+    if not df.empty:
+        df["total"] = to_euros(df["total"])
+    return format_year_month(df)
+
+
+@cached_read
+def forecast_monthly_totals(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    keys: Tuple[str, ...] = (),
+    model: str = "linear",
+    horizon: int = 3,
+    z: float = DEFAULT_Z,
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Previsione dei totali mensili per le serie in `keys` (es. ("category", "account_id"))
+
+    Con account_ids la storia è limitata a quegli account. I modelli stimati restano in
+    cache finché i dati non cambiano.
+    """
+    unknown = set(keys) - set(SERIES_KEYS)
+    if unknown:
+        raise ValueError(f"Chiavi non valide: {', '.join(sorted(unknown))}")
+
+    history = _monthly_series(session, start_date, end_date, keys, account_ids)
+    result = forecast_series(
+        history, keys, model=model, horizon=horizon, z=z, period=(start_date, end_date)
+    )
+    if "category" in keys:
+        result["category"] = category_names(session, result["category"])
+    return result
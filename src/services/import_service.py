@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import io
+import time
+from database.models import Expense
+from database.partitioning import ensure_expense_partitions
+from sqlalchemy import Engine, insert
+from sqlalchemy.orm import Session
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, List, Optional
+from services.cache import bump_data_version
+from services.expense_service import IMPORT_COLUMNS, validate_expenses_dataframe
+from services.category_service import with_category_ids
+from services.money import with_cents
+from services.rollup_service import apply_dataframe_delta
+
+# dimensione dei blocchi letti dal CSV: ogni blocco è una transazione
+BULK_BLOCK_SIZE = 16 << 20
+
+# numero massimo di righe non valide restituite nel report
+MAX_REPORTED_ERRORS = 10_000
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _copy_chunk(session: Session, df: pd.DataFrame) -> None:
+    """Carica un blocco con COPY ... FROM STDIN (solo PostgreSQL)"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY expenses ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_chunk(session: Session, df: pd.DataFrame) -> None:
+    """Carica un blocco con un executemany (dialetti senza COPY)"""
+    data = df.astype(object).where(df.notna(), None)
+    session.execute(insert(Expense), data.to_dict(orient="records"))
+
+
+def load_expense_chunk(session: Session, df: pd.DataFrame) -> None:
+    """Inserisce un blocco di spese già validate (colonne di expenses, importi in amount_cents)
+
+    I rollup non vengono aggiornati. La sessione non deve aver ancora letto expenses.
+    """
+    ensure_expense_partitions(
+        session.get_bind().engine, {day.year for day in df["date"].dropna()}
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        _copy_chunk(session, df)
+    else:
+        _insert_chunk(session, df)
+
+
+def bulk_import_expenses_csv(
+    engine: Engine,
+    source: BinaryIO,
+    block_size: int = BULK_BLOCK_SIZE,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Dict[str, Any]:
+    """Importa un CSV di grandi dimensioni a blocchi, con un commit per blocco
+
+    Il file viene letto in streaming con il parser multithread di pyarrow; su PostgreSQL
+    ogni blocco è caricato con COPY, sugli altri database con un executemany.
+    Le righe non valide vengono scartate e riportate in "errors" (row è la riga di dati,
+    a partire da 0). Restituisce anche righe importate, blocchi, durata e righe al secondo.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    reader = pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=IMPORT_COLUMNS,
+            # tutto come testo: la conversione avviene nella validazione, riga per riga
+            column_types={column: pa.string() for column in IMPORT_COLUMNS},
+            strings_can_be_null=True,
+        ),
+    )
+    started = time.perf_counter()
+    rows = 0
+    read_rows = 0
+    chunks = 0
+    errors: List[pd.DataFrame] = []
+    try:
+        for batch in reader:
+            df = batch.to_pandas()
+            df.index += read_rows
+            read_rows += len(df)
+
+            df, chunk_errors = validate_expenses_dataframe(engine, df)
+            if not chunk_errors.empty and sum(len(e) for e in errors) < MAX_REPORTED_ERRORS:
+                errors.append(chunk_errors)
+            if df.empty:
+                continue
+
+            df = with_category_ids(engine, with_cents(df))
+            with Session(engine) as session:
+                load_expense_chunk(session, df)
+                apply_dataframe_delta(session, df)
+                session.commit()
+
+            rows += len(df)
+            chunks += 1
+            if progress is not None:
+                progress(rows)
+    except Exception as e:
+        raise Exception(
+            f"Importazione interrotta dopo {rows} righe già salvate: {e}"
+        ) from e
+    finally:
+        if rows:
+            bump_data_version()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "invalid_rows": read_rows - rows,
+        "errors": (
+            pd.concat(errors, ignore_index=True).head(MAX_REPORTED_ERRORS)
+            if errors
+            else pd.DataFrame(columns=["row", "date", "category", "amount", "reasons"])
+        ),
+        "chunks": chunks,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+    }
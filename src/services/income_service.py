@@ -1,40 +1,164 @@
-from datetime import datetime, timezone, date
-from database.models import Income 
+from __future__ import annotations
+
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from database.models import ExpenseRollup, Income
+from services.cache import bump_data_version, cached_read
+from services.money import sum_cents, to_cents, to_euros
+from services.rollup_service import (
+    account_filter,
+    format_year_month,
+    rollup_range_filter,
+)
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, select,extract, insert
-from typing import Dict
+from sqlalchemy import BigInteger, func, literal, select, insert, union_all
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def set_income(session: Session, amount: float, date: date, account_id: int) -> bool:
-    """Imposta o aggiorna il target mensile per una categoria"""
+    """Registra un'entrata per un account"""
     try:
         stmt = insert(Income).values(
-            amount=amount,
+            amount_cents=to_cents(amount),
             date=date,
             account_id=account_id
         )
 
         session.execute(stmt)
         session.commit()
+        bump_data_version()
         return True
     except Exception as e:
-        print(f"Errore nell'impostare il target: {e}")
+        session.rollback()
+        print(f"Errore nel registrare l'entrata: {e}")
         return False
 
 
-def get_income(session: Session, account_id: int, year:int, month: int) -> Income:
-    """Recupera tutti i target mensili"""
-    stmt = select(Income).where(and_(extract('year', Income.date) == year,
-            extract('month', Income.date) == month), Income.account_id == account_id)
+def get_income(session: Session, account_id: int, year: int, month: int) -> Income:
+    """Recupera la prima entrata di un account nel mese"""
+    start_date = date(year, month, 1)
+    # intervallo sulla data (usa ix_incomes_account_date), non extract su ogni riga
+    stmt = select(Income).where(
+        Income.account_id == account_id,
+        Income.date >= start_date,
+        Income.date < start_date + relativedelta(months=1),
+    )
     result = session.execute(stmt).scalars().first()
     return result
 
-if __name__ == "__main__":
 
-    from database.postgres_connection import init_postgres_db
-    pg_engine, pg_session = init_postgres_db()
-    # set_income(pg_session, amount=1690, date=date(2025,11,10), account_id=1)
-    get_income(pg_session, 1, 2025, 11)
+@cached_read
+def get_monthly_income(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Entrate mensili per account in [start_date, end_date], con una sola query
+
+    Colonne: month (YYYY-MM), account_id, total (euro) e count.
+    """
+    import pandas as pd
+
+    stmt = (
+        select(
+            Income.year_month,
+            Income.account_id,
+            sum_cents(Income.amount_cents).label("total"),
+            func.count().label("count"),
+        )
+        .where(Income.date >= start_date, Income.date <= end_date)
+        .group_by(Income.year_month, Income.account_id)
+        .order_by(Income.year_month, Income.account_id)
+    )
+    stmt = stmt.where(account_filter(Income.account_id, account_ids))
+
+    df = pd.DataFrame(
+        session.execute(stmt).all(), columns=["year_month", "account_id", "total", "count"]
+    )
+    df["total"] = to_euros(df["total"])
+    return format_year_month(df)
+
+
+@cached_read
+def get_savings_series(
+    session: Session,
+    start_date: date,
+    end_date: date,
+    account_ids: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """Entrate, spese e risparmi per ogni mese di [start_date, end_date], con una sola query
 
+    Le spese arrivano dai rollup, le entrate dalla tabella incomes; i mesi senza movimenti
+    valgono 0. Colonne: month, income, expenses, savings, cumulative_savings (euro) e
+    savings_rate (% delle entrate, NaN senza entrate).
+    """
+    import numpy as np
+    import pandas as pd
+
+    incomes = select(
+        Income.year_month.label("year_month"),
+        sum_cents(Income.amount_cents).label("income"),
+        literal(0, BigInteger).label("expenses"),
+    ).where(Income.date >= start_date, Income.date <= end_date)
+    expenses = select(
+        ExpenseRollup.year_month.label("year_month"),
+        literal(0, BigInteger).label("income"),
+        sum_cents(ExpenseRollup.total_cents).label("expenses"),
+    ).where(rollup_range_filter(start_date, end_date))
+    # l'account 0 comprende le entrate senza account (NULL)
+    incomes = incomes.where(account_filter(Income.account_id, account_ids))
+    expenses = expenses.where(account_filter(ExpenseRollup.account_id, account_ids))
+
+    combined = union_all(
+        incomes.group_by(Income.year_month),
+        expenses.group_by(ExpenseRollup.year_month),
+    ).subquery()
+    stmt = (
+        select(
+            combined.c.year_month,
+            sum_cents(combined.c.income).label("income"),
+            sum_cents(combined.c.expenses).label("expenses"),
+        )
+        .group_by(combined.c.year_month)
+        .order_by(combined.c.year_month)
+    )
+    rows = pd.DataFrame(
+        session.execute(stmt).all(), columns=["year_month", "income", "expenses"]
+    )
+
+    # tutti i mesi dell'intervallo, anche quelli senza movimenti
+    months = pd.period_range(start_date, end_date, freq="M")
+    cents = (
+        rows.set_index("year_month")
+        .reindex(months.year * 100 + months.month, fill_value=0)
+        .astype(np.int64)
+    )
+    savings = cents["income"] - cents["expenses"]
+
+    df = pd.DataFrame(
+        {
+            "year_month": cents.index,
+            "income": to_euros(cents["income"]).to_numpy(),
+            "expenses": to_euros(cents["expenses"]).to_numpy(),
+            "savings": to_euros(savings).to_numpy(),
+            # somma cumulativa sui centesimi: nessun errore di arrotondamento accumulato
+            "cumulative_savings": to_euros(savings.cumsum()).to_numpy(),
+            "savings_rate": (
+                savings / cents["income"].where(cents["income"] > 0) * 100
+            ).to_numpy(),
+        }
+    )
+    return format_year_month(df)
+
+
+if __name__ == "__main__":
 
+    from database.connection import session_scope
 
+    with session_scope() as session:
+        # set_income(session, amount=1690, date=date(2025,11,10), account_id=1)
+        print(get_income(session, 1, 2025, 11))
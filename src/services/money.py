@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, cast, func
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Gli importi sono salvati in centesimi interi (amount_cents): le somme restano esatte.
+# Le API dei servizi continuano a ricevere e restituire euro.
+
+
+def _round_cents(values: Any) -> Any:
+    """Euro (array float) in centesimi int64, arrotondando alla metà lontana dallo zero
+
+    Un importo come 1.005 in binario vale 1.00499999...: il valore in centesimi viene
+    prima arrotondato a 6 decimali, così le metà scritte dall'utente restano metà.
+    """
+    import numpy as np
+
+    scaled = np.round(np.asarray(values, dtype=float) * 100, 6)
+    return (np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)).astype(np.int64)
+
+
+def to_cents(amount: Any) -> int:
+    """Converte un importo in euro in centesimi, con la stessa regola di cents_series"""
+    return int(_round_cents([float(amount)])[0])
+
+
+def to_euros(cents: Any) -> Any:
+    """Converte centesimi (scalare, Series o array) in euro"""
+    return cents / 100
+
+
+def cents_series(amounts: pd.Series) -> pd.Series:
+    """Versione vettoriale di to_cents per una colonna di importi in euro (int64)"""
+    import pandas as pd
+
+    return pd.Series(
+        _round_cents(amounts.astype(float).to_numpy()),
+        index=amounts.index,
+        name=amounts.name,
+    )
+
+
+def sum_cents(column: Any) -> Any:
+    """SUM intera di una colonna in centesimi (PostgreSQL restituirebbe un NUMERIC)"""
+    return cast(func.coalesce(func.sum(column), 0), BigInteger)
+
+
+def with_cents(df: pd.DataFrame) -> pd.DataFrame:
+    """Sostituisce la colonna amount (euro) con amount_cents, per le scritture in blocco"""
+    df = df.copy()
+    df.insert(
+        df.columns.get_loc("amount"), "amount_cents", cents_series(df.pop("amount"))
+    )
+    return df
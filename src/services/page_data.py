@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from database.instrumentation import attach_run, current_run
+from services.expense_service import (
+    get_account_category_monthly,
+    get_category_spending,
+    get_expenses_by_month,
+    get_monthly_totals,
+    get_overall_monthly_totals,
+)
+from services.income_service import get_savings_series
+from services.target_service import get_target_history, get_targets
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Le query indipendenti di una pagina partono insieme, ognuna con la propria sessione e
+# connessione del pool: il tempo della pagina è quello della query più lenta, non la somma.
+
+# resta sotto la dimensione del pool, lasciando connessioni libere agli altri rerun
+MAX_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+Task = Callable[[Session], Any]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=MAX_WORKERS, thread_name_prefix="page-data"
+                )
+    return _executor
+
+
+def run_parallel(engine: Engine, tasks: Dict[str, Task]) -> Dict[str, Any]:
+    """Esegue le letture in parallelo, ciascuna con una sessione propria; risultati per nome
+
+    La prima eccezione di una lettura viene rilanciata al chiamante.
+    """
+    run = current_run()
+
+    def call(task: Task) -> Any:
+        # la sessione apre una connessione solo se la lettura la usa
+        with attach_run(run), Session(engine) as session:
+            return task(session)
+
+    futures = {name: _get_executor().submit(call, task) for name, task in tasks.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+@dataclass(frozen=True)
+class MonthlyDashboardData:
+    """Dati della dashboard mensile"""
+
+    expenses: pd.DataFrame
+    category_spending: pd.DataFrame
+    targets: Dict[str, float]
+    # entrate, spese e risparmi del mese (get_savings_series)
+    month_summary: pd.DataFrame
+    account_spending: pd.DataFrame
+
+
+def load_monthly_dashboard(
+    engine: Engine, year: int, month: int, account_ids: Optional[List[int]] = None
+) -> MonthlyDashboardData:
+    """Legge in parallelo i dati della dashboard di un mese"""
+    month_start = date(year, month, 1)
+    month_end = month_start + relativedelta(months=1, days=-1)
+    results = run_parallel(
+        engine,
+        {
+            "expenses": lambda s: get_expenses_by_month(engine, year, month, account_ids),
+            "category_spending": lambda s: get_category_spending(
+                engine, year, month, account_ids
+            ),
+            # target validi nel mese selezionato, non quelli di oggi
+            "targets": lambda s: get_targets(s, month_start),
+            "month_summary": lambda s: get_savings_series(
+                s, month_start, month_end, account_ids
+            ),
+            "account_spending": lambda s: get_account_category_monthly(
+                s, month_start, month_end, account_ids
+            ),
+        },
+    )
+    return MonthlyDashboardData(**results)
+
+
+@dataclass(frozen=True)
+class TimeTrendData:
+    """Dati dell'andamento temporale (le previsioni dipendono dai controlli della pagina)"""
+
+    monthly_totals: pd.DataFrame
+    overall_totals: pd.DataFrame
+    savings: pd.DataFrame
+    account_totals: pd.DataFrame
+    # target validi in ogni mese del periodo (get_target_history)
+    targets: pd.DataFrame
+
+
+def load_time_trend(
+    engine: Engine,
+    start_date: date,
+    end_date: date,
+    account_ids: Optional[List[int]] = None,
+) -> TimeTrendData:
+    """Legge in parallelo i totali mensili, i risparmi e le spese per account del periodo"""
+    results = run_parallel(
+        engine,
+        {
+            "monthly_totals": lambda s: get_monthly_totals(
+                s, start_date, end_date, account_ids
+            ),
+            "overall_totals": lambda s: get_overall_monthly_totals(
+                s, start_date, end_date, account_ids
+            ),
+            "savings": lambda s: get_savings_series(s, start_date, end_date, account_ids),
+            "account_totals": lambda s: get_account_category_monthly(
+                s, start_date, end_date, account_ids
+            ),
+            "targets": lambda s: get_target_history(s, start_date, end_date),
+        },
+    )
+    return TimeTrendData(**results)
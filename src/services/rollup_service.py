@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from database.models import Expense, ExpenseRollup
+from database.dialect import dialect_insert
+from services.cache import bump_data_version
+from services.money import cents_series, sum_cents
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, func, or_, select, true
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+GRAINS = ("day", "month", "year")
+
+# frequenze pandas corrispondenti alle granularità del rollup
+_GRAIN_FREQ = {"day": "D", "month": "M", "year": "Y"}
+
+_ROLLUP_KEY = ["grain", "period_start", "category_id", "account_id"]
+
+
+def _period_starts(day: date) -> Dict[str, date]:
+    return {
+        "day": day,
+        "month": day.replace(day=1),
+        "year": day.replace(month=1, day=1),
+    }
+
+
+def _upsert_deltas(session: Session, rows: List[Dict[str, Any]]) -> None:
+    """Somma i delta ai totali esistenti (le chiavi devono essere univoche)"""
+    if not rows:
+        return
+
+    insert = dialect_insert(session.get_bind())
+    stmt = insert(ExpenseRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=_ROLLUP_KEY,
+        set_={
+            "total_cents": ExpenseRollup.total_cents + stmt.excluded.total_cents,
+            "count": ExpenseRollup.count + stmt.excluded.count,
+        },
+    )
+    session.execute(stmt, rows)
+
+
+def apply_expense_delta(
+    session: Session,
+    expense_date: date,
+    category_id: int,
+    account_id: Optional[int],
+    amount_cents: int,
+    count: int,
+) -> None:
+    """Aggiorna i rollup di una spesa (count=1 per aggiungere, -1 per togliere)"""
+    periods = _period_starts(expense_date)
+    _upsert_deltas(
+        session,
+        [
+            {
+                "grain": grain,
+                "period_start": period_start,
+                "category_id": category_id,
+                "account_id": account_id or 0,
+                "total_cents": amount_cents,
+                "count": count,
+            }
+            for grain, period_start in periods.items()
+        ],
+    )
+
+    if count < 0:
+        # rimuove i periodi rimasti senza spese
+        session.execute(
+            delete(ExpenseRollup).where(
+                ExpenseRollup.count <= 0,
+                ExpenseRollup.category_id == category_id,
+                ExpenseRollup.account_id == (account_id or 0),
+                ExpenseRollup.period_start.in_(set(periods.values())),
+            )
+        )
+
+
+def _rollup_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Aggrega un DataFrame di spese per tutte le granularità
+
+    L'importo è amount_cents se presente, altrimenti amount in euro.
+    """
+    import pandas as pd
+    dates = pd.to_datetime(df["date"])
+    base = pd.DataFrame(
+        {
+            "category_id": df["category_id"].to_numpy(),
+            "account_id": (
+                pd.to_numeric(df["account_id"]).fillna(0).astype(int).to_numpy()
+                if "account_id" in df.columns
+                else 0
+            ),
+            "total_cents": (
+                df["amount_cents"].astype("int64").to_numpy()
+                if "amount_cents" in df.columns
+                else cents_series(df["amount"]).to_numpy()
+            ),
+            "count": df["count"].to_numpy() if "count" in df.columns else 1,
+        }
+    )
+
+    frames = []
+    for grain in GRAINS:
+        grouped = (
+            base.assign(
+                grain=grain,
+                period_start=dates.dt.to_period(_GRAIN_FREQ[grain])
+                .dt.start_time.dt.date.to_numpy(),
+            )
+            .groupby(_ROLLUP_KEY, as_index=False)[["total_cents", "count"]]
+            .sum()
+        )
+        frames.append(grouped)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def apply_dataframe_delta(session: Session, df: pd.DataFrame) -> None:
+    """Aggiorna i rollup con le spese importate da un DataFrame"""
+    if df.empty:
+        return
+
+    rows = _rollup_frame(df)
+    rows["count"] = rows["count"].astype(int)
+    rows["account_id"] = rows["account_id"].astype(int)
+    _upsert_deltas(session, rows.to_dict(orient="records"))
+
+
+def rebuild_expense_rollup(session: Session) -> int:
+    """Ricostruisce da zero i rollup a partire dalla tabella expenses"""
+    import pandas as pd
+    try:
+        stmt = select(
+            Expense.date,
+            Expense.category_id,
+            Expense.account_id,
+            sum_cents(Expense.amount_cents).label("amount_cents"),
+            func.count().label("count"),
+        ).group_by(Expense.date, Expense.category_id, Expense.account_id)
+        daily = pd.DataFrame(session.execute(stmt).mappings().all())
+
+        session.execute(delete(ExpenseRollup))
+        if not daily.empty:
+            rows = _rollup_frame(daily)
+            rows["count"] = rows["count"].astype(int)
+            rows["account_id"] = rows["account_id"].astype(int)
+            session.execute(
+                ExpenseRollup.__table__.insert(), rows.to_dict(orient="records")
+            )
+        session.commit()
+        bump_data_version()
+        return 0 if daily.empty else len(rows)
+    except Exception:
+        session.rollback()
+        raise
+
+
+def account_filter(column: Any, account_ids: Optional[List[int]]) -> Any:
+    """Condizione sugli account richiesti (nessun filtro se account_ids è vuoto)
+
+    L'account 0 indica i movimenti senza account: nei rollup è un valore, su spese ed
+    entrate (colonne nullable) è NULL.
+    """
+    if not account_ids:
+        return true()
+    if 0 in account_ids and column.nullable:
+        return or_(column.in_(account_ids), column.is_(None))
+    return column.in_(account_ids)
+
+
+def rollup_range_filter(start_date: date, end_date: date) -> Any:
+    """Condizione sui rollup che copre [start_date, end_date] con il minor numero di righe
+
+    I mesi interi si leggono dalla granularità mensile, i giorni ai bordi da quella giornaliera.
+    """
+    end_excl = end_date + timedelta(days=1)
+    first_full = (
+        start_date
+        if start_date.day == 1
+        else (start_date.replace(day=1) + timedelta(days=32)).replace(day=1)
+    )
+    last_full_end = end_excl.replace(day=1)
+
+    def days(lo: date, hi: date) -> Any:
+        return and_(
+            ExpenseRollup.grain == "day",
+            ExpenseRollup.period_start >= lo,
+            ExpenseRollup.period_start < hi,
+        )
+
+    if first_full >= last_full_end:
+        return days(start_date, end_excl)
+
+    return or_(
+        and_(
+            ExpenseRollup.grain == "month",
+            ExpenseRollup.period_start >= first_full,
+            ExpenseRollup.period_start < last_full_end,
+        ),
+        days(start_date, first_full),
+        days(last_full_end, end_excl),
+    )
+
+
+def format_year_month(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte la chiave intera YYYYMM nell'etichetta 'YYYY-MM'
+
+    Anche un DataFrame vuoto riceve la colonna month, così i chiamanti vedono sempre lo
+    stesso schema.
+    """
+    if "year_month" not in df.columns:
+        return df
+
+    year_month = df.pop("year_month").astype("int64")
+    month = (year_month // 100).astype(str) + "-" + (year_month % 100).astype(
+        str
+    ).str.zfill(2)
+    df.insert(0, "month", month)
+    return df
+
+
+if __name__ == "__main__":
+
+    from database.connection import session_scope
+
+    with session_scope() as session:
+        print(f"Righe di rollup ricostruite: {rebuild_expense_rollup(session)}")
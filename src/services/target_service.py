@@ -1,27 +1,212 @@
-from datetime import datetime, timezone
-from database.models import MonthlyTarget
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+from database.dialect import dialect_insert
+from database.models import TargetVersion
+from services.cache import bump_data_version, cached_read
+from services.category_service import get_category_ids, with_category_names
+from services.money import to_cents, to_euros
+from services.rollup_service import format_year_month
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Dict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def set_target(session: Session, category: str, target_amount: float) -> bool:
-    """Imposta o aggiorna il target mensile per una categoria"""
+# I target sono versionati: ogni versione vale dal mese valid_from fino alla successiva della
+# stessa categoria, così cambiare un target non riscrive il giudizio sui mesi passati.
+
+
+def set_targets_bulk(
+    session: Session, targets: Dict[str, float], valid_from: Optional[date] = None
+) -> bool:
+    """Registra i target di più categorie, validi dal mese di valid_from (default: mese corrente)
+
+    Un solo upsert e un solo commit; un target 0 toglie il target da quel mese in poi.
+    """
+    if not targets:
+        return True
     try:
-        target = MonthlyTarget(
-            category=category,
-            target_amount=target_amount,
-            created_at=datetime.now(timezone.utc),
+        ids = get_category_ids(session)
+        unknown = sorted(set(targets) - set(ids))
+        if unknown:
+            print(f"Errore: categorie non valide: {', '.join(unknown)}")
+            return False
+
+        month = (valid_from or date.today()).replace(day=1)
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        insert = dialect_insert(session.get_bind())
+        stmt = insert(TargetVersion)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TargetVersion.category_id, TargetVersion.valid_from],
+            set_={
+                "target_cents": stmt.excluded.target_cents,
+                "created_at": stmt.excluded.created_at,
+            },
+        )
+        session.execute(
+            stmt,
+            [
+                {
+                    "category_id": ids[category],
+                    "valid_from": month,
+                    "target_cents": to_cents(amount),
+                    "created_at": now,
+                }
+                for category, amount in targets.items()
+            ],
         )
-        session.merge(target)  # merge inserisce se non esiste, altrimenti aggiorna
         session.commit()
+        bump_data_version()
         return True
     except Exception as e:
-        print(f"Errore nell'impostare il target: {e}")
+        session.rollback()
+        print(f"Errore nell'impostare i target: {e}")
         return False
 
 
-def get_targets(session: Session) -> Dict[str, float]:
-    """Recupera tutti i target mensili"""
-    results = session.query(MonthlyTarget.category, MonthlyTarget.target_amount).all()
-    targets = {category: amount for category, amount in results}
-    return targets
+def set_target(
+    session: Session,
+    category: str,
+    target_amount: float,
+    valid_from: Optional[date] = None,
+) -> bool:
+    """Imposta o aggiorna il target mensile per una categoria"""
+    return set_targets_bulk(session, {category: target_amount}, valid_from)
+
+
+@cached_read
+def get_target_history(session: Session, start_date: date, end_date: date) -> pd.DataFrame:
+    """Target validi in ogni mese di [start_date, end_date], con una query e un join as-of
+
+    Colonne: month (YYYY-MM), category (Categorical) e target (euro), solo per le categorie
+    con un target maggiore di zero in quel mese.
+    """
+    import numpy as np
+    import pandas as pd
+
+    months = pd.period_range(start_date, end_date, freq="M")
+    versions = pd.DataFrame(
+        session.execute(
+            select(
+                TargetVersion.category_id,
+                TargetVersion.valid_from,
+                TargetVersion.target_cents,
+            )
+            .where(TargetVersion.valid_from <= months[-1].start_time.date())
+            .order_by(TargetVersion.valid_from)
+        ).all(),
+        columns=["category_id", "valid_from", "target_cents"],
+    )
+    versions["valid_from"] = pd.to_datetime(versions["valid_from"])
+
+    # ogni mese × categoria con versioni, poi l'ultima versione con valid_from <= mese
+    grid = pd.DataFrame(
+        {
+            "month_start": np.repeat(
+                months.to_timestamp(), versions["category_id"].nunique()
+            ),
+            "category_id": np.tile(
+                versions["category_id"].unique(), len(months)
+            ).astype(np.int64),
+        }
+    )
+    versions["category_id"] = versions["category_id"].astype(np.int64)
+    df = pd.merge_asof(
+        grid.sort_values("month_start"),
+        versions,
+        left_on="month_start",
+        right_on="valid_from",
+        by="category_id",
+        direction="backward",
+    )
+    df = df[df["target_cents"] > 0]
+
+    df = pd.DataFrame(
+        {
+            "year_month": df["month_start"].dt.year * 100 + df["month_start"].dt.month,
+            "category_id": df["category_id"],
+            "target": to_euros(df["target_cents"].astype(np.int64)),
+        }
+    ).reset_index(drop=True)
+    return format_year_month(with_category_names(session, df))
+
+
+def get_targets(session: Session, as_of: Optional[date] = None) -> Dict[str, float]:
+    """Target validi nel mese di as_of (default: mese corrente)"""
+    month = (as_of or date.today()).replace(day=1)
+    history = get_target_history(session, month, month)
+    return dict(zip(history["category"].astype(str), history["target"]))
+
+
+def get_period_targets(
+    session: Session, periods: List[Tuple[str, date, date]]
+) -> pd.DataFrame:
+    """Somma dei target mensili di ogni periodo (etichetta, inizio, fine esclusa)
+
+    Conta i mesi che iniziano nel periodo; una sola lettura per tutti i periodi.
+    Colonne: period, category (Categorical) e target (euro).
+    """
+    import pandas as pd
+
+    history = get_target_history(
+        session,
+        min(start for _, start, _ in periods),
+        max(end for _, _, end in periods),
+    )
+    month_start = pd.to_datetime(history["month"], format="%Y-%m")
+    frames = [
+        history.loc[
+            (month_start >= pd.Timestamp(start)) & (month_start < pd.Timestamp(end)),
+            ["category", "target"],
+        ].assign(period=label)
+        for label, start, end in periods
+    ]
+    return (
+        pd.concat(frames)
+        .groupby(["period", "category"], observed=True, sort=False, as_index=False)[
+            "target"
+        ]
+        .sum()
+    )
+
+
+def align_spending_with_targets(
+    category_spending: pd.DataFrame, targets: Dict[str, float]
+) -> pd.DataFrame:
+    """Affianca spesa e target di ogni categoria in un unico DataFrame numerico
+
+    Colonne: category, spent, target (0 se non impostato), excess, pct (NaN senza target),
+    has_target, exceeded e status (✅ in budget, ⚠️ superato, ➖ senza target).
+    """
+    import pandas as pd
+    import numpy as np
+    # category_spending["category"] è Categorical: include anche le categorie senza spese
+    categories = pd.Index(
+        category_spending["category"].astype("category").cat.categories
+    ).union(pd.Index(list(targets)), sort=False)
+
+    spent = (
+        category_spending.groupby("category", observed=True)["total"]
+        .sum()
+        .reindex(categories, fill_value=0.0)
+        .astype(float)
+    )
+    target = pd.Series(targets, dtype=float).reindex(categories, fill_value=0.0)
+
+    has_target = target > 0
+    exceeded = has_target & (spent > target)
+
+    aligned = pd.DataFrame(
+        {
+            "spent": spent,
+            "target": target,
+            "excess": (spent - target).where(has_target, 0.0),
+            "pct": (spent / target.where(has_target)) * 100,
+            "has_target": has_target,
+            "exceeded": exceeded,
+            "status": np.select([exceeded, has_target], ["⚠️", "✅"], default="➖"),
+        }
+    )
+    return aligned.rename_axis("category").reset_index()
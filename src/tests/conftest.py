@@ -0,0 +1,30 @@
+from typing import Iterator
+
+import pytest
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session
+
+from database.base import Base
+from database.migrations import run_migrations
+from services.cache import clear_cache
+from services.category_service import clear_category_cache
+
+
+@pytest.fixture
+def engine(tmp_path) -> Iterator[Engine]:
+    """Database SQLite nuovo, con schema e migrazioni come all'avvio dell'app"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    run_migrations(engine)
+    clear_cache()
+    clear_category_cache()
+    yield engine
+    clear_cache()
+    clear_category_cache()
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine: Engine) -> Iterator[Session]:
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,42 @@
+from services.cache import bump_data_version, cache_stats, cached_read
+
+calls = []
+
+
+@cached_read
+def _read(value):
+    calls.append(value)
+    return [value]
+
+
+def test_write_invalidates_cached_reads(engine):
+    assert _read(1) == [1]
+    assert _read(1) == [1]
+    assert calls == [1]
+    hits = cache_stats()["hits"]
+
+    bump_data_version()
+
+    assert _read(1) == [1]
+    assert calls == [1, 1]
+    assert cache_stats()["hits"] == hits
+
+
+def test_cached_results_are_copies(engine):
+    first = _read(2)
+    first.append("modificato")
+
+    assert _read(2) == [2]
+
+
+def test_skip_if_bypasses_the_cache(engine):
+    skipped = []
+
+    @cached_read(skip_if=lambda: True)
+    def read():
+        skipped.append(True)
+        return 1
+
+    read()
+    read()
+    assert len(skipped) == 2
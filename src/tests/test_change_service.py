@@ -0,0 +1,69 @@
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from services import expense_store
+from services.cache import bump_data_version
+from services.change_service import get_change_watermark, get_changes_since
+from services.expense_service import add_expense
+from services.expense_store import get_expenses_frame
+
+
+def _insert_raw(engine, updated_at):
+    """Spesa scritta fuori dall'ORM, con l'istante di modifica scelto dal test"""
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO expenses (date, category_id, amount_cents, description, "
+                "created_at, updated_at) "
+                "SELECT :date, id, 1000, 'raw', :ts, :ts FROM categories WHERE name = 'Casa'"
+            ),
+            {"date": date(2025, 1, 10), "ts": updated_at},
+        )
+
+
+def test_server_default_has_sub_second_precision(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO expenses (date, category_id, amount_cents) "
+                "SELECT '2025-01-10', id, 1000 FROM categories WHERE name = 'Casa'"
+            )
+        )
+        updated_at = conn.scalar(text("SELECT updated_at FROM expenses"))
+
+    # CURRENT_TIMESTAMP di SQLite si ferma al secondo
+    assert "." in updated_at
+
+
+def test_row_committed_at_the_watermark_is_not_lost(engine, session):
+    assert add_expense(session, "2025-01-05", "Casa", 10.0, "prima")
+    watermark = get_changes_since(engine, "expenses")["watermark"]
+
+    # stesso istante del watermark: con ">" la riga non tornerebbe mai
+    _insert_raw(engine, watermark)
+    changes = get_changes_since(engine, "expenses", watermark)
+
+    assert "raw" in changes["inserted"]["description"].tolist()
+    assert get_change_watermark(engine, "expenses") == watermark
+
+
+def test_store_ignores_changes_repeated_by_the_overlap(engine, session, monkeypatch):
+    monkeypatch.setenv("EXPENSE_STORE_ENABLED", "1")
+    assert add_expense(session, "2025-01-05", "Casa", 10.0, "prima")
+    start, end = date(2025, 1, 1), date(2025, 2, 1)
+    assert len(get_expenses_frame(engine, start, end)) == 1
+
+    watermark = get_change_watermark(engine, "expenses")
+    assert watermark is not None
+    _insert_raw(engine, watermark - timedelta(seconds=1))
+    assert add_expense(session, "2025-01-06", "Casa", 5.0, "dopo")
+
+    frame = get_expenses_frame(engine, start, end)
+    assert sorted(frame["description"]) == ["dopo", "prima", "raw"]
+    assert frame["id"].is_unique
+    # un secondo giro rilegge la stessa finestra: nulla di nuovo, lo snapshot resta quello
+    table = expense_store._snapshots[str(engine.url)]["table"]
+    bump_data_version()
+    assert get_expenses_frame(engine, start, end)["id"].is_unique
+    assert expense_store._snapshots[str(engine.url)]["table"] is table
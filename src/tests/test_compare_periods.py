@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from services.category_service import get_categories
+from services.expense_service import add_expense, compare_periods
+
+PERIODS = [
+    ("Gen", date(2025, 1, 1), date(2025, 2, 1)),
+    ("Feb", date(2025, 2, 1), date(2025, 3, 1)),
+    # si sovrappone a Feb: le spese di febbraio restano al primo periodo che le contiene
+    ("Feb-Mar", date(2025, 2, 15), date(2025, 4, 1)),
+]
+
+
+@pytest.fixture(params=["0", "1"], ids=["sql", "store"])
+def expenses(request, engine, session, monkeypatch):
+    monkeypatch.setenv("EXPENSE_STORE_ENABLED", request.param)
+    for day, category, amount in [
+        ("2025-01-10", "Casa", 100.0),
+        ("2025-01-20", "Svago", 30.0),
+        ("2025-02-20", "Casa", 150.0),
+        ("2025-03-05", "Casa", 50.0),
+        ("2025-03-06", "Svago", 20.0),
+        # fuori da tutti i periodi
+        ("2025-04-01", "Casa", 999.0),
+    ]:
+        assert add_expense(session, day, category, amount, "")
+    return engine
+
+
+def _by_key(df, column):
+    return {
+        (row.category, row.period): getattr(row, column) for row in df.itertuples()
+    }
+
+
+def test_full_matrix_with_first_matching_period(expenses):
+    df = compare_periods(expenses, PERIODS)
+
+    assert len(df) == len(get_categories(expenses)) * len(PERIODS)
+    assert list(df["period"].cat.categories) == ["Gen", "Feb", "Feb-Mar"]
+    totals = _by_key(df, "total")
+    assert totals[("Casa", "Gen")] == 100.0
+    assert totals[("Casa", "Feb")] == 150.0
+    # la spesa del 20 febbraio non viene contata anche in Feb-Mar
+    assert totals[("Casa", "Feb-Mar")] == 50.0
+    assert _by_key(df, "count")[("Casa", "Feb-Mar")] == 1
+
+
+def test_category_missing_from_a_period_counts_as_zero(expenses):
+    df = compare_periods(expenses, PERIODS)
+    svago = df[df["category"] == "Svago"].set_index("period")
+
+    assert svago["total"].tolist() == [30.0, 0.0, 20.0]
+    assert svago["count"].tolist() == [1, 0, 1]
+    assert svago.loc["Feb", "delta"] == -30.0
+    assert svago.loc["Feb", "delta_pct"] == -100.0
+    # nessuna percentuale rispetto a un periodo a zero
+    assert svago.loc["Feb-Mar", "delta"] == 20.0
+    assert svago["delta_pct"].isna().tolist() == [True, False, True]
@@ -0,0 +1,42 @@
+from sqlalchemy import insert, select
+
+from database.models import Account, ExpenseRollup
+from services.expense_service import add_expense, delete_expense, update_expense
+from services.rollup_service import rebuild_expense_rollup
+
+
+def _rollups(session):
+    rows = session.execute(
+        select(
+            ExpenseRollup.grain,
+            ExpenseRollup.period_start,
+            ExpenseRollup.category_id,
+            ExpenseRollup.account_id,
+            ExpenseRollup.total_cents,
+            ExpenseRollup.count,
+        )
+    ).all()
+    return sorted(tuple(row) for row in rows)
+
+
+def test_writes_keep_rollups_equal_to_a_rebuild(session):
+    account_id = session.execute(
+        insert(Account).values(name="Conto").returning(Account.id)
+    ).scalar_one()
+    session.commit()
+
+    assert add_expense(session, "2025-01-05", "Casa", 10.0, "affitto")
+    assert add_expense(session, "2025-01-05", "Casa", 2.5, "bolletta", account_id)
+    assert add_expense(session, "2025-02-10", "Svago", 7.25, "cinema")
+    assert add_expense(session, "2024-12-31", "Svago", 3.0, "ultimo dell'anno")
+    # cambia giorno, mese, anno e categoria: i vecchi periodi si svuotano
+    assert update_expense(session, 3, "2025-03-01", "Casa", 8.0, "cinema")
+    assert update_expense(session, 2, "2025-01-06", "Casa", 2.75, "bolletta")
+    assert delete_expense(session, 4)
+
+    incremental = _rollups(session)
+    rebuild_expense_rollup(session)
+
+    assert incremental == _rollups(session)
+    # la spesa aggiornata resta sul suo account
+    assert {row[3] for row in incremental} == {0, account_id}
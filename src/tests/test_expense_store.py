@@ -0,0 +1,79 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from services.cache import cache_stats
+from services.expense_store import STORE_COLUMNS, _apply_changes, _schema, _sort
+
+
+def _rows(ids, days):
+    start = date(2025, 1, 1)
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "date": [start + timedelta(days=int(day)) for day in days],
+            "category_id": 1,
+            "amount_cents": 100,
+            "amount": 1.0,
+            "description": "",
+            "account_id": None,
+            "year_month": 202501,
+            "created_at": datetime(2025, 1, 1),
+            "updated_at": datetime(2025, 1, 1),
+        }
+    )[STORE_COLUMNS]
+
+
+def _table(frame):
+    frame = frame.astype({"date": "datetime64[ns]"})
+    return pa.Table.from_pandas(frame, schema=_schema(), preserve_index=False)
+
+
+def test_apply_changes_keeps_date_id_order_without_resorting():
+    rng = np.random.default_rng(7)
+    base = _sort(_table(_rows(np.arange(1, 501), rng.integers(0, 60, 500))))
+    changes = {
+        "inserted": _rows(np.arange(501, 541), rng.integers(-5, 70, 40)),
+        # spese spostate ad un altro giorno
+        "updated": _rows([3, 250, 499], [65, 0, 30]),
+        "deleted": [10, 11, 400],
+    }
+
+    merged = _apply_changes(base, changes)
+
+    expected = _sort(
+        pa.concat_tables(
+            [
+                base.filter(
+                    pc.invert(
+                        pc.is_in(
+                            base["id"], value_set=pa.array([3, 250, 499, 10, 11, 400])
+                        )
+                    )
+                ),
+                _table(changes["inserted"]),
+                _table(changes["updated"]),
+            ]
+        )
+    )
+    assert merged.column("id").to_pylist() == expected.column("id").to_pylist()
+    assert merged.column("date").num_chunks == 1
+    assert len(merged) == 500 - 6 + 43
+
+
+def test_store_serves_own_writes_without_cached_copies(engine, session, monkeypatch):
+    from services.expense_service import add_expense, get_expenses_by_month
+
+    monkeypatch.setenv("EXPENSE_STORE_ENABLED", "1")
+    assert add_expense(session, "2025-01-05", "Casa", 10.0, "prima")
+    assert len(get_expenses_by_month(engine, 2025, 1)) == 1
+    assert add_expense(session, "2025-01-02", "Casa", 5.0, "dopo")
+
+    misses = cache_stats()["misses"]
+    expenses = get_expenses_by_month(engine, 2025, 1)
+    assert expenses["description"].tolist() == ["prima", "dopo"]
+    # servita dallo snapshot, senza passare dalla cache delle letture
+    assert cache_stats()["misses"] == misses
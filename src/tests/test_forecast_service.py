@@ -0,0 +1,36 @@
+from datetime import date
+
+from services.expense_service import add_expense
+from services.forecast_service import forecast_monthly_totals
+
+
+def _add_history(session):
+    for day in ["2025-01-10", "2025-02-10"]:
+        assert add_expense(session, day, "Casa", 100.0, "")
+
+
+def test_forecast_starts_after_end_date_with_empty_months_as_zero(session):
+    _add_history(session)
+
+    result = forecast_monthly_totals(
+        session, date(2025, 1, 1), date(2025, 4, 30), model="smoothing", horizon=2
+    )
+
+    # marzo e aprile senza spese fanno parte della storia, non vengono saltati
+    assert result["month"].tolist() == ["2025-05", "2025-06"]
+    # livello smorzato con alpha 0.5 su [100, 100, 0, 0]
+    assert result["forecast"].tolist() == [25.0, 25.0]
+
+
+def test_account_zero_selects_expenses_without_account(session):
+    _add_history(session)
+
+    with_zero = forecast_monthly_totals(
+        session, date(2025, 1, 1), date(2025, 2, 28), horizon=1, account_ids=[0]
+    )
+    other = forecast_monthly_totals(
+        session, date(2025, 1, 1), date(2025, 2, 28), horizon=1, account_ids=[99]
+    )
+
+    assert with_zero["forecast"].tolist() == [100.0]
+    assert other.empty
@@ -0,0 +1,20 @@
+import io
+
+from services.expense_service import get_all_expenses
+from services.import_service import bulk_import_expenses_csv
+
+CSV = b"""date,category,amount,description
+2025-01-05,Casa,10.00,affitto
+2025-13-40,Casa,5.00,data sbagliata
+2025-01-06,Inesistente,7.50,categoria sbagliata
+2025-01-07,Casa,2.50,bolletta
+"""
+
+
+def test_bulk_import_reports_skipped_rows(engine):
+    report = bulk_import_expenses_csv(engine, io.BytesIO(CSV))
+
+    assert report["rows"] == 2
+    assert report["invalid_rows"] == 2
+    assert report["errors"]["row"].tolist() == [1, 2]
+    assert sorted(get_all_expenses(engine)["description"]) == ["affitto", "bolletta"]
@@ -0,0 +1,16 @@
+from datetime import date
+
+from services.expense_service import add_expense
+from services.income_service import get_savings_series, set_income
+
+
+def test_no_account_filter_includes_incomes_without_account(session):
+    assert set_income(session, 1000.0, date(2025, 1, 3), None)
+    assert add_expense(session, "2025-01-05", "Casa", 200.0, "affitto")
+
+    # account 0 = movimenti senza account, per le spese come per le entrate
+    savings = get_savings_series(session, date(2025, 1, 1), date(2025, 1, 31), [0])
+
+    assert savings["income"].tolist() == [1000.0]
+    assert savings["expenses"].tolist() == [200.0]
+    assert savings["savings"].tolist() == [800.0]
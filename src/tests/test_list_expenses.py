@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+from services.expense_service import add_expense, list_expenses
+
+# (data, categoria, importo): più spese nello stesso giorno attraversano i confini di pagina
+EXPENSES = [
+    ("2025-01-03", "Casa", 10.0),
+    ("2025-01-05", "Casa", 20.0),
+    ("2025-01-05", "Svago", 5.0),
+    ("2025-01-05", "Casa", 7.5),
+    ("2025-01-05", "Casa", 30.0),
+    ("2025-01-08", "Svago", 12.0),
+    ("2025-01-08", "Casa", 40.0),
+]
+
+
+@pytest.fixture(params=["0", "1"], ids=["sql", "store"])
+def expenses(request, engine, session, monkeypatch):
+    monkeypatch.setenv("EXPENSE_STORE_ENABLED", request.param)
+    for i, (day, category, amount) in enumerate(EXPENSES):
+        assert add_expense(session, day, category, amount, f"spesa {i + 1}")
+    return engine
+
+
+def _all_pages(engine, limit, **filters):
+    pages, after = [], None
+    while True:
+        page, after = list_expenses(engine, after=after, limit=limit, **filters)
+        pages.append(page["id"].tolist())
+        if after is None:
+            return pages
+
+
+def test_pages_split_equal_dates_without_gaps_or_repeats(expenses):
+    pages = _all_pages(expenses, limit=2)
+
+    # dalla più recente, a parità di data per id decrescente
+    assert pages == [[7, 6], [5, 4], [3, 2], [1]]
+
+
+def test_cursor_points_at_the_last_row_of_the_page(expenses):
+    page, after = list_expenses(expenses, limit=3)
+
+    assert page["id"].tolist() == [7, 6, 5]
+    assert after == (date(2025, 1, 5), 5)
+
+
+def test_combined_filters_are_kept_across_pages(expenses):
+    pages = _all_pages(
+        expenses,
+        limit=2,
+        categories=["Casa"],
+        start_date=date(2025, 1, 4),
+        end_date=date(2025, 1, 9),
+        min_amount=7.5,
+        max_amount=30.0,
+    )
+
+    assert pages == [[5, 4], [2]]
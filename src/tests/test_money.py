@@ -0,0 +1,18 @@
+import pandas as pd
+
+from services.money import cents_series, to_cents
+
+HALVES = [1.005, 2.675, 10.005, 0.285, 1.115, -1.005, -2.675]
+EXPECTED = [101, 268, 1001, 29, 112, -101, -268]
+
+
+def test_to_cents_rounds_halves_away_from_zero():
+    assert [to_cents(amount) for amount in HALVES] == EXPECTED
+
+
+def test_cents_series_agrees_with_to_cents():
+    cents = cents_series(pd.Series(HALVES, name="amount"))
+
+    assert cents.tolist() == [to_cents(amount) for amount in HALVES]
+    assert cents.dtype == "int64"
+    assert cents.name == "amount"
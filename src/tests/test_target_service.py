@@ -0,0 +1,41 @@
+from datetime import date
+
+from services.target_service import (
+    get_period_targets,
+    get_target_history,
+    get_targets,
+    set_targets_bulk,
+)
+
+PERIODS = [
+    ("Q1", date(2025, 1, 1), date(2025, 4, 1)),
+    ("Q2", date(2025, 4, 1), date(2025, 7, 1)),
+]
+
+
+def test_target_history_without_targets_has_final_schema(session):
+    history = get_target_history(session, date(2025, 1, 1), date(2025, 6, 30))
+
+    assert history.empty
+    assert list(history.columns) == ["month", "category", "target"]
+
+
+def test_period_targets_without_targets(session):
+    targets = get_period_targets(session, PERIODS)
+
+    assert targets.empty
+    assert targets.groupby("period")["target"].sum().empty
+    assert get_targets(session) == {}
+
+
+def test_targets_are_resolved_as_of_each_month(session):
+    assert set_targets_bulk(session, {"Casa": 300}, date(2025, 1, 1))
+    assert set_targets_bulk(session, {"Casa": 400}, date(2025, 3, 1))
+
+    history = get_target_history(session, date(2025, 1, 1), date(2025, 4, 30))
+
+    assert history["month"].tolist() == ["2025-01", "2025-02", "2025-03", "2025-04"]
+    assert history["target"].tolist() == [300.0, 300.0, 400.0, 400.0]
+    assert get_targets(session, date(2025, 2, 15)) == {"Casa": 300.0}
+    totals = get_period_targets(session, PERIODS).set_index("period")["target"]
+    assert totals.to_dict() == {"Q1": 1000.0, "Q2": 1200.0}